@@ -2,23 +2,104 @@
 Document Chat Interface Module
 
 This module provides a Streamlit-based chat interface for interacting with documents
-using various LLM providers (OpenAI GPT-4 and Google Gemini). It handles document context
-retrieval and streaming responses while maintaining chat history.
+using various LLM providers (OpenAI GPT-4 and Google Gemini). It retrieves context for
+each question, fits it into the token budget and streams the answer while maintaining
+chat history. The work behind each step lives in its own module: retrieval.py and
+reranker.py for the search, document_tree.py for section routing and summaries,
+context_builder.py and prompt_assembly.py for the prompt, query_cache.py for cached
+answers and llm_gateway.py for pooled, hedged provider calls. The chat runs as a
+fragment (see main.py), so sending a message reruns only the chat.
 """
 
 import streamlit as st
 import os
-from openai import OpenAI
-import google.generativeai as genai
+import time
 from config import log_time
+from resources import (
+    get_latency_recorder, get_lexical_index, get_library, get_library_tree, get_llm_gateway, get_query_cache,
+    get_reranker
+)
+from llm_gateway import MODELS
+from retrieval import N_RESULTS, merge_results, retrieve
+from reranker import RERANK_CANDIDATES
+from query_cache import make_response_key
+from context_builder import build_context_window
+from prompt_assembly import SYSTEM_INSTRUCTIONS, Prompt, assemble_prompt
+from vector_index import SearchFilter
+from tracing import timed_stream
 
-def handle_chat(uploaded_files):
+
+def _api_key(model_name: str) -> str:
+    """The session's API key for a model's provider."""
+    if MODELS[model_name][0] == "openai":
+        return st.session_state.openai_api_key
+    return st.session_state.google_api_key
+
+
+def _provider_request(model_name: str, prompt_layout: Prompt):
     """
-    Manages the document chat interface and conversation flow.
-    
+    Address an assembled prompt to one model.
+
     Args:
-        uploaded_files: List of uploaded document files to chat about
-        
+        model_name (str): Model name from MODELS
+        prompt_layout (Prompt): Messages from assemble_prompt
+
+    Returns:
+        tuple: (provider, api_key, model, messages) for the LLM gateway
+    """
+    provider, model = MODELS[model_name]
+    return provider, _api_key(model_name), model, list(prompt_layout.messages)
+
+
+def _in_scope(search_filter: SearchFilter, sources) -> bool:
+    """Whether a store holds any of the documents a filter selects."""
+    return not search_filter.sources or any(source in sources for source in search_filter.sources)
+
+
+def render_search_scope(library) -> SearchFilter:
+    """
+    Render the controls that scope questions to documents and pages.
+
+    Args:
+        library: Shared library as (collection, LexicalIndex), or None
+
+    Returns:
+        SearchFilter: Scope chosen by the user; empty searches everything
+    """
+    documents = list(st.session_state.get("processed_files", {}))
+    if library is not None:
+        documents += sorted(source for source in library[1].sources if source and source not in documents)
+
+    # Drop selections of documents that were removed since the last run
+    if "scope_sources" in st.session_state:
+        st.session_state.scope_sources = [
+            source for source in st.session_state.scope_sources if source in documents
+        ]
+
+    with st.expander("🔎 Search scope"):
+        sources = st.multiselect(
+            "Documents",
+            options=documents,
+            key="scope_sources",
+            help="Only search these documents. Leave empty to search all of them."
+        )
+        first_page = last_page = None
+        if st.checkbox("Limit to a page range", key="scope_pages"):
+            col_first, col_last = st.columns(2)
+            first_page = int(col_first.number_input("First page", min_value=1, key="scope_first_page"))
+            if st.session_state.get("scope_last_page", first_page) < first_page:
+                st.session_state.scope_last_page = first_page
+            last_page = int(col_last.number_input("Last page", min_value=first_page, key="scope_last_page"))
+    return SearchFilter(tuple(sources), first_page, last_page)
+
+
+def handle_chat():
+    """
+    Manages the document chat interface and conversation flow.
+
+    The uploaded files are read from the sidebar uploader's state, so the
+    chat can rerun without the upload panel.
+
     The function handles:
     - Document context management
     - API provider selection (OpenAI/Gemini)
@@ -27,8 +108,11 @@ def handle_chat(uploaded_files):
     - User input validation
     """
 
+    library = get_library()
+    uploaded_files = st.session_state.get("file_uploader")
+
     # Validate initial state
-    if not uploaded_files:
+    if not uploaded_files and library is None:
         st.info("👈 Please upload document(s) in the sidebar first! And supply the API key as well!")
     else:
 
@@ -39,25 +123,24 @@ def handle_chat(uploaded_files):
         with col2:
             if st.button("🧹 Clear Chat"):
                 st.session_state.messages = []
-                st.rerun()
+                st.rerun(scope="fragment")
+
+        search_filter = render_search_scope(library)
 
         # === API Configuration ===
-        api_key_valid = (
-            (st.session_state.selected_model in ["gpt-4o", "gpt-4o-mini"] and st.session_state.openai_api_key) or
-            (st.session_state.selected_model == "Gemini 2.0 Flash" and st.session_state.google_api_key)
-        )
+        api_key_valid = bool(_api_key(st.session_state.selected_model))
+        hedge_model = st.session_state.get("hedge_model")
+        if hedge_model not in MODELS or hedge_model == st.session_state.selected_model or not _api_key(hedge_model):
+            hedge_model = None
 
         if not api_key_valid:
             st.warning("Please enter an API key in the sidebar to start chatting.")
-        else:
-            if st.session_state.selected_model in ["gpt-4o", "gpt-4o-mini"]:
-                client = OpenAI(api_key=st.session_state.openai_api_key)
-            elif st.session_state.selected_model == "Gemini 2.0 Flash":
-                genai.configure(api_key=st.session_state.google_api_key)
 
         # === Chat Display ===
+        # New messages are added to the conversation above the inline input
+        conversation = st.container()
         for message in st.session_state.messages:
-            with st.chat_message(message["role"]):
+            with conversation.chat_message(message["role"]):
                 st.markdown(message["content"])
 
         # === Chat Input Handler ===
@@ -68,109 +151,108 @@ def handle_chat(uploaded_files):
             key="chat_input"
         ):        
             
-            # Retrieve relevant document context
-            search_results = st.session_state.collection.query(
-                query_texts=[prompt],
-                n_results=5
-            )
-            
-            context = ""
-            if search_results and search_results['documents']:
-                context = "\n\n".join([
-                    f"Document {meta['source']} (Page {meta['page']}): {doc}"
-                    for doc, meta in zip(search_results['documents'][0], search_results['metadatas'][0])
-                ])
-            
-            system_message = f"""You are a versatile and contextually aware assistant, designed to process a broad range of documents—including PDFs, text snippets, spreadsheets, and other reference materials—and generate insightful, accurate, and clearly presented responses. Your purpose extends across multiple domains, from finance to research analysis, to general question-answering and summarization tasks. Strive to remain both flexible and domain-agnostic, adapting to any topic or medium while maintaining exactness, clarity, and a commitment to helping users achieve their goals.
+            recorder = get_latency_recorder()
+            trace_tags = {
+                "session": st.session_state.session_id,
+                "model": st.session_state.selected_model,
+            }
 
-                When responding to financial questions—such as inquiries about revenues, expenditures, or market trends—draw on provided references to supply grounded, verifiable figures. Ensure that all financial metrics are accurate, and contextualize them to highlight their relevance to the broader scenario. Present these findings in a manner that is both accessible and precise, noting key insights and pointing out patterns or anomalies where relevant.
+            # Retrieve candidates from the uploads and the library; with a reranker
+            # the set is wider and only its relevant chunks are kept
+            reranker = get_reranker()
+            n_results = RERANK_CANDIDATES if reranker is not None else N_RESULTS
+            with recorder.span("retrieve", **trace_tags):
+                result_sets = []
+                processed_files = st.session_state.get("processed_files")
+                if processed_files and _in_scope(search_filter, processed_files):
+                    result_sets.append(retrieve(
+                        st.session_state.collection,
+                        prompt,
+                        n_results=n_results,
+                        lexical_index=get_lexical_index(st.session_state.collection.name),
+                        search_filter=search_filter,
+                        tree=st.session_state.tree
+                    ))
+                if library is not None and _in_scope(search_filter, library[1].sources):
+                    library_collection, library_lexical_index = library
+                    result_sets.append(retrieve(
+                        library_collection, prompt, n_results=n_results,
+                        lexical_index=library_lexical_index, search_filter=search_filter,
+                        tree=get_library_tree()
+                    ))
+                search_results = merge_results(result_sets, n_results) if result_sets else {
+                    "ids": [[]], "documents": [[]], "metadatas": [[]]
+                }
+            if reranker is not None:
+                with recorder.span("rerank", **trace_tags):
+                    search_results = reranker.rerank(prompt, search_results)
 
-                Summarize key facts and insights from any given source, be it a lengthy report, a single table, or a series of PDF extracts. Condense information thoughtfully, prioritizing the most valuable data points and analytical takeaways. Keep your summaries logically structured and balanced, spotlighting what is most essential while not omitting important details that might shape the reader’s understanding.
-
-                In terms of formatting, continually refine your textual and tabular outputs for maximum clarity. If data lends itself to a tabular format, present it as a well-labeled, neatly aligned table that makes it easy to compare values. For textual explanations, consider using headings, bullet points, and concise statements that enhance readability and comprehension, always choosing the most effective format for the given content.
-
-                Remain sensitive to user instructions and evolving inquiries, and handle follow-up questions in a way that integrates seamlessly with previously provided context. Refer back to earlier information and maintain continuity of discussion, ensuring that all responses are consistent and coherent. If new information is provided or corrections become necessary, adapt gracefully, updating your analysis without losing previously established insights.
-
-                By upholding these standards—broad adaptability, financial precision, clear summarization, refined formatting, and dynamic engagement—you will provide users with a consistently high-value experience. Your overarching goal is to deliver thorough, thoughtful, and contextually relevant guidance that meets users’ present needs and anticipates their future questions.
-
-                Use the following context to answer the question, and if the context doesn't contain the answer, say so:
-
-                {context}"""
+            # Fit instructions, summaries, chunks and history into the token budget
+            window = build_context_window(
+                SYSTEM_INSTRUCTIONS,
+                search_results,
+                st.session_state.messages,
+                prompt,
+                st.session_state.selected_model
+            )
+            # Instructions and history lead, so providers can reuse their cached prefix
+            prompt_layout = assemble_prompt(window.history, window.context, prompt, st.session_state.selected_model)
             
+            # Identical requests over unchanged documents reuse the earlier answer
+            query_cache = get_query_cache()
+            response_key = make_response_key(
+                st.session_state.selected_model,
+                {
+                    "temperature": st.session_state.temperature,
+                    "top_p": st.session_state.top_p,
+                    "max_length": st.session_state.max_length,
+                },
+                window.node_ids + window.chunk_ids,
+                window.history,
+                prompt
+            )
+            response = query_cache.get_response(response_key)
+
             st.session_state.messages.append({"role": "user", "content": prompt})
-            with st.chat_message("user"):
+            with conversation.chat_message("user"):
                 st.markdown(prompt)
 
             # === Response Generation ===
-            with st.chat_message("assistant"):
-                if st.session_state.selected_model in ["gpt-4o", "gpt-4o-mini"]:
-                    messages_for_api = [
-                        {"role": "system", "content": system_message},
-                        *[{"role": m["role"], "content": m["content"]} 
-                        for m in st.session_state.messages[:-1]],
-                        {"role": "user", "content": prompt}
-                    ]
-                    
-                    stream = client.chat.completions.create(
-                        model=st.session_state.selected_model,
-                        messages=messages_for_api,
-                        stream=True,
-                        temperature=st.session_state.temperature,
-                        max_completion_tokens=st.session_state.max_length,
-                        top_p=st.session_state.top_p
-                    )
-                    response = st.write_stream(stream)
-
-
-                elif st.session_state.selected_model == "Gemini 2.0 Flash":
-                    # Configure generation parameters
-                    generation_config = {
+            # Index of the request that answered when hedging, and its prompt token usage
+            answered_by, usage = [], []
+            with conversation.chat_message("assistant"):
+                if response is not None:
+                    st.markdown(response)
+
+                else:
+                    params = {
                         "temperature": st.session_state.temperature,
                         "top_p": st.session_state.top_p,
-                        "max_output_tokens": st.session_state.max_length,
-                        "response_mime_type": "text/plain",
+                        "max_tokens": st.session_state.max_length,
                     }
+                    request = _provider_request(st.session_state.selected_model, prompt_layout)
+
+                    # Stream the response; tokens arrive in small batches
+                    request_start = time.perf_counter()
+                    if hedge_model is not None:
+                        stream = get_llm_gateway().stream_hedged(
+                            [request, _provider_request(hedge_model, prompt_layout)], params,
+                            on_winner=answered_by.append, on_usage=usage.append
+                        )
+                    else:
+                        stream = get_llm_gateway().stream(*request, params, on_usage=usage.append)
+                    response = st.write_stream(timed_stream(stream, recorder, request_start, **trace_tags))
+                    if answered_by and answered_by[0]:
+                        st.caption(f"Answered by {hedge_model}: {st.session_state.selected_model} was slow to respond.")
+                    if usage:
+                        st.caption(
+                            f"Prompt: {usage[0].prompt_tokens:,} tokens, "
+                            f"{usage[0].cached_tokens:,} served from the provider's prompt cache"
+                        )
 
-                    # Initialize model
-                    model = genai.GenerativeModel(
-                        model_name="gemini-2.0-flash-exp",
-                        generation_config=generation_config,
-                    )
-
-                    # Convert message history to Gemini format
-                    gemini_history = []
-                    for msg in st.session_state.messages:
-                        role = "model" if msg["role"] == "assistant" else msg["role"]
-                        gemini_history.append({
-                            "role": role,
-                            "parts": [msg["content"]]
-                        })
-
-                    chat = model.start_chat(history=gemini_history)
-        
-                    # Construct prompt with context
-                    contextualized_prompt = f"""Use the following context to answer the question, and if the context doesn't contain the answer, say so:
-
-                        Context:
-                        {context}
-
-                        Question: {prompt}"""
-                    
-                    # Send message with context and stream response
-                    response = chat.send_message(contextualized_prompt, stream=True)
-                    
-                    # Create placeholder once
-                    placeholder = st.empty()
-
-                    # Stream the response
-                    response_text = ""
-                    for chunk in response:
-                        if chunk.text:
-                            response_text += chunk.text
-                            # Update placeholder with accumulated text
-                            placeholder.markdown(response_text)
-
-                    response = response_text
+                # Answers from the hedge model are not cached under the selected model
+                if not answered_by or not answered_by[0]:
+                    query_cache.put_response(st.session_state.collection.name, response_key, response)
 
             st.session_state.messages.append({"role": "assistant", "content": response})
 
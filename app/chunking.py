@@ -0,0 +1,222 @@
+"""
+Configurable chunking engine for the DocuDialogue application.
+
+Pages are split one at a time, and every chunk keeps the character offset
+where it starts in its page, so stored chunks can point back to their real
+page and position. Four strategies are available:
+
+- recursive: LangChain's recursive character splitter (the original behaviour)
+- token: fixed windows of tokenizer tokens, so chunk sizes match what the
+  embedding model and the LLM actually see
+- sentence: whole sentences packed up to the chunk size, overlapping by
+  whole sentences instead of cutting words in half
+- section: like sentence, but a heading always starts a new chunk, so a
+  chunk never straddles two sections
+
+The strategy and its sizes are read from DOCUDIALOGUE_CHUNK_* settings.
+"""
+
+import os
+import re
+from context_builder import get_encoding
+
+CHUNK_STRATEGY = os.getenv("DOCUDIALOGUE_CHUNK_STRATEGY", "recursive")
+# Character sizes used by the recursive, sentence and section strategies
+CHUNK_SIZE = int(os.getenv("DOCUDIALOGUE_CHUNK_SIZE", "1500"))
+CHUNK_OVERLAP = int(os.getenv("DOCUDIALOGUE_CHUNK_OVERLAP", "300"))
+# Token sizes used by the token strategy
+CHUNK_TOKENS = int(os.getenv("DOCUDIALOGUE_CHUNK_TOKENS", "300"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("DOCUDIALOGUE_CHUNK_OVERLAP_TOKENS", "30"))
+CHUNK_ENCODING = os.getenv("DOCUDIALOGUE_CHUNK_ENCODING", "cl100k_base")
+
+CHUNK_STRATEGIES = ("recursive", "token", "sentence", "section")
+
+# Fallback when no tokenizer is available, matching context_builder's estimate
+_CHARS_PER_TOKEN = 4
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[\"'(\[]?[A-Z0-9])|\n{2,}")
+_HEADING = re.compile(
+    r"^\s*(?:(?:\d+(?:\.\d+)*\.?|[IVX]+\.|[A-Z]\.)\s+\S.{0,80}|[A-Z][A-Z0-9 ,&/\-]{3,80})\s*$"
+)
+
+
+def split_sentences(text: str):
+    """
+    Split text into sentences, keeping each one's start offset.
+
+    Args:
+        text (str): Text to split
+
+    Returns:
+        list[tuple[int, str]]: (offset, sentence) pairs in order
+    """
+    sentences, start = [], 0
+    for match in _SENTENCE_END.finditer(text):
+        if text[start:match.start()].strip():
+            sentences.append((start, text[start:match.start()]))
+        start = match.end()
+    if text[start:].strip():
+        sentences.append((start, text[start:]))
+    return sentences
+
+
+def split_sections(text: str):
+    """
+    Split text at heading lines, keeping each section's start offset.
+
+    Args:
+        text (str): Text to split
+
+    Returns:
+        list[tuple[int, str]]: (offset, section) pairs in order
+    """
+    boundaries = [0]
+    offset = 0
+    for line in text.splitlines(keepends=True):
+        if offset and _HEADING.match(line):
+            boundaries.append(offset)
+        offset += len(line)
+    boundaries.append(len(text))
+    return [
+        (start, text[start:stop])
+        for start, stop in zip(boundaries, boundaries[1:])
+        if text[start:stop].strip()
+    ]
+
+
+class Chunker:
+    """
+    Split page text into chunks with their offsets.
+
+    Args:
+        strategy (str): One of CHUNK_STRATEGIES
+        chunk_size (int): Maximum characters per chunk (character strategies)
+        chunk_overlap (int): Characters repeated between consecutive chunks
+        chunk_tokens (int): Tokens per chunk (token strategy)
+        overlap_tokens (int): Tokens repeated between consecutive chunks
+        encoding (str): tiktoken encoding of the token strategy
+    """
+
+    def __init__(self, strategy: str = CHUNK_STRATEGY, chunk_size: int = CHUNK_SIZE,
+                 chunk_overlap: int = CHUNK_OVERLAP, chunk_tokens: int = CHUNK_TOKENS,
+                 overlap_tokens: int = CHUNK_OVERLAP_TOKENS, encoding: str = CHUNK_ENCODING):
+        if strategy not in CHUNK_STRATEGIES:
+            raise ValueError(f"Unknown chunking strategy {strategy!r}; choose one of {CHUNK_STRATEGIES}")
+        if chunk_overlap >= chunk_size or overlap_tokens >= chunk_tokens:
+            raise ValueError("Chunk overlap must be smaller than the chunk size")
+        self.strategy = strategy
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self.encoding = encoding
+        self._splitter = None
+
+    @property
+    def config_id(self) -> str:
+        """Identifier of the strategy and its sizes, used to key cached chunks."""
+        if self.strategy == "token":
+            return f"token:{self.chunk_tokens}:{self.overlap_tokens}:{self.encoding}"
+        return f"{self.strategy}:{self.chunk_size}:{self.chunk_overlap}"
+
+    def __call__(self, text: str):
+        """
+        Split one page.
+
+        Args:
+            text (str): Page text
+
+        Returns:
+            list[tuple[int, str]]: (offset in the page, chunk text) pairs
+        """
+        if not text or not text.strip():
+            return []
+        if self.strategy == "recursive":
+            return self._split_recursive(text)
+        if self.strategy == "token":
+            return self._split_tokens(text)
+        if self.strategy == "sentence":
+            return self._pack(split_sentences(text), text)
+        return [
+            chunk
+            for start, section in split_sections(text)
+            for chunk in self._pack(
+                [(start + offset, sentence) for offset, sentence in split_sentences(section)], text
+            )
+        ]
+
+    # === Strategies ===
+
+    def _split_recursive(self, text: str):
+        if self._splitter is None:
+            from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+            self._splitter = RecursiveCharacterTextSplitter(
+                chunk_size=self.chunk_size, chunk_overlap=self.chunk_overlap, add_start_index=True
+            )
+        return [
+            (document.metadata["start_index"], document.page_content)
+            for document in self._splitter.create_documents([text])
+        ]
+
+    def _split_tokens(self, text: str):
+        encoding = get_encoding(self.encoding)
+        if encoding is None:
+            # No tokenizer available: every character is its own unit, scaled to tokens
+            offsets = list(range(len(text)))
+            size = self.chunk_tokens * _CHARS_PER_TOKEN
+            step = (self.chunk_tokens - self.overlap_tokens) * _CHARS_PER_TOKEN
+        else:
+            text, offsets = encoding.decode_with_offsets(encoding.encode(text))
+            size, step = self.chunk_tokens, self.chunk_tokens - self.overlap_tokens
+
+        chunks = []
+        for first in range(0, len(offsets), step):
+            last = first + size
+            start = offsets[first]
+            stop = offsets[last] if last < len(offsets) else len(text)
+            if text[start:stop].strip():
+                chunks.append((start, text[start:stop]))
+            if last >= len(offsets):
+                break
+        return chunks
+
+    @staticmethod
+    def _span(group, sentence: str) -> int:
+        """Length of a group of sentences once the next sentence is added."""
+        return group[-1][0] + len(group[-1][1]) - group[0][0] + 1 + len(sentence)
+
+    def _pack(self, sentences, text: str):
+        """Pack consecutive sentences into chunks, overlapping by whole sentences."""
+        chunks, current = [], []
+        for offset, sentence in sentences:
+            # A sentence longer than a chunk is cut at the chunk size
+            while len(sentence) > self.chunk_size:
+                if current:
+                    chunks.append(current)
+                    current = []
+                chunks.append([(offset, sentence[:self.chunk_size])])
+                offset += self.chunk_size - self.chunk_overlap
+                sentence = sentence[self.chunk_size - self.chunk_overlap:]
+
+            if current and self._span(current, sentence) > self.chunk_size:
+                chunks.append(current)
+                # Carry trailing sentences into the next chunk up to the overlap
+                carried, carried_length = [], 0
+                for previous in reversed(current):
+                    if carried_length + len(previous[1]) > self.chunk_overlap:
+                        break
+                    carried.insert(0, previous)
+                    carried_length += len(previous[1])
+                while carried and self._span(carried, sentence) > self.chunk_size:
+                    carried.pop(0)
+                current = carried
+            current.append((offset, sentence))
+
+        if current:
+            chunks.append(current)
+        # Chunks are spans of the page, so their text keeps the original spacing
+        return [
+            (group[0][0], text[group[0][0]:group[-1][0] + len(group[-1][1])].strip())
+            for group in chunks
+        ]
@@ -2,27 +2,34 @@
 Configuration module for the GenAI PDF Chat application.
 
 This module handles initialization of environment variables, session state,
-and vector database (ChromaDB) setup. It includes logging utilities for
-performance monitoring.
+and the per-session view of the shared vector database (ChromaDB). Script
+reruns are timed stage by stage and recorded on the shared latency recorder,
+and each independently rerunning panel is timed as a whole. Every run marks
+the session as active in the session registry; a session whose data was
+evicted while idle is reattached on its next run.
 """
 
 
 import time
 import tempfile
+import uuid
+from contextlib import contextmanager
 import streamlit as st
 import os
 from dotenv import load_dotenv
-import chromadb
-from chromadb.utils.embedding_functions import create_langchain_embedding
-from langchain_huggingface import HuggingFaceEmbeddings
-
-# Global log storage for performance tracking
-log_summary = []
+from resources import (
+    get_latency_recorder, get_library, get_library_tree, get_session_collection, get_session_registry, get_session_tree,
+    get_upload_root
+)
+from llm_gateway import DEFAULT_MODEL, HEDGE_MODEL
 
 
 def log_time(message: str) -> None:
     """
-    Log execution time between checkpoints.
+    Record the time spent in a rerun stage since the session's previous checkpoint.
+
+    The stage is recorded as a "rerun" span tagged with the session, so
+    interleaved sessions never measure each other's work.
 
     Args:
         message (str): Checkpoint description to log
@@ -30,20 +37,46 @@ def log_time(message: str) -> None:
     Returns:
         None
     """
-    current_time = time.time()
-    if log_summary:
-        elapsed_time = (current_time - log_summary[-1][1]) * 1000  # Convert to milliseconds
-    else:
-        elapsed_time = 0
-    log_summary.append((message, current_time, elapsed_time))
-    print(f"{message}: {elapsed_time:.2f} ms")
+    current_time = time.perf_counter()
+    previous = st.session_state.get("_last_checkpoint")
+    st.session_state._last_checkpoint = current_time
+    if previous is not None:
+        get_latency_recorder().record(
+            "rerun", current_time - previous,
+            session=st.session_state.get("session_id"), stage=message
+        )
+
+@contextmanager
+def rerun_scope(panel: str):
+    """
+    Time one run of a page panel, such as a fragment rerunning on its own.
+
+    The run is recorded as a "panel" span tagged with the session and panel,
+    and log_time checkpoints inside it are measured from its start. A panel
+    rerunning on its own after the session was evicted reruns the whole app
+    instead, so initialize_chromadb reattaches the session first.
+
+    Args:
+        panel (str): Panel name, e.g. "app", "upload" or "chat"
+    """
+    start = time.perf_counter()
+    st.session_state._last_checkpoint = start
+    if panel != "app" and not get_session_registry().touch(st.session_state.session_id):
+        st.rerun()
+    try:
+        yield
+    finally:
+        get_latency_recorder().record(
+            "panel", time.perf_counter() - start,
+            session=st.session_state.get("session_id"), panel=panel
+        )
 
 def initialize_environment() -> None:
     """
-    Initialize environment variables from .env file and set up logging.
+    Initialize environment variables from .env file and start the rerun timer.
     """
     load_dotenv()
-    print(f"\n\n\n{'='*100}\n")
+    st.session_state._last_checkpoint = None
     log_time("Script started")
 
 def initialize_session_state() -> None:
@@ -53,7 +86,8 @@ def initialize_session_state() -> None:
     Sets up persistent storage for:
     - Chat messages
     - Uploaded files
-    - API keys
+    - API keys, the selected model and the model requests are hedged with
+    - Session identifier
     - Temporary directory
     - UI state flags
     """
@@ -67,30 +101,58 @@ def initialize_session_state() -> None:
         st.session_state.openai_api_key = ""
     if "google_api_key" not in st.session_state:
         st.session_state.google_api_key = ""
+    if "selected_model" not in st.session_state:
+        st.session_state.selected_model = DEFAULT_MODEL
+    if "hedge_model" not in st.session_state:
+        st.session_state.hedge_model = HEDGE_MODEL
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
     if "temp_dir" not in st.session_state:
-        st.session_state.temp_dir = tempfile.mkdtemp()
+        st.session_state.temp_dir = tempfile.mkdtemp(dir=get_upload_root())
 
     log_time("Session state initialized")
 
 def initialize_chromadb() -> None:
     """
-    Initialize ChromaDB vector database with HuggingFace embeddings.
-    
-    Creates a persistent ChromaDB client and collection for storing
-    document embeddings using the all-MiniLM-L6-v2 model.
+    Attach the session to its collection in the shared ChromaDB store.
+
+    The embedding model and client are loaded once per process (see
+    resources.py); each session only gets its own namespaced collection and
+    the document tree summarizing it.
+    The shared document library, if configured, is opened here too so the
+    first question does not pay for loading it.
+
+    The session is registered for idle eviction. If it was evicted since
+    its last run, it gets a fresh collection and temp directory, and the
+    files still in the uploader are re-ingested; their chunks and
+    embeddings come from the ingestion cache.
     """
-    if "chroma_client" not in st.session_state:
-        st.session_state.temp_dir = tempfile.mkdtemp()
-        st.session_state.chroma_client = chromadb.PersistentClient(
-            path=st.session_state.temp_dir
-        )
-        
+    registry = get_session_registry()
+    if "collection" not in st.session_state:
         try:
-            st.session_state.collection = st.session_state.chroma_client.get_or_create_collection(
-                name="pdf_collection", 
-                embedding_function=create_langchain_embedding(HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2"))
-            )
+            st.session_state.collection = get_session_collection(st.session_state.session_id)
+            st.session_state.tree = get_session_tree(st.session_state.session_id)
+            get_library()
+            get_library_tree()
         except Exception as e:
             st.error(f"Error initializing ChromaDB: {str(e)}")
+        registry.register(st.session_state.session_id, st.session_state.temp_dir)
+    elif not registry.touch(st.session_state.session_id):
+        # touch() returns once a running eviction has deleted the old collection
+        _reattach_session(registry)
 
     log_time("ChromaDB initialized")
+
+def _reattach_session(registry) -> None:
+    """Recreate an evicted session's collection, tree and temp directory."""
+    st.session_state.temp_dir = tempfile.mkdtemp(dir=get_upload_root())
+    try:
+        st.session_state.collection = get_session_collection(st.session_state.session_id)
+        st.session_state.tree = get_session_tree(st.session_state.session_id)
+    except Exception as e:
+        st.error(f"Error initializing ChromaDB: {str(e)}")
+    # Every upload counts as new again, so the upload panel re-ingests it
+    st.session_state.processed_files = {}
+    st.session_state.ingestion_job = None
+    st.session_state.ingestion_uploads = {}
+    registry.register(st.session_state.session_id, st.session_state.temp_dir)
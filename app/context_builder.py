@@ -0,0 +1,251 @@
+"""
+Token-budgeted context assembly for LLM requests.
+
+Every request is fitted into a fixed input-token budget: the system prompt
+is always kept, summaries of the documents and sections the question was
+routed to come first within their own share, retrieved chunks are
+deduplicated and added in rank order up to their share of the budget, and
+the remaining tokens go to the most recent chat turns. Prompt size, and with
+it time to first token, therefore stays flat however long the conversation
+gets. The history is trimmed in blocks of earlier turns rather than one
+message per turn, so the kept history starts at the same message for several
+turns in a row and providers keep serving it from their prompt cache.
+"""
+
+import os
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("DOCUDIALOGUE_CONTEXT_TOKEN_BUDGET", "8000"))
+CHUNK_TOKEN_BUDGET = int(os.getenv("DOCUDIALOGUE_CHUNK_TOKEN_BUDGET", "3000"))
+SUMMARY_TOKEN_BUDGET = int(os.getenv("DOCUDIALOGUE_SUMMARY_TOKEN_BUDGET", "1500"))
+# Tokens of history dropped at once when it outgrows its share; 0 drops one turn at a time
+HISTORY_BLOCK_TOKENS = int(os.getenv("DOCUDIALOGUE_HISTORY_BLOCK_TOKENS", "1500"))
+
+# Approximate characters per token when no tokenizer is available for a model
+_CHARS_PER_TOKEN = 4
+# Overhead for role markers and separators around each chat message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Last message of every request: the retrieved context, then the question
+QUESTION_TEMPLATE = """Context:
+{context}
+
+Question: {prompt}"""
+
+OPENAI_ENCODINGS = {
+    "gpt-4o": "o200k_base",
+    "gpt-4o-mini": "o200k_base",
+}
+
+
+@dataclass
+class ContextWindow:
+    """Prompt pieces that fit the token budget for one request."""
+
+    context: str = ""
+    node_ids: list = field(default_factory=list)
+    chunk_ids: list = field(default_factory=list)
+    history: list = field(default_factory=list)
+    tokens: int = 0
+
+
+@lru_cache(maxsize=None)
+def get_encoding(encoding_name: str):
+    """Load a tiktoken encoding, or None when tiktoken or its data is unavailable."""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(encoding_name)
+    except Exception:
+        return None
+
+
+@lru_cache(maxsize=16384)
+def count_tokens(text: str, model: str) -> int:
+    """
+    Count the tokens a model would see for a piece of text.
+
+    OpenAI models use their tiktoken encoding. Gemini has no local tokenizer,
+    so it falls back to a character-based estimate. Results are memoized,
+    which keeps re-counting a long chat history cheap on every turn.
+
+    Args:
+        text (str): Text to count
+        model (str): Selected model name
+
+    Returns:
+        int: Token count
+    """
+    encoding_name = OPENAI_ENCODINGS.get(model)
+    encoding = get_encoding(encoding_name) if encoding_name else None
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return -(-len(text) // _CHARS_PER_TOKEN)
+
+
+def _fingerprint(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def select_summaries(search_results, model: str, budget: int = SUMMARY_TOKEN_BUDGET):
+    """
+    Format the summaries of routed documents and sections within a token budget.
+
+    Summaries are kept in the order retrieval returned them, documents
+    before sections, until the budget is spent.
+
+    Args:
+        search_results (dict): Retrieval results with a "summaries" entry
+        model (str): Selected model name
+        budget (int): Maximum tokens for the summaries
+
+    Returns:
+        tuple[str, list[str], int]: Summary text, kept node IDs and their token count
+    """
+    parts, kept_ids, used = [], [], 0
+    for summary in (search_results or {}).get("summaries", []):
+        if summary["id"] in kept_ids or not summary["summary"]:
+            continue
+        if summary["level"] == "document":
+            part = f"Summary of document {summary['source']}: {summary['summary']}"
+        else:
+            part = (f"Summary of document {summary['source']} "
+                    f"(Pages {summary['first_page']}-{summary['last_page']}): {summary['summary']}")
+        tokens = count_tokens(part, model)
+        if used + tokens > budget:
+            continue
+        parts.append(part)
+        kept_ids.append(summary["id"])
+        used += tokens
+
+    return "\n\n".join(parts), kept_ids, used
+
+
+def select_chunks(search_results, model: str, budget: int = CHUNK_TOKEN_BUDGET):
+    """
+    Format retrieved chunks into a context string within a token budget.
+
+    Duplicate chunks (same ID or same normalized text) are dropped, and
+    chunks are kept in rank order until the budget is spent.
+
+    Args:
+        search_results (dict): Chroma query results
+        model (str): Selected model name
+        budget (int): Maximum tokens for the context
+
+    Returns:
+        tuple[str, list[str], int]: Context string, kept chunk IDs and their token count
+    """
+    if not search_results or not search_results.get('documents'):
+        return "", [], 0
+
+    ids = search_results['ids'][0] if search_results.get('ids') else []
+    seen_ids, seen_texts = set(), set()
+    parts, kept_ids, used = [], [], 0
+    for i, (doc, meta) in enumerate(zip(search_results['documents'][0], search_results['metadatas'][0])):
+        chunk_id = ids[i] if i < len(ids) else str(i)
+        fingerprint = _fingerprint(doc)
+        if chunk_id in seen_ids or fingerprint in seen_texts:
+            continue
+        seen_ids.add(chunk_id)
+        seen_texts.add(fingerprint)
+
+        part = f"Document {meta['source']} (Page {meta['page']}): {doc}"
+        tokens = count_tokens(part, model)
+        if used + tokens > budget:
+            continue
+        parts.append(part)
+        kept_ids.append(chunk_id)
+        used += tokens
+
+    return "\n\n".join(parts), kept_ids, used
+
+
+def select_history(messages, model: str, budget: int, block_tokens: int = HISTORY_BLOCK_TOKENS):
+    """
+    Keep the most recent chat turns that fit a token budget.
+
+    The history is cut, from its oldest message, into blocks of at least
+    block_tokens that each start with a question. While the history does not
+    fit, the oldest block is dropped. Block boundaries do not move as new
+    turns are appended, so the kept history keeps its first message, and the
+    request its cached prefix, until the next block has to go.
+
+    Args:
+        messages (list[dict]): Prior chat messages, oldest first
+        model (str): Selected model name
+        budget (int): Maximum tokens for the history
+        block_tokens (int): Least tokens dropped at once; 0 drops single turns
+
+    Returns:
+        tuple[list[dict], int]: Kept messages, oldest first, and their token count
+    """
+    tokens = [count_tokens(message["content"], model) + MESSAGE_OVERHEAD_TOKENS for message in messages]
+    starts, block = [0], 0
+    for i, message in enumerate(messages):
+        if i and message["role"] == "user" and block >= block_tokens:
+            starts.append(i)
+            block = 0
+        block += tokens[i]
+
+    # Drop whole blocks, oldest first, until the rest fits
+    start, used = 0, sum(tokens)
+    for boundary in starts[1:]:
+        if used <= budget:
+            break
+        used -= sum(tokens[start:boundary])
+        start = boundary
+    # The newest block alone is over budget: drop its messages one at a time
+    while used > budget:
+        used -= tokens[start]
+        start += 1
+
+    # Never open the window with an assistant reply to a dropped question
+    while start < len(messages) and messages[start]["role"] == "assistant":
+        used -= tokens[start]
+        start += 1
+
+    return [{"role": message["role"], "content": message["content"]} for message in messages[start:]], used
+
+
+def build_context_window(system_prompt: str, search_results, history, prompt: str, model: str,
+                         budget: int = CONTEXT_TOKEN_BUDGET,
+                         chunk_budget: int = CHUNK_TOKEN_BUDGET,
+                         summary_budget: int = SUMMARY_TOKEN_BUDGET,
+                         history_block_tokens: int = HISTORY_BLOCK_TOKENS) -> ContextWindow:
+    """
+    Fit the system prompt, summaries, retrieved chunks, history and question into one budget.
+
+    Args:
+        system_prompt (str): Static instructions, without the retrieved context
+        search_results (dict): Retrieval results, optionally with summaries
+        history (list[dict]): Prior chat messages, excluding the current question
+        prompt (str): Current user question, budgeted as sent: wrapped in QUESTION_TEMPLATE
+        model (str): Selected model name
+        budget (int): Total input-token budget for the request
+        chunk_budget (int): Share of the budget reserved for retrieved chunks
+        summary_budget (int): Share of the budget reserved for summaries
+        history_block_tokens (int): Least history tokens dropped at once
+
+    Returns:
+        ContextWindow: Context string, node and chunk IDs, trimmed history and token total
+    """
+    question = QUESTION_TEMPLATE.format(context="", prompt=prompt)
+    fixed = count_tokens(system_prompt, model) + count_tokens(question, model) + 2 * MESSAGE_OVERHEAD_TOKENS
+    summaries, node_ids, summary_tokens = select_summaries(
+        search_results, model, min(summary_budget, max(budget - fixed, 0))
+    )
+    chunks, chunk_ids, chunk_tokens = select_chunks(
+        search_results, model, min(chunk_budget, max(budget - fixed - summary_tokens, 0))
+    )
+    kept_history, history_tokens = select_history(
+        history, model, max(budget - fixed - summary_tokens - chunk_tokens, 0), history_block_tokens
+    )
+    return ContextWindow(
+        context="\n\n".join(part for part in (summaries, chunks) if part),
+        node_ids=node_ids,
+        chunk_ids=chunk_ids,
+        history=kept_history,
+        tokens=fixed + summary_tokens + chunk_tokens + history_tokens
+    )
@@ -0,0 +1,186 @@
+"""
+Incremental document maintenance for the vector store.
+
+Chunk IDs are derived from the document name and a hash of the chunk text,
+so a new version of a document can be reconciled chunk by chunk: stale
+chunks are deleted, new or moved chunks are upserted, and unchanged chunks
+are left alone. Removing a document deletes every chunk whose source is that
+document, which keeps the index the same size as the current upload set.
+
+Every operation optionally mirrors its changes into a lexical (BM25) index
+so keyword retrieval stays in step with the vector store, and into the
+collection's document tree (see document_tree.py) so its summaries do too.
+"""
+
+import hashlib
+from collections import Counter
+import numpy as np
+from document_tree import delete_tree, write_document_tree
+
+
+def make_chunk_ids(source: str, texts, occurrences: Counter = None):
+    """
+    Build content-addressed IDs for a document's chunks.
+
+    Repeated chunk texts within a document (running headers, boilerplate)
+    are told apart by an occurrence counter.
+
+    Args:
+        source (str): Document name
+        texts (list[str]): Chunk texts in document order
+        occurrences (Counter): Counter shared across calls when a document
+            is ingested in several batches
+
+    Returns:
+        list[str]: One ID per chunk
+    """
+    occurrences = Counter() if occurrences is None else occurrences
+    ids = []
+    for text in texts:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+        ids.append(f"{source}-{digest}-{occurrences[digest]}")
+        occurrences[digest] += 1
+    return ids
+
+
+def get_document_chunks(collection, source: str, include_embeddings: bool = False) -> dict:
+    """
+    Fetch the chunks currently stored for a document.
+
+    Args:
+        collection: ChromaDB collection
+        source (str): Document name
+        include_embeddings (bool): Also return the stored vectors
+
+    Returns:
+        dict: Mapping of chunk ID to a dict with text, metadata and optionally embedding
+    """
+    include = ["documents", "metadatas"] + (["embeddings"] if include_embeddings else [])
+    stored = collection.get(where={"source": source}, include=include)
+    chunks = {}
+    for i, chunk_id in enumerate(stored["ids"]):
+        chunks[chunk_id] = {
+            "text": stored["documents"][i],
+            "metadata": stored["metadatas"][i],
+        }
+        if include_embeddings:
+            chunks[chunk_id]["embedding"] = stored["embeddings"][i]
+    return chunks
+
+
+def add_chunks(collection, ids, texts, metadatas, embeddings, lexical_index=None) -> None:
+    """
+    Insert new chunks with precomputed embeddings.
+
+    Args:
+        collection: ChromaDB collection
+        ids (list[str]): Chunk IDs
+        texts (list[str]): Chunk texts
+        metadatas (list[dict]): Per-chunk metadata including the source
+        embeddings: Embedding vectors aligned with texts
+        lexical_index: Optional LexicalIndex to update alongside
+    """
+    collection.add(
+        ids=ids,
+        documents=texts,
+        metadatas=metadatas,
+        embeddings=np.asarray(embeddings, dtype=np.float32).tolist()
+    )
+    if lexical_index is not None:
+        lexical_index.add(ids, texts, metadatas)
+
+
+def sync_document(collection, source: str, texts, metadatas, embeddings, lexical_index=None, tree=None):
+    """
+    Reconcile the stored chunks of a document with its latest version.
+
+    The document's tree is rebuilt whole, since any edit can change which
+    sentences summarize it.
+
+    Args:
+        collection: ChromaDB collection
+        source (str): Document name
+        texts (list[str]): Chunk texts of the new version, in page order
+        metadatas (list[dict]): Per-chunk metadata without the source
+        embeddings: Embedding vectors aligned with texts
+        lexical_index: Optional LexicalIndex to update alongside
+        tree: Optional tree collection to update alongside
+
+    Returns:
+        tuple[int, int]: Number of chunks upserted and deleted
+    """
+    existing = get_document_chunks(collection, source)
+    ids = make_chunk_ids(source, texts)
+    metadatas = [{**meta, "source": source} for meta in metadatas]
+
+    current = set(ids)
+    stale = [chunk_id for chunk_id in existing if chunk_id not in current]
+    if stale:
+        collection.delete(ids=stale)
+        if lexical_index is not None:
+            lexical_index.delete(stale)
+
+    # Only new chunks, or chunks whose metadata moved, need writing
+    changed = [
+        i for i, chunk_id in enumerate(ids)
+        if chunk_id not in existing or existing[chunk_id]["metadata"] != metadatas[i]
+    ]
+    if changed:
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        collection.upsert(
+            ids=[ids[i] for i in changed],
+            documents=[texts[i] for i in changed],
+            metadatas=[metadatas[i] for i in changed],
+            embeddings=vectors[changed].tolist()
+        )
+        if lexical_index is not None:
+            lexical_index.add(
+                [ids[i] for i in changed],
+                [texts[i] for i in changed],
+                [metadatas[i] for i in changed]
+            )
+    if tree is not None:
+        write_document_tree(tree, source, texts, metadatas, embeddings)
+
+    return len(changed), len(stale)
+
+
+def delete_document(collection, source: str, lexical_index=None, tree=None) -> None:
+    """
+    Delete every chunk that belongs to a document.
+
+    Args:
+        collection: ChromaDB collection
+        source (str): Document name
+        lexical_index: Optional LexicalIndex to update alongside
+        tree: Optional tree collection to update alongside
+    """
+    collection.delete(where={"source": source})
+    if lexical_index is not None:
+        lexical_index.delete_source(source)
+    if tree is not None:
+        delete_tree(tree, source)
+
+
+class ReusingEmbeddingFunction:
+    """
+    Embedding function that skips texts whose vectors are already known.
+
+    Used when a new version of a document arrives: unchanged chunks reuse
+    the vectors stored for the previous version and only edited chunks
+    reach the model.
+
+    Args:
+        embed_fn: Callable mapping a list of texts to a list of vectors
+        known (dict): Mapping of chunk text to its stored vector
+    """
+
+    def __init__(self, embed_fn, known: dict):
+        self.embed_fn = embed_fn
+        self.known = known
+
+    def __call__(self, texts):
+        missing = [text for text in texts if text not in self.known]
+        if missing:
+            self.known.update(zip(missing, self.embed_fn(missing)))
+        return [self.known[text] for text in texts]
@@ -0,0 +1,325 @@
+"""
+Hierarchical document index for coarse-to-fine retrieval.
+
+Besides its chunks, every indexed document gets a small tree of nodes, kept
+in a companion collection next to the chunk collection:
+
+- one document node summarizing the whole file
+- one section node per group of DOCUDIALOGUE_TREE_SECTION_PAGES pages
+- the chunks themselves as leaves, in the chunk collection
+
+Each node stores an extractive summary (the sentences that best cover its
+text, chosen once at index time without any model call) and an embedding,
+the normalized centroid of its chunks' vectors. A question is first routed
+to the closest sections, and the dense chunk search then drills down into
+those sections only. The summaries of the routed sections and their
+documents go into the prompt, so a broad question such as "summarize this
+report" gets a bounded overview of the whole file instead of a handful of
+arbitrary chunks, and its cost does not grow with the page count.
+"""
+
+import os
+from collections import Counter
+from dataclasses import dataclass
+import numpy as np
+from chunking import split_sentences
+from lexical_index import tokenize
+
+TREE_SECTION_PAGES = int(os.getenv("DOCUDIALOGUE_TREE_SECTION_PAGES", "8"))
+TREE_SECTION_SENTENCES = int(os.getenv("DOCUDIALOGUE_TREE_SECTION_SENTENCES", "3"))
+TREE_DOCUMENT_SENTENCES = int(os.getenv("DOCUDIALOGUE_TREE_DOCUMENT_SENTENCES", "8"))
+# Sections a question is routed to; 0 searches every chunk without routing
+TREE_ROUTE_SECTIONS = int(os.getenv("DOCUDIALOGUE_TREE_ROUTE_SECTIONS", "6"))
+
+TREE_SUFFIX = "_tree"
+
+# Sentences outside these lengths are fragments, tables or run-on extraction noise
+_MIN_SENTENCE_CHARS = 30
+_MAX_SENTENCE_CHARS = 400
+# A sentence whose terms are mostly covered by a chosen one adds nothing
+_REDUNDANT_OVERLAP = 0.7
+
+
+def tree_collection_name(collection_name: str) -> str:
+    """Name of the collection holding the tree of a chunk collection."""
+    return f"{collection_name}{TREE_SUFFIX}"
+
+
+def summarize(texts, max_sentences: int) -> str:
+    """
+    Pick the sentences that best represent a body of text.
+
+    Terms are weighted by how many sentences use them, ignoring terms so
+    common they carry no signal, and each sentence scores the weight of its
+    distinct terms, normalized by its length. The best sentences that are
+    not redundant with one already chosen are returned in reading order.
+
+    Args:
+        texts (list[str]): Texts to summarize, in reading order
+        max_sentences (int): Most sentences to keep
+
+    Returns:
+        str: Extractive summary
+    """
+    sentences, seen = [], set()
+    for text in texts:
+        for _, sentence in split_sentences(text):
+            sentence = " ".join(sentence.split())
+            # Overlapping chunks repeat sentences
+            if not _MIN_SENTENCE_CHARS <= len(sentence) <= _MAX_SENTENCE_CHARS or sentence.lower() in seen:
+                continue
+            seen.add(sentence.lower())
+            sentences.append(sentence)
+
+    terms = [set(tokenize(sentence)) for sentence in sentences]
+    frequency = Counter(term for sentence_terms in terms for term in sentence_terms)
+    common = max(len(sentences) // 2, 2)
+    scores = [
+        sum(frequency[term] for term in sentence_terms if frequency[term] <= common) / (len(sentence_terms) ** 0.5 or 1)
+        for sentence_terms in terms
+    ]
+
+    chosen = []
+    for i in sorted(range(len(sentences)), key=lambda i: scores[i], reverse=True):
+        if len(chosen) >= max_sentences:
+            break
+        if any(
+            len(terms[i] & terms[j]) > _REDUNDANT_OVERLAP * min(len(terms[i]), len(terms[j]))
+            for j in chosen
+        ):
+            continue
+        chosen.append(i)
+    return " ".join(sentences[i] for i in sorted(chosen))
+
+
+def _unit(vector) -> list:
+    return (vector / (np.linalg.norm(vector) or 1.0)).tolist()
+
+
+class DocumentTreeBuilder:
+    """
+    Build a document's tree nodes from its chunks as they are produced.
+
+    Chunks must arrive in page order. Only the text of the current section
+    is held in memory, so streamed documents can be summarized too.
+
+    Args:
+        source (str): Document name
+        section_pages (int): Pages per section node
+        section_sentences (int): Sentences per section summary
+        document_sentences (int): Sentences in the document summary
+    """
+
+    def __init__(self, source: str, section_pages: int = TREE_SECTION_PAGES,
+                 section_sentences: int = TREE_SECTION_SENTENCES,
+                 document_sentences: int = TREE_DOCUMENT_SENTENCES):
+        self.source = source
+        self.section_pages = section_pages
+        self.section_sentences = section_sentences
+        self.document_sentences = document_sentences
+        self._section = None
+        self._closed = []
+        self._summaries = []
+        self._total = None
+        self._chunks = 0
+        self._first_page = None
+        self._last_page = None
+
+    def add(self, texts, metadatas, embeddings) -> None:
+        """
+        Add chunks in page order.
+
+        Args:
+            texts (list[str]): Chunk texts
+            metadatas (list[dict]): Chunk metadata with the 1-based page
+            embeddings: Embedding vectors aligned with texts
+        """
+        for text, meta, vector in zip(texts, metadatas, embeddings):
+            vector = np.asarray(vector, dtype=np.float32)
+            page = meta["page"]
+            index = (page - 1) // self.section_pages
+            if self._section is None or index != self._section["index"]:
+                self._close_section()
+                self._section = {"index": index, "texts": [], "vector": np.zeros_like(vector),
+                                 "first_page": page, "last_page": page}
+            section = self._section
+            section["texts"].append(text)
+            section["vector"] += vector
+            section["last_page"] = max(section["last_page"], page)
+            self._total = vector.copy() if self._total is None else self._total + vector
+            self._chunks += 1
+            self._first_page = page if self._first_page is None else min(self._first_page, page)
+            self._last_page = page if self._last_page is None else max(self._last_page, page)
+
+    def _close_section(self) -> None:
+        section, self._section = self._section, None
+        if section is None:
+            return
+        summary = summarize(section["texts"], self.section_sentences)
+        self._summaries.append(summary)
+        self._closed.append((
+            f"{self.source}::section-{section['first_page']}",
+            summary,
+            {"source": self.source, "level": "section", "first_page": section["first_page"],
+             "last_page": section["last_page"], "chunks": len(section["texts"])},
+            _unit(section["vector"]),
+        ))
+
+    def take_sections(self):
+        """
+        Hand over the section nodes completed since the previous call.
+
+        Returns:
+            list[tuple]: (id, summary, metadata, embedding) per section node
+        """
+        closed, self._closed = self._closed, []
+        return closed
+
+    def finish(self):
+        """
+        Complete the tree once every chunk was added.
+
+        Returns:
+            list[tuple]: (id, summary, metadata, embedding) for the sections not
+                taken yet and the document node; empty for a document without chunks
+        """
+        self._close_section()
+        nodes = self.take_sections()
+        if self._chunks:
+            nodes.append((
+                f"{self.source}::document",
+                summarize(self._summaries, self.document_sentences),
+                {"source": self.source, "level": "document", "first_page": self._first_page,
+                 "last_page": self._last_page, "chunks": self._chunks},
+                _unit(self._total),
+            ))
+        return nodes
+
+
+def write_nodes(tree, nodes) -> None:
+    """
+    Insert or replace tree nodes.
+
+    Args:
+        tree: Tree collection
+        nodes (list[tuple]): (id, summary, metadata, embedding) per node
+    """
+    if nodes:
+        ids, summaries, metadatas, embeddings = zip(*nodes)
+        tree.upsert(ids=list(ids), documents=list(summaries), metadatas=list(metadatas),
+                    embeddings=list(embeddings))
+
+
+def delete_tree(tree, source: str) -> None:
+    """Delete every node of a document's tree."""
+    tree.delete(where={"source": source})
+
+
+def write_document_tree(tree, source: str, texts, metadatas, embeddings) -> None:
+    """
+    Rebuild a document's tree from all of its chunks.
+
+    Args:
+        tree: Tree collection
+        source (str): Document name
+        texts (list[str]): Chunk texts in page order
+        metadatas (list[dict]): Chunk metadata with the 1-based page
+        embeddings: Embedding vectors aligned with texts
+    """
+    builder = DocumentTreeBuilder(source)
+    builder.add(texts, metadatas, embeddings)
+    delete_tree(tree, source)
+    write_nodes(tree, builder.finish())
+
+
+@dataclass(frozen=True)
+class Route:
+    """
+    Sections a question was routed to, with the summaries to show the model.
+
+    Attributes:
+        sections (tuple): (source, first_page, last_page) of each routed section, best first
+        summaries (tuple): Summary dicts with id, source, level, first_page,
+            last_page and summary; documents first, then sections best first
+    """
+
+    sections: tuple = ()
+    summaries: tuple = ()
+
+    def __bool__(self) -> bool:
+        return bool(self.sections)
+
+    def to_where(self):
+        """
+        Chroma where clause restricting chunks to the routed sections.
+
+        Returns:
+            dict | None: Where clause, or None when nothing was routed
+        """
+        clauses = [
+            {"$and": [{"source": source}, {"page": {"$gte": first_page}}, {"page": {"$lte": last_page}}]}
+            for source, first_page, last_page in self.sections
+        ]
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else {"$or": clauses}
+
+
+def _summary(node_id: str, summary: str, meta: dict) -> dict:
+    return {
+        "id": node_id, "source": meta["source"], "level": meta["level"],
+        "first_page": meta["first_page"], "last_page": meta["last_page"], "summary": summary,
+    }
+
+
+def route(tree, embedding, n_sections: int = TREE_ROUTE_SECTIONS, search_filter=None) -> Route:
+    """
+    Find the sections closest to a question and the documents they belong to.
+
+    Args:
+        tree: Tree collection
+        embedding: Embedding vector of the question
+        n_sections (int): Sections to route to
+        search_filter (SearchFilter): Documents and pages to stay within
+
+    Returns:
+        Route: Routed sections and summaries; empty when the tree has no nodes
+    """
+    if tree is None or not n_sections or not tree.count():
+        return Route()
+
+    conditions = [{"level": "section"}]
+    if search_filter:
+        if search_filter.sources:
+            conditions.append({"source": {"$in": list(search_filter.sources)}})
+        # Sections overlapping the page range
+        if search_filter.first_page is not None:
+            conditions.append({"last_page": {"$gte": search_filter.first_page}})
+        if search_filter.last_page is not None:
+            conditions.append({"first_page": {"$lte": search_filter.last_page}})
+    found = tree.query(
+        query_embeddings=[[float(value) for value in embedding]],
+        n_results=n_sections,
+        where=conditions[0] if len(conditions) == 1 else {"$and": conditions},
+        include=["documents", "metadatas"]
+    )
+    sections = list(zip(found["ids"][0], found["documents"][0], found["metadatas"][0]))
+    if not sections:
+        return Route()
+
+    sources = list(dict.fromkeys(meta["source"] for _, _, meta in sections))
+    documents = tree.get(
+        where={"$and": [{"level": "document"}, {"source": {"$in": sources}}]},
+        include=["documents", "metadatas"]
+    )
+    by_source = {
+        meta["source"]: _summary(node_id, summary, meta)
+        for node_id, summary, meta in zip(documents["ids"], documents["documents"], documents["metadatas"])
+    }
+    return Route(
+        sections=tuple((meta["source"], meta["first_page"], meta["last_page"]) for _, _, meta in sections),
+        summaries=tuple(
+            [by_source[source] for source in sources if source in by_source]
+            + [_summary(node_id, summary, meta) for node_id, summary, meta in sections]
+        )
+    )
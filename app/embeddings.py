@@ -0,0 +1,144 @@
+"""
+Configurable embedding engine for the DocuDialogue application.
+
+The embedding model runs through one of several CPU backends chosen per
+deployment:
+
+- torch: sentence-transformers in fp32 (the original behaviour)
+- torch-int8: the same model with its linear layers dynamically quantized to int8
+- onnx: the model exported to ONNX Runtime
+- onnx-int8: a pre-quantized ONNX file from the model repository
+
+Batch size and thread count are tunable, and vectors written to the
+ingestion cache can be stored as float16 or int8 to cut their size. The
+model and its ML stack are only imported and loaded on first use, so
+creating an embedder is instant.
+"""
+
+import os
+import numpy as np
+
+EMBEDDING_MODEL_NAME = os.getenv("DOCUDIALOGUE_EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+EMBEDDING_BACKEND = os.getenv("DOCUDIALOGUE_EMBEDDING_BACKEND", "torch")
+EMBEDDING_BATCH_SIZE = int(os.getenv("DOCUDIALOGUE_EMBEDDING_BATCH_SIZE", "64"))
+# 0 keeps the library's default thread count
+EMBEDDING_THREADS = int(os.getenv("DOCUDIALOGUE_EMBEDDING_THREADS", "0"))
+ONNX_INT8_FILE = os.getenv("DOCUDIALOGUE_ONNX_INT8_FILE", "onnx/model_quint8_avx2.onnx")
+VECTOR_DTYPE = os.getenv("DOCUDIALOGUE_VECTOR_DTYPE", "float32")
+
+EMBEDDING_BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+VECTOR_DTYPES = ("float32", "float16", "int8")
+
+
+class SentenceTransformerEmbedder:
+    """
+    Batched sentence-transformers embedder with a selectable CPU backend.
+
+    Args:
+        model_name (str): Hugging Face model name
+        backend (str): One of EMBEDDING_BACKENDS
+        batch_size (int): Texts encoded per forward pass
+        threads (int): Intra-op threads for the backend, 0 for the default
+    """
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL_NAME, backend: str = EMBEDDING_BACKEND,
+                 batch_size: int = EMBEDDING_BATCH_SIZE, threads: int = EMBEDDING_THREADS):
+        if backend not in EMBEDDING_BACKENDS:
+            raise ValueError(f"Unknown embedding backend {backend!r}; choose one of {EMBEDDING_BACKENDS}")
+        self.model_name = model_name
+        self.backend = backend
+        self.batch_size = batch_size
+        self.threads = threads
+        self._model = None
+
+    @property
+    def model_id(self) -> str:
+        """Identifier of the model and backend, used to key cached vectors."""
+        return f"{self.model_name}:{self.backend}"
+
+    @property
+    def loaded(self) -> bool:
+        """Whether the model weights are in memory."""
+        return self._model is not None
+
+    @property
+    def model(self):
+        """The sentence-transformers model, loaded on first access."""
+        if self._model is None:
+            self._model = self._load()
+        return self._model
+
+    def _load(self):
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        if self.threads:
+            torch.set_num_threads(self.threads)
+            os.environ.setdefault("OMP_NUM_THREADS", str(self.threads))
+
+        if self.backend == "torch":
+            return SentenceTransformer(self.model_name, device="cpu")
+
+        if self.backend == "torch-int8":
+            model = SentenceTransformer(self.model_name, device="cpu")
+            return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+        # ONNX backends need sentence-transformers' optional optimum[onnxruntime] extra
+        model_kwargs = {"provider": "CPUExecutionProvider"}
+        if self.backend == "onnx-int8":
+            model_kwargs["file_name"] = ONNX_INT8_FILE
+        return SentenceTransformer(self.model_name, device="cpu", backend="onnx", model_kwargs=model_kwargs)
+
+    def __call__(self, texts):
+        if not texts:
+            return []
+        vectors = self.model.encode(
+            list(texts),
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        return list(vectors.astype(np.float32, copy=False))
+
+
+def quantize_vectors(vectors, dtype: str = VECTOR_DTYPE):
+    """
+    Convert float vectors to a compact storage dtype.
+
+    int8 uses symmetric per-vector scaling, so each vector keeps its own
+    dynamic range.
+
+    Args:
+        vectors: 2-D array-like of float vectors
+        dtype (str): One of VECTOR_DTYPES
+
+    Returns:
+        tuple[np.ndarray, np.ndarray | None]: Stored vectors and int8 scales
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if dtype == "float32":
+        return vectors, None
+    if dtype == "float16":
+        return vectors.astype(np.float16), None
+    if dtype == "int8":
+        scales = np.abs(vectors).max(axis=1, keepdims=True) / 127.0 if len(vectors) else np.ones((0, 1))
+        scales[scales == 0] = 1.0
+        return np.round(vectors / scales).astype(np.int8), scales.astype(np.float32)
+    raise ValueError(f"Unknown vector dtype {dtype!r}; choose one of {VECTOR_DTYPES}")
+
+
+def dequantize_vectors(stored, scales=None) -> np.ndarray:
+    """
+    Restore float32 vectors from their storage dtype.
+
+    Args:
+        stored (np.ndarray): Vectors returned by quantize_vectors
+        scales (np.ndarray | None): int8 scales returned by quantize_vectors
+
+    Returns:
+        np.ndarray: float32 vectors
+    """
+    vectors = np.asarray(stored).astype(np.float32)
+    if scales is not None:
+        vectors *= scales
+    return vectors
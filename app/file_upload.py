@@ -3,15 +3,295 @@ PDF document processing module for streamlit application.
 
 This module handles file upload operations, PDF processing, and vector storage integration.
 It provides functionality to split PDFs into chunks and store them in a vector database.
+Chunks and embeddings are looked up in the content-addressed ingestion cache first,
+so a document that was processed before is only bulk inserted. Everything else goes
+through the parallel ingestion pipeline, except very large files, which are streamed
+into the collection in bounded batches. The index is maintained incrementally: removed
+files are deleted from it and new versions of a file only write the chunks that changed.
+A BM25 lexical index is kept in step with the collection for hybrid retrieval, and a
+document tree of section and document summaries for coarse-to-fine retrieval.
+
+Ingestion runs as a background job, so the chat stays responsive while documents are
+processed; the sidebar polls the job's progress and each file is committed as it finishes.
+Parse, split, embed and insert times are recorded as spans for the submitting session.
 """
 
 
 import os
+from collections import Counter
 import streamlit as st
-from tqdm import tqdm
-from langchain_community.document_loaders import PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from config import log_time
+from resources import (
+    get_embedding_function, get_extraction_pool, get_job_manager, get_latency_recorder,
+    get_lexical_index, get_query_cache
+)
+from ingestion_cache import compute_cache_key, load_cached_chunks, store_cached_chunks
+from ingestion import IngestionPipeline, stream_document
+from pdf_extraction import PDF_BACKEND
+from chunking import Chunker
+from document_tree import DocumentTreeBuilder, write_nodes
+from document_store import (
+    ReusingEmbeddingFunction, add_chunks, delete_document, get_document_chunks, make_chunk_ids,
+    sync_document
+)
+
+# Files at least this large are streamed instead of being held in memory whole
+STREAMING_MIN_BYTES = int(float(os.getenv("DOCUDIALOGUE_STREAMING_MIN_MB", "20")) * 1024 * 1024)
+
+# How often the sidebar refreshes the progress of a running ingestion job
+JOB_POLL_SECONDS = float(os.getenv("DOCUDIALOGUE_JOB_POLL_SECONDS", "1.0"))
+
+
+# === Background ingestion (runs on a job worker; no Streamlit calls) ===
+
+def _stream_large_file(collection, lexical_index, tree, file_name, temp_path, embed_fn, split_fn,
+                       query_cache, on_progress, recorder, trace_tags, executor):
+    """
+    Ingest a very large PDF in bounded batches, committing each batch as it is embedded.
+
+    Streamed documents are not written to the ingestion cache, which would
+    require holding every chunk and vector in memory at once. A previous
+    version of the file is deleted before the new one is streamed in, and
+    the pages committed so far can be queried while the rest loads. Section
+    summaries are written as their pages complete, and the document summary
+    once the whole file is in.
+
+    A file never stays half ingested: if streaming fails, its partial chunks,
+    index entries and tree nodes are deleted and the previous version, kept
+    in memory until then, is written back before the error is raised.
+
+    Args:
+        collection: ChromaDB collection to write to
+        lexical_index: LexicalIndex mirroring the collection
+        tree: Document tree of the collection
+        file_name (str): Name of the uploaded file
+        temp_path (str): Path of the temporary copy on disk
+        embed_fn: Embedding function
+        split_fn: Callable splitting one page's text into (offset, chunk) pairs
+        query_cache: Query cache to invalidate after each batch
+        on_progress: Callback receiving an IngestionProgress
+        recorder: LatencyRecorder for the ingestion spans
+        trace_tags (dict): Session and model tags for the spans
+        executor: Process pool extracting page ranges ahead of the embedder
+    """
+    previous = get_document_chunks(collection, file_name, include_embeddings=True)
+    delete_document(collection, file_name, lexical_index, tree)
+    occurrences = Counter()
+    builder = DocumentTreeBuilder(file_name)
+
+    def on_batch(texts, metadatas, embeddings):
+        with recorder.span("insert", **trace_tags):
+            add_chunks(
+                collection,
+                make_chunk_ids(file_name, texts, occurrences),
+                texts,
+                [{**meta, "source": file_name} for meta in metadatas],
+                embeddings,
+                lexical_index
+            )
+            builder.add(texts, metadatas, embeddings)
+            write_nodes(tree, builder.take_sections())
+        query_cache.invalidate(collection.name)
+
+    try:
+        stream_document(
+            temp_path,
+            embed_fn=embed_fn,
+            split_fn=split_fn,
+            on_batch=on_batch,
+            on_progress=on_progress,
+            recorder=recorder,
+            trace_tags=trace_tags,
+            executor=executor
+        )
+        write_nodes(tree, builder.finish())
+    except Exception:
+        delete_document(collection, file_name, lexical_index, tree)
+        if previous:
+            # Document order keeps the restored chunk IDs and tree identical
+            chunks = sorted(
+                previous.values(), key=lambda chunk: (chunk["metadata"]["page"], chunk["metadata"]["offset"])
+            )
+            sync_document(
+                collection, file_name,
+                [chunk["text"] for chunk in chunks],
+                [chunk["metadata"] for chunk in chunks],
+                [chunk["embedding"] for chunk in chunks],
+                lexical_index, tree
+            )
+        raise
+    finally:
+        lexical_index.save()
+        query_cache.invalidate(collection.name)
+
+
+def _run_ingestion_job(job, collection, lexical_index, tree, uploads, embed_fn, executor, query_cache,
+                       recorder):
+    """
+    Ingest a batch of uploads into a collection as a background job.
+
+    Each file is committed to the collection in one step when it finishes
+    and recorded on the job, so the UI only marks it processed once its
+    chunks are searchable.
+
+    Args:
+        job: Job record to report progress and results on
+        collection: ChromaDB collection of the submitting session
+        lexical_index: LexicalIndex mirroring the collection
+        tree: Document tree of the collection
+        uploads (list[dict]): Files with name, file_id, path, cache_key and
+            whether they replace a previously indexed version
+        embed_fn: Embedding function
+        executor: Process pool for page extraction
+        query_cache: Query cache to invalidate when the collection changes
+        recorder: LatencyRecorder for the ingestion spans
+    """
+    # Chunks keep their real page number and offset
+    chunker = Chunker()
+    uploads_by_name = {upload["name"]: upload for upload in uploads}
+    trace_tags = {"session": job.owner, "model": embed_fn.model_id}
+
+    def commit(file_name, texts, metadatas, embeddings):
+        with recorder.span("insert", **trace_tags):
+            sync_document(collection, file_name, texts, metadatas, embeddings, lexical_index, tree)
+            lexical_index.save()
+        # Cached answers may no longer reflect the collection
+        query_cache.invalidate(collection.name)
+        job.commit(file_name, uploads_by_name[file_name]["file_id"])
+
+    def set_progress(progress):
+        job.progress = progress
+
+    try:
+        pipeline_uploads = []
+        for upload in uploads:
+            file_name = upload["name"]
+            try:
+                # Reuse cached chunks and vectors for known content
+                cached = load_cached_chunks(upload["cache_key"])
+                if cached is not None:
+                    commit(file_name, *cached)
+                elif os.path.getsize(upload["path"]) >= STREAMING_MIN_BYTES:
+                    _stream_large_file(
+                        collection, lexical_index, tree, file_name, upload["path"], embed_fn,
+                        chunker, query_cache, set_progress, recorder, trace_tags, executor
+                    )
+                    job.commit(file_name, upload["file_id"])
+                else:
+                    pipeline_uploads.append(upload)
+            except Exception as e:
+                job.fail_item(file_name, e)
+
+        if pipeline_uploads:
+            # Chunks unchanged since a previous version keep their vectors
+            known_vectors = {}
+            for upload in pipeline_uploads:
+                if upload["replaces"]:
+                    stored = get_document_chunks(collection, upload["name"], include_embeddings=True)
+                    known_vectors.update((chunk["text"], chunk["embedding"]) for chunk in stored.values())
+
+            def on_document(file_name, texts, metadatas, embeddings):
+                store_cached_chunks(uploads_by_name[file_name]["cache_key"], texts, metadatas, embeddings)
+                commit(file_name, texts, metadatas, embeddings)
+
+            pipeline = IngestionPipeline(
+                embed_fn=ReusingEmbeddingFunction(embed_fn, known_vectors),
+                split_fn=chunker,
+                executor=executor,
+                recorder=recorder,
+                trace_tags=trace_tags
+            )
+            errors = pipeline.run(
+                [(upload["name"], upload["path"]) for upload in pipeline_uploads],
+                on_progress=set_progress,
+                on_document=on_document
+            )
+            for file_name, error in errors.items():
+                job.fail_item(file_name, error)
+    finally:
+        # Cleanup temporary files
+        for upload in uploads:
+            if os.path.exists(upload["path"]):
+                os.remove(upload["path"])
+
+
+# === Streamlit UI ===
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def _render_ingestion_job(job_id):
+    """
+    Show a running ingestion job's per-stage progress, refreshing on its own.
+
+    Only this fragment reruns while polling; once the job is done the whole
+    app reruns so the results are merged into the session.
+
+    Args:
+        job_id (str): ID of the session's ingestion job
+    """
+    job = get_job_manager().get(job_id)
+    if job is None or job.done:
+        st.rerun()
+
+    progress = job.progress
+    with st.status(job.label, expanded=True):
+        if progress is None:
+            st.caption("Waiting for a worker...")
+            return
+        st.progress(
+            progress.pages_extracted / max(progress.pages_total, 1),
+            text=f"Extracting pages: {progress.pages_extracted}/{progress.pages_total}"
+        )
+        st.progress(
+            progress.chunks_embedded / max(progress.chunks_split, 1),
+            text=f"Embedding chunks: {progress.chunks_embedded}/{progress.chunks_split}"
+        )
+        st.caption(f"Files done: {progress.files_done}/{progress.files_total}")
+
+
+def _merge_finished_job():
+    """
+    Record the results of the session's ingestion job once it has finished.
+
+    Returns:
+        Job | None: The session's job if it is still running
+    """
+    job_id = st.session_state.ingestion_job
+    if job_id is None:
+        return None
+
+    manager = get_job_manager()
+    job = manager.get(job_id)
+    if job is not None and not job.done:
+        return job
+
+    if job is not None:
+        results = job.results()
+        for file_name, file_id in results.items():
+            st.session_state.processed_files[file_name] = file_id
+        # Files the job did not commit are not resubmitted until they change
+        for file_name, (file_id, cache_key) in st.session_state.ingestion_uploads.items():
+            if file_name not in results:
+                st.session_state.failed_files[file_id] = cache_key
+        errors = job.errors()
+        for file_name, error in errors.items():
+            st.error(f"Error adding documents from {file_name}: {str(error)}. Upload it again to retry.")
+        if job.error is not None:
+            st.error(f"Error processing files: {str(job.error)}")
+        elif not errors:
+            st.toast('Documents processed successfully!', icon='✅')
+        manager.forget(job_id)
+
+    st.session_state.ingestion_job = None
+    st.session_state.ingestion_uploads = {}
+    return None
+
+
+def _upload_cache_key(uploaded_file) -> str:
+    """Derive the ingestion cache key of an upload from its content and processing settings."""
+    return compute_cache_key(
+        uploaded_file.getbuffer(), Chunker().config_id, get_embedding_function().model_id, PDF_BACKEND
+    )
+
 
 def handle_file_upload_and_processing(uploaded_files):
     """
@@ -20,78 +300,107 @@ def handle_file_upload_and_processing(uploaded_files):
     Args:
         uploaded_files: List of uploaded file objects from Streamlit
 
-    The function performs the following operations:
+    Renders into the sidebar, so it must be called inside a ``with st.sidebar``
+    block. The function performs the following operations:
     - Maintains state of processed files
-    - Splits PDF documents into chunks
-    - Stores document chunks in vector database
+    - Deletes the chunks of removed files from the vector database
+    - Submits new and re-uploaded files as a background ingestion job, skipping
+      files that failed until they are uploaded again or their content changes
+    - Polls the running job's progress in the sidebar
     - Manages temporary file cleanup
     """
 
-    if "files_processed" not in st.session_state:
-        st.session_state.files_processed = False
-        
     if "processed_files" not in st.session_state:
-        st.session_state.processed_files = set()
+        # Maps each indexed file name to the upload it was indexed from
+        st.session_state.processed_files = {}
+
+    if "ingestion_job" not in st.session_state:
+        st.session_state.ingestion_job = None
+
+    if "ingestion_uploads" not in st.session_state:
+        # Maps each file name in the running job to its upload's file ID and cache key
+        st.session_state.ingestion_uploads = {}
+
+    if "failed_files" not in st.session_state:
+        # Maps the file ID of each upload that failed to ingest to its cache key
+        st.session_state.failed_files = {}
+
+    running_job = _merge_finished_job()
+
+    # Delete documents that were removed from the uploader
+    current_files = {file.name: file.file_id for file in uploaded_files or []}
+    st.session_state.failed_files = {
+        file_id: cache_key for file_id, cache_key in st.session_state.failed_files.items()
+        if file_id in current_files.values()
+    }
+    removed_files = set(st.session_state.processed_files) - set(current_files)
+    if removed_files:
+        lexical_index = get_lexical_index(st.session_state.collection.name)
+        try:
+            for file_name in removed_files:
+                delete_document(st.session_state.collection, file_name, lexical_index, st.session_state.tree)
+                del st.session_state.processed_files[file_name]
+            lexical_index.save()
+            get_query_cache().invalidate(st.session_state.collection.name)
+        except Exception as e:
+            st.error(f"Error removing documents: {str(e)}")
+        else:
+            # The chat only reruns with the app, so it would still list the removed documents
+            st.rerun()
 
     if uploaded_files:
-        st.sidebar.metric("Files Uploaded", f"{len(uploaded_files)} PDFs")
-        
-        # Determine which files need processing
-        current_files = {file.name for file in uploaded_files}
-        new_files = current_files - st.session_state.processed_files
-        
-        if new_files:
+        st.metric("Files Uploaded", f"{len(uploaded_files)} PDFs")
+
+        # Determine which files are new or were re-uploaded; uploads made
+        # while a job runs are picked up once it finishes
+        failed_files = st.session_state.failed_files
+        new_files = [
+            file for file in uploaded_files
+            if st.session_state.processed_files.get(file.name) != file.file_id
+            and not (file.file_id in failed_files and failed_files[file.file_id] == _upload_cache_key(file))
+        ]
+
+        if new_files and running_job is None:
+            uploads = []
             try:
-                for uploaded_file in uploaded_files:
-                    if uploaded_file.name not in st.session_state.processed_files:
-                        # Create temporary file for PDF processing
-                        temp_path = os.path.join(st.session_state.temp_dir, uploaded_file.name)
-                        with open(temp_path, "wb") as f:
-                            f.write(uploaded_file.getbuffer())
-                        
-                        # Load and process PDF
-                        loader = PyPDFLoader(temp_path)
-                        pages = loader.load()
-                        
-                        # Configure text splitting parameters
-                        text_splitter = RecursiveCharacterTextSplitter(
-                            chunk_size=1500,
-                            chunk_overlap=300
-                        )
-                        chunks = []
-                        for page in tqdm(pages, desc="Splitting documents"):
-                            chunks.extend(text_splitter.split_documents([page]))
-                        
-                        # Prepare data for vector store
-                        texts = [chunk.page_content for chunk in chunks]
-                        metadatas = [{"source": uploaded_file.name, "page": i} for i, _ in enumerate(chunks)]
-                        ids = [f"{uploaded_file.name}-{i}" for i in range(len(chunks))]
-                        
-                        try:
-                            # Store document chunks in vector database
-                            st.session_state.collection.add(
-                                documents=texts,
-                                metadatas=metadatas,
-                                ids=ids
-                            )
-                            # Add to processed files set after successful processing
-                            st.session_state.processed_files.add(uploaded_file.name)
-                        except Exception as e:
-                            st.error(f"Error adding documents: {str(e)}")
-                        
-                        # Cleanup temporary file
-                        os.remove(temp_path)
-
-                st.toast('Documents processed successfully!', icon='✅')
-                
+                for uploaded_file in new_files:
+                    # Create temporary file for the extraction workers
+                    temp_path = os.path.join(st.session_state.temp_dir, uploaded_file.name)
+                    with open(temp_path, "wb") as f:
+                        f.write(uploaded_file.getbuffer())
+                    uploads.append({
+                        "name": uploaded_file.name,
+                        "file_id": uploaded_file.file_id,
+                        "path": temp_path,
+                        "cache_key": _upload_cache_key(uploaded_file),
+                        "replaces": uploaded_file.name in st.session_state.processed_files,
+                    })
+
+                running_job = get_job_manager().submit(
+                    st.session_state.session_id,
+                    f"Processing {len(uploads)} document(s)...",
+                    _run_ingestion_job,
+                    st.session_state.collection,
+                    get_lexical_index(st.session_state.collection.name),
+                    st.session_state.tree,
+                    uploads,
+                    get_embedding_function(),
+                    get_extraction_pool(),
+                    get_query_cache(),
+                    get_latency_recorder()
+                )
+                st.session_state.ingestion_job = running_job.job_id
+                st.session_state.ingestion_uploads = {
+                    upload["name"]: (upload["file_id"], upload["cache_key"]) for upload in uploads
+                }
             except Exception as e:
                 st.error(f"Error processing files: {str(e)}")
-        
-        # Handle case when files are removed
-        if len(current_files) < len(st.session_state.processed_files):
-            st.session_state.processed_files = current_files
-    else:
-        # Reset processed files when no files are uploaded
-        st.session_state.processed_files = set()
+                for upload in uploads:
+                    st.session_state.failed_files[upload["file_id"]] = upload["cache_key"]
+                    if os.path.exists(upload["path"]):
+                        os.remove(upload["path"])
+
+        if running_job is not None:
+            _render_ingestion_job(running_job.job_id)
 
     log_time("File processing completed")
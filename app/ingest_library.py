@@ -0,0 +1,213 @@
+"""
+Headless bulk indexer for the DocuDialogue document library.
+
+Walks a directory tree for PDFs and indexes them into a persistent shared
+library (see library.py) with the same chunking, embedding and ingestion
+cache as the app's uploader. Extraction runs on parallel worker processes.
+Progress is checkpointed to the library's manifest after every batch of
+files, so an interrupted run resumes where it stopped, and files that have
+not changed since the last run are skipped. Each file's document tree is
+written with its chunks; files indexed before the library had a tree get
+theirs from the chunks already stored.
+
+Usage:
+    python app/ingest_library.py /path/to/pdfs --library-dir /srv/docudialogue/library
+
+Point DOCUDIALOGUE_LIBRARY_DIR at the same directory to make the app open it.
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from document_store import delete_document, get_document_chunks, make_chunk_ids, sync_document
+from document_tree import write_document_tree
+from embeddings import SentenceTransformerEmbedder
+from ingestion import EXTRACT_WORKERS, ExtractionPool, IngestionPipeline
+from chunking import Chunker
+from ingestion_cache import compute_cache_key, load_cached_chunks, store_cached_chunks
+from pdf_extraction import PDF_BACKEND
+from library import LIBRARY_DIR, Manifest, open_library, open_library_tree
+
+
+def find_pdfs(root: str):
+    """
+    List the PDFs under a directory tree.
+
+    Args:
+        root (str): Directory to walk
+
+    Returns:
+        list[tuple[str, str]]: (path relative to root, absolute path), sorted
+    """
+    found = []
+    for directory, _, names in os.walk(root):
+        for name in names:
+            if name.lower().endswith(".pdf"):
+                path = os.path.join(directory, name)
+                found.append((os.path.relpath(path, root).replace(os.sep, "/"), path))
+    return sorted(found)
+
+
+def commit_document(collection, lexical_index, tree, source, texts, metadatas, embeddings) -> None:
+    """
+    Write a document and its tree to the library, replacing any previous version.
+
+    The BM25 entries are rebuilt from scratch, since an interrupted run
+    may have stored chunks in the collection that never reached the
+    saved BM25 index.
+    """
+    sync_document(collection, source, texts, metadatas, embeddings, tree=tree)
+    lexical_index.delete_source(source)
+    lexical_index.add(
+        make_chunk_ids(source, texts), texts, [{**meta, "source": source} for meta in metadatas]
+    )
+
+
+def backfill_trees(collection, tree, sources) -> int:
+    """
+    Build the missing trees of indexed documents from their stored chunks.
+
+    Args:
+        collection: Library collection
+        tree: Library tree collection
+        sources (list[str]): Documents that should have a tree
+
+    Returns:
+        int: Number of trees built
+    """
+    documents = tree.get(where={"level": "document"}, include=["metadatas"])
+    present = {meta["source"] for meta in documents["metadatas"]}
+    built = 0
+    for source in sources:
+        if source in present:
+            continue
+        chunks = sorted(
+            get_document_chunks(collection, source, include_embeddings=True).values(),
+            key=lambda chunk: (chunk["metadata"]["page"], chunk["metadata"]["offset"])
+        )
+        if chunks:
+            write_document_tree(
+                tree, source, [chunk["text"] for chunk in chunks], [chunk["metadata"] for chunk in chunks],
+                [chunk["embedding"] for chunk in chunks]
+            )
+            built += 1
+    return built
+
+
+def index_batch(batch, collection, lexical_index, tree, manifest, embed_fn, chunker, executor):
+    """
+    Index one batch of files and return the errors keyed by source.
+
+    Args:
+        batch (list[tuple[str, str]]): (source, path) pairs
+        collection: Library collection
+        lexical_index: Library BM25 index
+        tree: Library tree collection
+        manifest (Manifest): Checkpoint to record committed files in
+        embed_fn: Embedding function with a model_id
+        chunker (Chunker): Splits each page into chunks
+        executor: Process pool for page extraction
+
+    Returns:
+        dict: Mapping of source to the exception that failed it
+    """
+    paths = dict(batch)
+    cache_keys = {}
+    pipeline_documents = []
+    errors = {}
+
+    def commit(source, texts, metadatas, embeddings):
+        commit_document(collection, lexical_index, tree, source, texts, metadatas, embeddings)
+        manifest.record(source, paths[source], len(texts))
+
+    for source, path in batch:
+        try:
+            with open(path, "rb") as f:
+                cache_keys[source] = compute_cache_key(
+                    f.read(), chunker.config_id, embed_fn.model_id, PDF_BACKEND
+                )
+            cached = load_cached_chunks(cache_keys[source])
+            if cached is not None:
+                commit(source, *cached)
+            else:
+                pipeline_documents.append((source, path))
+        except Exception as e:
+            errors[source] = e
+
+    def on_document(source, texts, metadatas, embeddings):
+        store_cached_chunks(cache_keys[source], texts, metadatas, embeddings)
+        commit(source, texts, metadatas, embeddings)
+
+    if pipeline_documents:
+        pipeline = IngestionPipeline(embed_fn=embed_fn, split_fn=chunker, executor=executor)
+        errors.update(pipeline.run(pipeline_documents, on_document=on_document))
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("root", help="Directory tree to index")
+    parser.add_argument("--library-dir", default=LIBRARY_DIR or None,
+                        help="Library to write (default: DOCUDIALOGUE_LIBRARY_DIR)")
+    parser.add_argument("--workers", type=int, default=EXTRACT_WORKERS, help="Extraction processes")
+    parser.add_argument("--batch-files", type=int, default=32, help="Files per checkpoint")
+    parser.add_argument("--prune", action="store_true", help="Remove indexed files that no longer exist")
+    args = parser.parse_args()
+    if not args.library_dir:
+        parser.error("--library-dir or DOCUDIALOGUE_LIBRARY_DIR is required")
+
+    os.makedirs(args.library_dir, exist_ok=True)
+    collection, lexical_index = open_library(args.library_dir, create=True)
+    tree = open_library_tree(args.library_dir, create=True)
+    manifest = Manifest.load(args.library_dir)
+
+    files = find_pdfs(args.root)
+    if args.prune:
+        present = {source for source, _ in files}
+        for source in [source for source in manifest.entries if source not in present]:
+            delete_document(collection, source, lexical_index, tree)
+            manifest.forget(source)
+        lexical_index.save()
+        manifest.save()
+
+    todo = [(source, path) for source, path in files if not manifest.is_current(source, path)]
+    # Files about to be indexed get their tree with their chunks
+    pending = {source for source, _ in todo}
+    built = backfill_trees(collection, tree, [source for source in manifest.entries if source not in pending])
+    if built:
+        print(f"Built the document tree of {built} already indexed files")
+    print(f"{len(files)} PDFs found, {len(files) - len(todo)} already indexed, {len(todo)} to index")
+    if not todo:
+        manifest.save()
+        return
+
+    embed_fn = SentenceTransformerEmbedder()
+    chunker = Chunker()
+    executor = ExtractionPool(max_workers=args.workers, mp_context=multiprocessing.get_context("spawn"))
+    failed = {}
+    start = time.perf_counter()
+    try:
+        for offset in range(0, len(todo), args.batch_files):
+            batch = todo[offset:offset + args.batch_files]
+            errors = index_batch(batch, collection, lexical_index, tree, manifest, embed_fn, chunker, executor)
+            # The BM25 index is saved before the manifest, so a checkpoint
+            # never lists a file whose chunks are missing from it
+            lexical_index.save()
+            manifest.save()
+            failed.update(errors)
+            done = offset + len(batch)
+            rate = done / (time.perf_counter() - start)
+            print(f"{done}/{len(todo)} files ({rate:.1f} files/s), {collection.count()} chunks in library")
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+    for source, error in failed.items():
+        print(f"Failed to index {source}: {error}", file=sys.stderr)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,641 @@
+"""
+Pipelined PDF ingestion engine for the DocuDialogue application.
+
+Ingestion runs as three overlapping stages so a batch of uploads uses every
+core instead of one:
+
+1. Extraction: page ranges of every PDF are read in a process pool
+2. Splitting: extracted pages are split into chunks as soon as they arrive,
+   each chunk keeping its real page number and offset in the page
+3. Embedding: chunks are embedded in large batches on a dedicated worker thread
+
+Stages overlap across files, so one document can be embedding while another
+is still being extracted. Progress and finished documents are reported from
+the calling thread only, which keeps the callbacks safe for Streamlit.
+
+Very large PDFs use the streaming mode instead (stream_document): pages are
+read lazily, chunked on the fly and flushed to the store in fixed-size
+batches through a bounded queue, so peak memory does not grow with the
+document and already flushed pages are searchable while the rest loads.
+Given a process pool, streaming also extracts a few page ranges in parallel.
+
+Text is extracted by the backend chosen in pdf_extraction, and each page
+is bounded by its page timeout, so one malformed page cannot stall a file.
+A native parser stuck inside one call cannot be interrupted from its worker,
+so the coordinator also gives every page range a deadline: when it passes,
+the pool's workers are killed and replaced (ExtractionPool) and the range's
+pages are ingested without text.
+
+Both modes can record parse, split and embed spans on a LatencyRecorder.
+"""
+
+import os
+import queue
+import sys
+import threading
+import time
+import weakref
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, CancelledError, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from pdf_extraction import PAGE_TIMEOUT_SECONDS, PDF_BACKEND, extract_page_text, open_pdf
+
+EXTRACT_WORKERS = int(os.getenv("DOCUDIALOGUE_EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+PAGES_PER_TASK = int(os.getenv("DOCUDIALOGUE_PAGES_PER_TASK", "16"))
+EMBED_BATCH_SIZE = int(os.getenv("DOCUDIALOGUE_EMBED_BATCH_SIZE", "256"))
+STREAM_BATCH_SIZE = int(os.getenv("DOCUDIALOGUE_STREAM_BATCH_SIZE", "128"))
+STREAM_MAX_PENDING_BATCHES = int(os.getenv("DOCUDIALOGUE_STREAM_MAX_PENDING_BATCHES", "2"))
+
+# How often the coordinator wakes up to drain results and report progress
+_POLL_INTERVAL = 0.1
+# A task counts as running once it is queued for a worker, so it may still
+# wait for one other range before it starts: allow twice the page budget
+_RANGE_DEADLINE_FACTOR = 2
+
+
+@dataclass
+class IngestionProgress:
+    """Per-stage counters reported while a pipeline run is in flight."""
+
+    files_total: int = 0
+    files_done: int = 0
+    pages_total: int = 0
+    pages_extracted: int = 0
+    chunks_split: int = 0
+    chunks_embedded: int = 0
+
+
+def count_pages(path: str, backend: str = PDF_BACKEND) -> int:
+    """
+    Count the pages of a PDF without extracting any text.
+
+    Args:
+        path (str): Path to the PDF file
+        backend (str): Extraction backend to open the file with
+
+    Returns:
+        int: Number of pages
+    """
+    with open_pdf(path, backend) as document:
+        return len(document)
+
+
+def extract_page_range(path: str, start: int, stop: int, backend: str = PDF_BACKEND,
+                       page_timeout: float = PAGE_TIMEOUT_SECONDS):
+    """
+    Extract the text of a contiguous page range. Runs inside worker processes.
+
+    Args:
+        path (str): Path to the PDF file
+        start (int): First page index (inclusive)
+        stop (int): Last page index (exclusive)
+        backend (str): Extraction backend to open the file with
+        page_timeout (float): Seconds allowed per page; a page exceeding it yields no text
+
+    Returns:
+        list[tuple[int, str]]: (page index, page text) pairs in page order
+    """
+    with open_pdf(path, backend) as document:
+        return [(number, extract_page_text(document, number, page_timeout)) for number in range(start, stop)]
+
+
+class ExtractionPool:
+    """
+    Process pool for page extraction whose workers can be killed and replaced.
+
+    A task stuck in native code never returns its worker, and a single
+    worker cannot be killed without breaking a ProcessPoolExecutor, so a
+    hung task replaces the whole pool. Tasks of other callers that were
+    queued or running on the old pool then fail with BrokenProcessPool or
+    CancelledError, and replace() returning False tells that such a task
+    should simply be submitted again.
+
+    Args:
+        max_workers (int): Worker processes
+        mp_context: Optional multiprocessing context, e.g. spawn
+    """
+
+    def __init__(self, max_workers: int = EXTRACT_WORKERS, mp_context=None):
+        self.max_workers = max_workers
+        self.mp_context = mp_context
+        self._lock = threading.Lock()
+        self._executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=mp_context)
+        self._futures = weakref.WeakSet()
+
+    def submit(self, fn, *args):
+        """Submit a task to the current pool and return its future."""
+        with self._lock:
+            future = self._executor.submit(fn, *args)
+            self._futures.add(future)
+            return future
+
+    def replace(self, future) -> bool:
+        """
+        Kill the workers of the future's pool and start a new pool.
+
+        Args:
+            future: Task that hung or broke the pool
+
+        Returns:
+            bool: False when the future's pool was already replaced
+        """
+        with self._lock:
+            if future not in self._futures:
+                return False
+            executor = self._executor
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=self.mp_context)
+            self._futures = weakref.WeakSet()
+        # ProcessPoolExecutor.kill_workers() only exists from Python 3.14 on
+        if hasattr(executor, "kill_workers"):
+            executor.kill_workers()
+        else:
+            for process in list((executor._processes or {}).values()):
+                process.kill()
+        executor.shutdown(wait=False, cancel_futures=True)
+        return True
+
+    def shutdown(self, wait: bool = True, cancel_futures: bool = False) -> None:
+        """Shut down the current pool."""
+        with self._lock:
+            self._executor.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+
+def _range_expired(future, running_since: dict, pages: int, page_timeout: float, now: float) -> bool:
+    """Whether a page range task overran its deadline; records when it started running."""
+    if not page_timeout or future.done():
+        return False
+    if future not in running_since:
+        if future.running():
+            running_since[future] = now
+        return False
+    return now - running_since[future] > _RANGE_DEADLINE_FACTOR * page_timeout * pages
+
+
+def _skip_range(path: str, start: int, stop: int, page_timeout: float):
+    """Log a page range that overran its deadline and return its pages without text."""
+    print(f"Skipped pages {start + 1}-{stop} of {os.path.basename(path)}: "
+          f"extraction exceeded {page_timeout:g} s per page", file=sys.stderr)
+    return [(number, "") for number in range(start, stop)]
+
+
+class _DocumentState:
+    """Book-keeping for one document moving through the pipeline."""
+
+    def __init__(self, name: str, path: str):
+        self.name = name
+        self.path = path
+        self.ranges_pending = None
+        self.texts = {}
+        self.metadatas = {}
+        self.vectors = {}
+        self.failed = False
+        self.finished = False
+        self.started = time.perf_counter()
+        self.split_seconds = 0.0
+
+    def is_complete(self) -> bool:
+        return (
+            not self.failed and not self.finished and self.ranges_pending == 0
+            and len(self.vectors) == len(self.texts)
+        )
+
+    def ordered_results(self):
+        texts, metadatas, embeddings = [], [], []
+        for start in sorted(self.texts):
+            texts.extend(self.texts[start])
+            metadatas.extend(self.metadatas[start])
+            embeddings.extend(self.vectors[start])
+        return texts, metadatas, embeddings
+
+
+class IngestionPipeline:
+    """
+    Extract, split and embed many PDFs with overlapping stages.
+
+    Args:
+        embed_fn: Callable mapping a list of texts to a list of vectors
+        split_fn: Callable mapping one page's text to (offset, chunk text) pairs
+        executor: Optional ExtractionPool to reuse; one is created per run otherwise
+        pages_per_task (int): Pages extracted per worker task
+        embed_batch_size (int): Target number of chunks per embedding call
+        recorder: Optional LatencyRecorder for parse, split and embed spans
+        trace_tags (dict): Tags added to every recorded span, e.g. session and model
+        backend (str): PDF extraction backend
+        page_timeout (float): Seconds allowed per page
+    """
+
+    def __init__(self, embed_fn, split_fn, executor=None,
+                 pages_per_task: int = PAGES_PER_TASK, embed_batch_size: int = EMBED_BATCH_SIZE,
+                 recorder=None, trace_tags=None, backend: str = PDF_BACKEND,
+                 page_timeout: float = PAGE_TIMEOUT_SECONDS):
+        self.embed_fn = embed_fn
+        self.split_fn = split_fn
+        self.executor = executor
+        self.backend = backend
+        self.page_timeout = page_timeout
+        self.pages_per_task = pages_per_task
+        self.embed_batch_size = embed_batch_size
+        self.recorder = recorder
+        self.trace_tags = trace_tags or {}
+
+    def _record(self, name: str, seconds: float) -> None:
+        if self.recorder is not None:
+            self.recorder.record(name, seconds, **self.trace_tags)
+
+    # === Embedding stage ===
+
+    def _embed_worker(self, inbox: queue.Queue, outbox: queue.Queue) -> None:
+        """Embed queued chunk groups in batches until a None sentinel arrives."""
+        while True:
+            item = inbox.get()
+            if item is None:
+                return
+            items, size, stop = [item], len(item[2]), False
+            # Greedily merge whatever is already queued into one large batch
+            while size < self.embed_batch_size:
+                try:
+                    item = inbox.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                items.append(item)
+                size += len(item[2])
+
+            try:
+                started = time.perf_counter()
+                vectors = self.embed_fn([text for _, _, texts in items for text in texts])
+                self._record("embed", time.perf_counter() - started)
+            except Exception as e:
+                for name, start, _ in items:
+                    outbox.put((name, start, e))
+            else:
+                offset = 0
+                for name, start, texts in items:
+                    outbox.put((name, start, vectors[offset:offset + len(texts)]))
+                    offset += len(texts)
+            if stop:
+                return
+
+    # === Coordinator ===
+
+    def run(self, documents, on_progress=None, on_document=None):
+        """
+        Ingest a batch of documents.
+
+        Args:
+            documents: Iterable of (name, path) pairs
+            on_progress: Optional callback receiving an IngestionProgress
+            on_document: Optional callback receiving (name, texts, metadatas, embeddings)
+                as soon as each document is fully embedded; metadatas hold each
+                chunk's 1-based page number and offset in the page
+
+        Returns:
+            dict: Mapping of document name to the exception that failed it
+        """
+        states = {name: _DocumentState(name, path) for name, path in documents}
+        progress = IngestionProgress(files_total=len(states))
+        errors = {}
+
+        executor = self.executor or ExtractionPool(max_workers=EXTRACT_WORKERS)
+        inbox, outbox = queue.Queue(), queue.Queue()
+        embedder = threading.Thread(target=self._embed_worker, args=(inbox, outbox), daemon=True)
+        embedder.start()
+
+        def fail(state, error):
+            if not state.failed:
+                state.failed = True
+                errors[state.name] = error
+                progress.files_done += 1
+
+        pending, running_since = {}, {}
+
+        def submit(kind, state, start=None, stop=None):
+            if kind == "count":
+                future = executor.submit(count_pages, state.path, self.backend)
+            else:
+                future = executor.submit(
+                    extract_page_range, state.path, start, stop, self.backend, self.page_timeout
+                )
+            pending[future] = (kind, state, start, stop)
+
+        try:
+            for state in states.values():
+                submit("count", state)
+            in_flight = 0
+
+            while pending or in_flight:
+                done, expired = set(), set()
+                if pending:
+                    done, _ = wait(pending, timeout=_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+                    now = time.perf_counter()
+                    expired = {
+                        future for future, (kind, _, start, stop) in pending.items()
+                        if kind == "extract"
+                        and _range_expired(future, running_since, stop - start, self.page_timeout, now)
+                    }
+
+                # Extraction results feed the splitting stage
+                for future in done | expired:
+                    kind, state, start, stop = pending.pop(future)
+                    running_since.pop(future, None)
+                    # The pool is replaced even for a failed document, to free its workers
+                    if future in expired:
+                        executor.replace(future)
+                        result = _skip_range(state.path, start, stop, self.page_timeout)
+                    else:
+                        try:
+                            result = future.result()
+                        except (BrokenProcessPool, CancelledError) as e:
+                            # A task that broke the current pool fails its document; one
+                            # whose pool was replaced under it runs again on the new pool
+                            if executor.replace(future):
+                                fail(state, e)
+                            elif not state.failed:
+                                submit(kind, state, start, stop)
+                            continue
+                        except Exception as e:
+                            fail(state, e)
+                            continue
+                    if state.failed:
+                        continue
+
+                    if kind == "count":
+                        state.ranges_pending = 0
+                        progress.pages_total += result
+                        for first in range(0, result, self.pages_per_task):
+                            submit("extract", state, first, min(first + self.pages_per_task, result))
+                            state.ranges_pending += 1
+                    else:
+                        state.ranges_pending -= 1
+                        progress.pages_extracted += len(result)
+                        if state.ranges_pending == 0:
+                            # Wall time until the document's last page range was extracted
+                            self._record("parse", time.perf_counter() - state.started)
+                        started = time.perf_counter()
+                        texts, metadatas = [], []
+                        for number, page_text in result:
+                            for offset, chunk in self.split_fn(page_text):
+                                texts.append(chunk)
+                                metadatas.append({"page": number + 1, "offset": offset})
+                        state.split_seconds += time.perf_counter() - started
+                        state.texts[start] = texts
+                        state.metadatas[start] = metadatas
+                        progress.chunks_split += len(texts)
+                        if texts:
+                            inbox.put((state.name, start, texts))
+                            in_flight += 1
+                        else:
+                            state.vectors[start] = []
+
+                # Embedded batches complete their documents; block briefly
+                # when only the embedding stage is still working
+                block = not pending
+                while True:
+                    try:
+                        name, start, vectors = outbox.get(block=block, timeout=_POLL_INTERVAL)
+                    except queue.Empty:
+                        break
+                    block = False
+                    in_flight -= 1
+                    state = states[name]
+                    if isinstance(vectors, Exception):
+                        fail(state, vectors)
+                        continue
+                    state.vectors[start] = vectors
+                    progress.chunks_embedded += len(vectors)
+
+                for state in states.values():
+                    if state.is_complete():
+                        state.finished = True
+                        progress.files_done += 1
+                        self._record("split", state.split_seconds)
+                        if on_document:
+                            try:
+                                on_document(state.name, *state.ordered_results())
+                            except Exception as e:
+                                errors[state.name] = e
+
+                if on_progress:
+                    on_progress(progress)
+        finally:
+            inbox.put(None)
+            if self.executor is None:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+        return errors
+
+
+# === Streaming mode ===
+
+def iter_pages(path: str, page_count: int, backend: str = PDF_BACKEND,
+               page_timeout: float = PAGE_TIMEOUT_SECONDS, executor=None,
+               pages_per_task: int = PAGES_PER_TASK, max_pending_ranges: int = EXTRACT_WORKERS):
+    """
+    Lazily extract page texts in page order.
+
+    Without an executor pages are read one at a time in this thread. With
+    one, up to max_pending_ranges page ranges are extracted in parallel
+    ahead of the consumer, which bounds the pages held in memory.
+
+    Args:
+        path (str): Path to the PDF file
+        page_count (int): Number of pages in the file
+        backend (str): Extraction backend to open the file with
+        page_timeout (float): Seconds allowed per page
+        executor: Optional ExtractionPool for page ranges
+        pages_per_task (int): Pages per extracted range
+        max_pending_ranges (int): Ranges submitted ahead of the consumer
+
+    Yields:
+        tuple[int, str]: (page index, page text)
+    """
+    if executor is None:
+        with open_pdf(path, backend) as document:
+            for number in range(page_count):
+                yield number, extract_page_text(document, number, page_timeout)
+        return
+
+    ranges = iter([(first, min(first + pages_per_task, page_count))
+                   for first in range(0, page_count, pages_per_task)])
+    pending, running_since = deque(), {}
+
+    def submit(first, last):
+        return executor.submit(extract_page_range, path, first, last, backend, page_timeout), first, last
+
+    def submit_next():
+        page_range = next(ranges, None)
+        if page_range is not None:
+            pending.append(submit(*page_range))
+
+    try:
+        for _ in range(max(max_pending_ranges, 1)):
+            submit_next()
+        while pending:
+            future, first, last = pending[0]
+            if not wait([future], timeout=_POLL_INTERVAL).done:
+                # Ranges behind the first one start their clock as soon as they run
+                now = time.perf_counter()
+                expired = [_range_expired(task, running_since, stop - start, page_timeout, now)
+                           for task, start, stop in pending]
+                if expired[0]:
+                    pending.popleft()
+                    executor.replace(future)
+                    submit_next()
+                    yield from _skip_range(path, first, last, page_timeout)
+                continue
+
+            pending.popleft()
+            running_since.pop(future, None)
+            try:
+                pages = future.result()
+            except (BrokenProcessPool, CancelledError):
+                # Run the range again unless it broke the current pool itself
+                if executor.replace(future):
+                    raise
+                pending.appendleft(submit(first, last))
+                continue
+            submit_next()
+            yield from pages
+    finally:
+        for future, _, _ in pending:
+            future.cancel()
+
+
+def iter_chunk_batches(pages, split_fn, batch_size: int):
+    """
+    Split pages on the fly and group the chunks into fixed-size batches.
+
+    Args:
+        pages: Iterable of (page index, page text) pairs
+        split_fn: Callable mapping one page's text to (offset, chunk text) pairs
+        batch_size (int): Number of chunks per yielded batch
+
+    Yields:
+        list[tuple[dict, str]]: (metadata with 1-based page and offset, chunk text) pairs
+    """
+    batch = []
+    for number, text in pages:
+        for offset, chunk in split_fn(text):
+            batch.append(({"page": number + 1, "offset": offset}, chunk))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def stream_document(path: str, embed_fn, split_fn, on_batch, on_progress=None,
+                    batch_size: int = STREAM_BATCH_SIZE,
+                    max_pending_batches: int = STREAM_MAX_PENDING_BATCHES,
+                    recorder=None, trace_tags=None, executor=None, backend: str = PDF_BACKEND,
+                    page_timeout: float = PAGE_TIMEOUT_SECONDS) -> int:
+    """
+    Ingest one PDF with memory bounded by the batch size, not the page count.
+
+    A producer thread extracts and splits pages into a bounded queue; the
+    calling thread embeds each batch and hands it to on_batch right away.
+    When embedding falls behind, the producer blocks instead of buffering.
+
+    Args:
+        path (str): Path to the PDF file
+        embed_fn: Callable mapping a list of texts to a list of vectors
+        split_fn: Callable mapping one page's text to (offset, chunk text) pairs
+        on_batch: Callback receiving (texts, metadatas, embeddings), where each
+            metadata holds the chunk's 1-based page number and offset in the page
+        on_progress: Optional callback receiving an IngestionProgress
+        batch_size (int): Chunks per flushed batch
+        max_pending_batches (int): Batches allowed to wait for embedding
+        recorder: Optional LatencyRecorder for parse, split and embed spans
+        trace_tags (dict): Tags added to every recorded span
+        executor: Optional ExtractionPool to extract page ranges in parallel
+        backend (str): PDF extraction backend
+        page_timeout (float): Seconds allowed per page
+
+    Returns:
+        int: Number of chunks flushed
+    """
+    trace_tags = trace_tags or {}
+
+    def record(name, seconds):
+        if recorder is not None:
+            recorder.record(name, seconds, **trace_tags)
+
+    page_count = count_pages(path, backend)
+    progress = IngestionProgress(files_total=1, pages_total=page_count)
+    batches = queue.Queue(maxsize=max_pending_batches)
+    stop = threading.Event()
+
+    split_seconds = [0.0]
+
+    def timed_split(text):
+        started = time.perf_counter()
+        try:
+            return split_fn(text)
+        finally:
+            split_seconds[0] += time.perf_counter() - started
+
+    def produce():
+        def counted_pages():
+            for number, text in iter_pages(path, page_count, backend, page_timeout, executor):
+                progress.pages_extracted += 1
+                yield number, text
+
+        started, blocked = time.perf_counter(), 0.0
+        try:
+            for batch in iter_chunk_batches(counted_pages(), timed_split, batch_size):
+                # Block while the consumer is behind, but give up if it failed
+                waited = time.perf_counter()
+                while not stop.is_set():
+                    try:
+                        batches.put(batch, timeout=_POLL_INTERVAL)
+                        break
+                    except queue.Full:
+                        continue
+                blocked += time.perf_counter() - waited
+                if stop.is_set():
+                    return
+            # Parse time excludes splitting and time spent blocked on a full queue
+            record("parse", time.perf_counter() - started - blocked - split_seconds[0])
+            record("split", split_seconds[0])
+            batches.put(None)
+        except Exception as e:
+            batches.put(e)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+
+    flushed = 0
+    try:
+        while True:
+            batch = batches.get()
+            if batch is None:
+                break
+            if isinstance(batch, Exception):
+                raise batch
+
+            texts = [text for _, text in batch]
+            progress.chunks_split += len(texts)
+            started = time.perf_counter()
+            embeddings = embed_fn(texts)
+            record("embed", time.perf_counter() - started)
+            on_batch(texts, [meta for meta, _ in batch], embeddings)
+            flushed += len(texts)
+            progress.chunks_embedded += len(texts)
+            if on_progress:
+                on_progress(progress)
+    finally:
+        # Unblock a producer that is still waiting on a full queue
+        stop.set()
+        while producer.is_alive():
+            try:
+                batches.get_nowait()
+            except queue.Empty:
+                producer.join(_POLL_INTERVAL)
+
+    progress.files_done = 1
+    if on_progress:
+        on_progress(progress)
+    return flushed
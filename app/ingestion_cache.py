@@ -0,0 +1,149 @@
+"""
+Content-addressed ingestion cache for the DocuDialogue application.
+
+Parsed chunks and their embedding vectors are stored on disk under a key
+derived from the PDF bytes, the extraction backend, the chunking parameters
+and the embedding model.
+Uploading a known document again, in any session and under any file name,
+becomes a bulk insert instead of a parse/split/embed run. The cache is capped
+in size and evicts least recently used entries. Vectors are stored in the
+dtype chosen by DOCUDIALOGUE_VECTOR_DTYPE (float32, float16 or int8).
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import numpy as np
+from embeddings import VECTOR_DTYPE, dequantize_vectors, quantize_vectors
+
+CACHE_DIR = os.getenv(
+    "DOCUDIALOGUE_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "docudialogue", "ingestion")
+)
+CACHE_MAX_BYTES = int(float(os.getenv("DOCUDIALOGUE_CACHE_MAX_MB", "2048")) * 1024 * 1024)
+
+CHUNKS_FILE = "chunks.json"
+EMBEDDINGS_FILE = "embeddings.npy"
+SCALES_FILE = "scales.npy"
+
+# Serializes eviction so concurrent sessions don't delete the same entries twice
+_eviction_lock = threading.Lock()
+
+
+def compute_cache_key(file_bytes: bytes, chunking: str, model_name: str, extraction: str) -> str:
+    """
+    Derive the cache key for a document and its processing parameters.
+
+    Args:
+        file_bytes (bytes): Raw PDF content
+        chunking (str): Chunking strategy and sizes (Chunker.config_id)
+        model_name (str): Embedding model and backend used for the vectors
+        extraction (str): PDF extraction backend that produced the text
+
+    Returns:
+        str: Hex digest identifying the cached entry
+    """
+    digest = hashlib.sha256(file_bytes)
+    digest.update(f"|{extraction}|{chunking}|{model_name}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _entry_path(key: str) -> str:
+    return os.path.join(CACHE_DIR, key)
+
+
+def _entry_size(path: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(path, name))
+        for name in os.listdir(path)
+    )
+
+
+def load_cached_chunks(key: str):
+    """
+    Look up the chunks and embeddings stored for a cache key.
+
+    A hit refreshes the entry's access time so it is evicted last.
+
+    Args:
+        key (str): Cache key from compute_cache_key
+
+    Returns:
+        tuple | None: (texts, metadatas, embeddings) or None on a miss
+    """
+    path = _entry_path(key)
+    try:
+        with open(os.path.join(path, CHUNKS_FILE), "r", encoding="utf-8") as f:
+            payload = json.load(f)
+        stored = np.load(os.path.join(path, EMBEDDINGS_FILE))
+        scales_path = os.path.join(path, SCALES_FILE)
+        scales = np.load(scales_path) if os.path.exists(scales_path) else None
+        os.utime(path)
+    except (OSError, ValueError):
+        return None
+
+    return payload["texts"], payload["metadatas"], dequantize_vectors(stored, scales)
+
+
+def store_cached_chunks(key: str, texts, metadatas, embeddings) -> None:
+    """
+    Persist chunks and embeddings for a cache key, then enforce the size cap.
+
+    The entry is written to a staging directory and renamed into place so
+    readers never see a partially written entry.
+
+    Args:
+        key (str): Cache key from compute_cache_key
+        texts (list[str]): Chunk texts
+        metadatas (list[dict]): Per-chunk metadata, without the file name
+        embeddings: Embedding vectors aligned with texts
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = _entry_path(key)
+    if os.path.isdir(path):
+        return
+
+    staging = tempfile.mkdtemp(prefix=".staging-", dir=CACHE_DIR)
+    try:
+        with open(os.path.join(staging, CHUNKS_FILE), "w", encoding="utf-8") as f:
+            json.dump({"texts": texts, "metadatas": metadatas}, f)
+        stored, scales = quantize_vectors(embeddings, VECTOR_DTYPE)
+        np.save(os.path.join(staging, EMBEDDINGS_FILE), stored)
+        if scales is not None:
+            np.save(os.path.join(staging, SCALES_FILE), scales)
+        os.rename(staging, path)
+    except OSError:
+        # Another session stored the same entry first, or the disk is full
+        shutil.rmtree(staging, ignore_errors=True)
+        return
+
+    evict_to_limit()
+
+
+def evict_to_limit(max_bytes: int = CACHE_MAX_BYTES) -> None:
+    """
+    Delete least recently used entries until the cache fits its size cap.
+
+    Args:
+        max_bytes (int): Maximum total size of the cache directory
+    """
+    with _eviction_lock:
+        entries = []
+        for name in os.listdir(CACHE_DIR):
+            path = os.path.join(CACHE_DIR, name)
+            if name.startswith(".") or not os.path.isdir(path):
+                continue
+            try:
+                entries.append((os.path.getmtime(path), _entry_size(path), path))
+            except OSError:
+                continue
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
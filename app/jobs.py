@@ -0,0 +1,117 @@
+"""
+Background job queue for the DocuDialogue application.
+
+Long-running work such as document ingestion is submitted to a process-wide
+thread pool and tracked by job ID, so Streamlit script runs never wait on it.
+Job functions must not touch Streamlit APIs; they report progress and
+results through their Job record, which the UI polls.
+"""
+
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+INGESTION_JOB_WORKERS = int(os.getenv("DOCUDIALOGUE_INGESTION_JOB_WORKERS", "2"))
+
+
+class Job:
+    """
+    State of one background job, shared between its worker and the UI.
+
+    Args:
+        owner (str): Session that submitted the job
+        label (str): Human-readable description
+    """
+
+    def __init__(self, owner: str, label: str):
+        self.job_id = uuid.uuid4().hex
+        self.owner = owner
+        self.label = label
+        self.status = "queued"
+        self.progress = None
+        self.error = None
+        self._results = {}
+        self._errors = {}
+        self._lock = threading.Lock()
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("complete", "failed")
+
+    def commit(self, name: str, value) -> None:
+        """Record that one item of the job finished successfully."""
+        with self._lock:
+            self._results[name] = value
+
+    def fail_item(self, name: str, error: Exception) -> None:
+        """Record that one item of the job failed without failing the job."""
+        with self._lock:
+            self._errors[name] = error
+
+    def results(self) -> dict:
+        """Snapshot of the items committed so far."""
+        with self._lock:
+            return dict(self._results)
+
+    def errors(self) -> dict:
+        """Snapshot of the items that failed so far."""
+        with self._lock:
+            return dict(self._errors)
+
+
+class JobManager:
+    """
+    Run jobs on a bounded thread pool and keep them addressable by ID.
+
+    Args:
+        max_workers (int): Number of jobs allowed to run at once
+    """
+
+    def __init__(self, max_workers: int = INGESTION_JOB_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="docudialogue-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, owner: str, label: str, fn, *args) -> Job:
+        """
+        Queue a job.
+
+        Args:
+            owner (str): Session submitting the job
+            label (str): Human-readable description
+            fn: Callable invoked as fn(job, *args) on a worker thread
+
+        Returns:
+            Job: Record to poll for progress and results
+        """
+        job = Job(owner, label)
+        with self._lock:
+            self._jobs[job.job_id] = job
+
+        def run():
+            job.status = "running"
+            try:
+                fn(job, *args)
+                job.status = "complete"
+            except Exception as e:
+                job.error = e
+                job.status = "failed"
+
+        self._executor.submit(run)
+        return job
+
+    def get(self, job_id: str):
+        """Return the job with the given ID, or None once it has been forgotten."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs_for(self, owner: str):
+        """Return every tracked job submitted by a session."""
+        with self._lock:
+            return [job for job in self._jobs.values() if job.owner == owner]
+
+    def forget(self, job_id: str) -> None:
+        """Stop tracking a finished job."""
+        with self._lock:
+            self._jobs.pop(job_id, None)
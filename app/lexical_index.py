@@ -0,0 +1,223 @@
+"""
+Persistent BM25 inverted index for lexical retrieval.
+
+Dense MiniLM embeddings are poor at matching exact figures, tickers and
+account codes. This index keeps a term -> chunk postings map that is updated
+incrementally as documents are added or removed, is saved to disk next to
+the vector store, and answers keyword queries with BM25 scores by touching
+only the postings of the query terms.
+"""
+
+import math
+import os
+import pickle
+import re
+import tempfile
+import threading
+from collections import Counter, defaultdict
+from heapq import nlargest
+from operator import itemgetter
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Keeps figures, tickers and codes such as 1,234.5 / BRK.B / ACCT-4410 whole
+_TOKEN_PATTERN = re.compile(r"\w+(?:[.,\-/]\w+)*")
+
+# Frequent words carry no lexical signal and have the longest postings lists
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the "
+    "this to was were what when where which who will with".split()
+)
+
+
+def tokenize(text: str):
+    """
+    Split text into lower-cased index terms.
+
+    Args:
+        text (str): Text to tokenize
+
+    Returns:
+        list[str]: Terms, excluding stopwords
+    """
+    return [
+        token for token in (match.group(0).lower() for match in _TOKEN_PATTERN.finditer(text))
+        if token not in _STOPWORDS
+    ]
+
+
+class LexicalIndex:
+    """
+    Thread-safe BM25 index over chunk texts, persisted as a pickle file.
+
+    Args:
+        path (str): File the index is saved to, or None for an in-memory index
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path
+        self.postings = defaultdict(dict)
+        self.doc_lengths = {}
+        self.doc_terms = {}
+        self.sources = defaultdict(set)
+        self.pages = {}
+        self.total_length = 0
+        self._lock = threading.RLock()
+
+    @classmethod
+    def load(cls, path: str) -> "LexicalIndex":
+        """
+        Load an index from disk, or start an empty one at that path.
+
+        Args:
+            path (str): Pickle file of a previously saved index
+
+        Returns:
+            LexicalIndex: Loaded or empty index
+        """
+        index = cls(path)
+        try:
+            with open(path, "rb") as f:
+                state = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return index
+
+        index.postings = defaultdict(dict, state["postings"])
+        index.doc_lengths = state["doc_lengths"]
+        index.doc_terms = state["doc_terms"]
+        index.sources = defaultdict(set, state["sources"])
+        index.pages = state.get("pages", {})
+        index.total_length = state["total_length"]
+        return index
+
+    def save(self) -> None:
+        """Write the index to its path atomically."""
+        if self.path is None:
+            return
+        with self._lock:
+            state = {
+                "postings": dict(self.postings),
+                "doc_lengths": self.doc_lengths,
+                "doc_terms": self.doc_terms,
+                "sources": dict(self.sources),
+                "pages": self.pages,
+                "total_length": self.total_length,
+            }
+            directory = os.path.dirname(self.path) or "."
+            os.makedirs(directory, exist_ok=True)
+            fd, staging = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(staging, self.path)
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    # === Updates ===
+
+    def add(self, ids, texts, metadatas) -> None:
+        """
+        Index chunks, replacing any chunk that already has the same ID.
+
+        Args:
+            ids (list[str]): Chunk IDs
+            texts (list[str]): Chunk texts
+            metadatas (list[dict]): Chunk metadata with the source document and page
+        """
+        with self._lock:
+            for chunk_id, text, meta in zip(ids, texts, metadatas):
+                if chunk_id in self.doc_lengths:
+                    self._remove(chunk_id)
+                counts = Counter(tokenize(text))
+                for term, tf in counts.items():
+                    self.postings[term][chunk_id] = tf
+                length = sum(counts.values())
+                self.doc_lengths[chunk_id] = length
+                self.doc_terms[chunk_id] = (meta.get("source"), tuple(counts))
+                self.sources[meta.get("source")].add(chunk_id)
+                self.pages[chunk_id] = meta.get("page")
+                self.total_length += length
+
+    def _remove(self, chunk_id: str) -> None:
+        source, terms = self.doc_terms.pop(chunk_id)
+        for term in terms:
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(chunk_id, None)
+                if not postings:
+                    del self.postings[term]
+        self.total_length -= self.doc_lengths.pop(chunk_id)
+        self.pages.pop(chunk_id, None)
+        self.sources[source].discard(chunk_id)
+        if not self.sources[source]:
+            del self.sources[source]
+
+    def delete(self, ids) -> None:
+        """
+        Remove chunks from the index.
+
+        Args:
+            ids (list[str]): Chunk IDs to remove
+        """
+        with self._lock:
+            for chunk_id in ids:
+                if chunk_id in self.doc_lengths:
+                    self._remove(chunk_id)
+
+    def delete_source(self, source: str) -> None:
+        """
+        Remove every chunk of a document.
+
+        Args:
+            source (str): Document name
+        """
+        with self._lock:
+            for chunk_id in list(self.sources.get(source, ())):
+                self._remove(chunk_id)
+
+    # === Queries ===
+
+    def search(self, query: str, k: int = 10, sources=None, first_page: int = None, last_page: int = None):
+        """
+        Rank chunks against a keyword query with BM25.
+
+        Args:
+            query (str): Query text
+            k (int): Number of chunks to return
+            sources (list[str]): Only rank chunks of these documents
+            first_page (int): Only rank chunks on or after this page
+            last_page (int): Only rank chunks on or before this page
+
+        Returns:
+            list[tuple[str, float]]: (chunk ID, score) pairs, best first
+        """
+        with self._lock:
+            count = len(self.doc_lengths)
+            if not count:
+                return []
+            average_length = self.total_length / count or 1.0
+            allowed = set().union(*(self.sources.get(source, ()) for source in sources)) if sources else None
+            paged = first_page is not None or last_page is not None
+
+            scores = defaultdict(float)
+            for term in set(tokenize(query)):
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for chunk_id, tf in postings.items():
+                    if allowed is not None and chunk_id not in allowed:
+                        continue
+                    if paged and not self._on_pages(chunk_id, first_page, last_page):
+                        continue
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[chunk_id] / average_length)
+                    scores[chunk_id] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        return nlargest(k, scores.items(), key=itemgetter(1))
+
+    def _on_pages(self, chunk_id: str, first_page, last_page) -> bool:
+        page = self.pages.get(chunk_id)
+        if page is None:
+            return False
+        return (first_page is None or page >= first_page) and (last_page is None or page <= last_page)
@@ -0,0 +1,166 @@
+"""
+Shared document library for the DocuDialogue application.
+
+A library is a persistent ChromaDB store plus its BM25 index, built offline
+by ingest_library.py from a directory tree of PDFs and shared by every
+session. The app opens it read-only at startup, so documents every user
+needs are searchable without any indexing cost.
+
+Layout of a library directory:
+
+- chroma/: the ChromaDB store holding the LIBRARY_COLLECTION collection and
+  its document tree (see document_tree.py)
+- lexical.pkl: the BM25 index mirroring the collection
+- manifest.json: checkpoint of the files indexed so far, used to resume
+"""
+
+import hashlib
+import json
+import os
+import chromadb
+from chromadb.errors import InvalidCollectionException
+from document_tree import tree_collection_name
+from lexical_index import LexicalIndex
+from vector_index import index_metadata
+
+# Unset disables the library
+LIBRARY_DIR = os.getenv("DOCUDIALOGUE_LIBRARY_DIR", "")
+LIBRARY_COLLECTION = "document_library"
+
+MANIFEST_FILE = "manifest.json"
+
+
+def file_digest(path: str) -> str:
+    """
+    Hash a file's content without loading it whole.
+
+    Args:
+        path (str): File to hash
+
+    Returns:
+        str: Hex sha256 digest
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def open_library(library_dir: str, create: bool = False):
+    """
+    Open a library's collection and BM25 index.
+
+    Args:
+        library_dir (str): Library directory
+        create (bool): Create the collection, with the configured HNSW settings,
+            if it does not exist yet
+
+    Returns:
+        tuple: (chromadb.Collection, LexicalIndex)
+    """
+    client = chromadb.PersistentClient(os.path.join(library_dir, "chroma"))
+    # Queries always pass embeddings, so the collection needs no embedding function
+    if create:
+        collection = client.get_or_create_collection(
+            LIBRARY_COLLECTION, embedding_function=None, metadata=index_metadata()
+        )
+    else:
+        collection = client.get_collection(LIBRARY_COLLECTION, embedding_function=None)
+    return collection, LexicalIndex.load(os.path.join(library_dir, "lexical.pkl"))
+
+
+def open_library_tree(library_dir: str, create: bool = False):
+    """
+    Open the document tree of a library's collection.
+
+    Args:
+        library_dir (str): Library directory
+        create (bool): Create the tree collection if it does not exist yet
+
+    Returns:
+        chromadb.Collection | None: Tree collection, or None when the library
+            was built before it had one
+    """
+    client = chromadb.PersistentClient(os.path.join(library_dir, "chroma"))
+    name = tree_collection_name(LIBRARY_COLLECTION)
+    if create:
+        return client.get_or_create_collection(name, embedding_function=None, metadata=index_metadata())
+    try:
+        return client.get_collection(name, embedding_function=None)
+    except InvalidCollectionException:
+        return None
+
+
+class Manifest:
+    """
+    Checkpoint of the files committed to a library.
+
+    Each entry maps a file's path relative to the indexed root to its size,
+    modification time, content digest and chunk count. A file whose entry
+    still matches is skipped when indexing resumes.
+
+    Args:
+        path (str): Location of the manifest file
+        entries (dict): Entries loaded from disk
+    """
+
+    def __init__(self, path: str, entries: dict = None):
+        self.path = path
+        self.entries = entries or {}
+
+    @classmethod
+    def load(cls, library_dir: str) -> "Manifest":
+        """Load a library's manifest, or start an empty one."""
+        path = os.path.join(library_dir, MANIFEST_FILE)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return cls(path, json.load(f))
+        except (OSError, ValueError):
+            return cls(path)
+
+    def save(self) -> None:
+        """Write the manifest atomically."""
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, indent=1, sort_keys=True)
+        os.replace(temp_path, self.path)
+
+    def is_current(self, source: str, path: str) -> bool:
+        """
+        Check whether a file is indexed in its current version.
+
+        Size and modification time are compared first; the content is only
+        hashed when they differ, so a touched but unchanged file is kept.
+
+        Args:
+            source (str): Path relative to the indexed root
+            path (str): Absolute path of the file
+
+        Returns:
+            bool: True when the file does not need indexing
+        """
+        entry = self.entries.get(source)
+        if entry is None:
+            return False
+        stat = os.stat(path)
+        if entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+            return True
+        if entry["size"] == stat.st_size and entry["sha256"] == file_digest(path):
+            entry["mtime"] = stat.st_mtime
+            return True
+        return False
+
+    def record(self, source: str, path: str, chunks: int) -> None:
+        """Record that a file was committed to the library."""
+        stat = os.stat(path)
+        self.entries[source] = {
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "sha256": file_digest(path),
+            "chunks": chunks,
+        }
+
+    def forget(self, source: str) -> None:
+        """Remove a file from the manifest."""
+        self.entries.pop(source, None)
@@ -0,0 +1,538 @@
+"""
+Shared asynchronous LLM gateway for the DocuDialogue application.
+
+All sessions send their chat requests through one gateway, which runs an
+asyncio event loop on a background thread:
+
+- one pooled async client per (provider, API key), reused across reruns and
+  sessions, so HTTP connections stay open
+- a concurrency semaphore per provider, so a burst of users queues instead
+  of tripping provider rate limits
+- 429 responses are retried with exponential backoff and full jitter,
+  honouring Retry-After when the provider sends it
+- tokens are batched before they reach the UI, so a fast stream does not
+  trigger one Streamlit redraw per token
+- hedged requests: if the primary model has not sent its first token by a
+  deadline, the same question goes to a fallback model as well; whichever
+  streams first is relayed and the other request is cancelled. The deadline
+  is a high quantile of the primary model's recent time to first token, so
+  only its slow tail is hedged
+- prompt caching: each provider's count of prompt tokens served from its
+  prompt cache is passed to the caller as a PromptUsage once the stream ends
+
+Script threads consume a stream through an ordinary generator, so the
+gateway plugs into st.write_stream unchanged. Gemini requests stream the
+REST streamGenerateContent endpoint as server-sent events through a pooled
+httpx client, like the OpenAI SDK does; the API key goes in a header per
+client, so concurrent users with different keys cannot overwrite each
+other's keys. A "system" message becomes Gemini's system instruction, so
+both providers see the same prompt layout (see prompt_assembly.py).
+"""
+
+import asyncio
+import inspect
+import json
+import os
+import queue
+import random
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+import numpy as np
+
+OPENAI_CONCURRENCY = int(os.getenv("DOCUDIALOGUE_OPENAI_CONCURRENCY", "16"))
+GEMINI_CONCURRENCY = int(os.getenv("DOCUDIALOGUE_GEMINI_CONCURRENCY", "16"))
+LLM_MAX_CONNECTIONS = int(os.getenv("DOCUDIALOGUE_LLM_MAX_CONNECTIONS", "20"))
+LLM_MAX_RETRIES = int(os.getenv("DOCUDIALOGUE_LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_SECONDS = float(os.getenv("DOCUDIALOGUE_LLM_BACKOFF_SECONDS", "1.0"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("DOCUDIALOGUE_LLM_BACKOFF_MAX_SECONDS", "30"))
+# Tokens arriving within this window are sent to the UI together
+STREAM_FLUSH_SECONDS = float(os.getenv("DOCUDIALOGUE_STREAM_FLUSH_SECONDS", "0.05"))
+# Provider endpoints; empty uses the provider's public API
+OPENAI_BASE_URL = os.getenv("DOCUDIALOGUE_OPENAI_BASE_URL", "")
+GEMINI_BASE_URL = os.getenv("DOCUDIALOGUE_GEMINI_BASE_URL", "")
+# Quantile of the primary model's time to first token after which a request is hedged
+HEDGE_QUANTILE = float(os.getenv("DOCUDIALOGUE_HEDGE_QUANTILE", "0.9"))
+# Deadline used until a model has HEDGE_MIN_SAMPLES first-token times
+HEDGE_DEFAULT_DEADLINE_SECONDS = float(os.getenv("DOCUDIALOGUE_HEDGE_DEFAULT_DEADLINE_SECONDS", "2.0"))
+HEDGE_MIN_SAMPLES = int(os.getenv("DOCUDIALOGUE_HEDGE_MIN_SAMPLES", "20"))
+HEDGE_MIN_DEADLINE_SECONDS = float(os.getenv("DOCUDIALOGUE_HEDGE_MIN_DEADLINE_SECONDS", "0.5"))
+HEDGE_MAX_DEADLINE_SECONDS = float(os.getenv("DOCUDIALOGUE_HEDGE_MAX_DEADLINE_SECONDS", "10"))
+# Pooled clients kept before the least recently used one is closed
+MAX_CLIENTS = 256
+
+GEMINI_API_URL = "https://generativelanguage.googleapis.com"
+
+PROVIDERS = ("openai", "gemini")
+
+# Models offered in the UI: name -> (provider, provider model name)
+MODELS = {
+    "gpt-4o-mini": ("openai", "gpt-4o-mini"),
+    "gpt-4o": ("openai", "gpt-4o"),
+    "Gemini 2.0 Flash": ("gemini", "gemini-2.0-flash-exp"),
+}
+# Provider names shown next to the models in the UI
+PROVIDER_LABELS = {"openai": "OpenAI", "gemini": "Google"}
+# Model a new session starts with
+DEFAULT_MODEL = "gpt-4o-mini"
+# Model a new session hedges with; empty leaves hedging off
+HEDGE_MODEL = os.getenv("DOCUDIALOGUE_HEDGE_MODEL", "")
+
+_DONE = object()
+
+
+@dataclass(frozen=True)
+class PromptUsage:
+    """
+    Prompt tokens of one request as billed by the provider.
+
+    Attributes:
+        provider (str): "openai" or "gemini"
+        model (str): Provider model name
+        prompt_tokens (int): Tokens in the prompt
+        cached_tokens (int): Prompt tokens served from the provider's prompt cache
+    """
+
+    provider: str
+    model: str
+    prompt_tokens: int
+    cached_tokens: int
+
+
+class GeminiAPIError(Exception):
+    """
+    Error status returned by the Gemini API.
+
+    Args:
+        status_code (int): HTTP status
+        message (str): Error text from the response body
+        response: The httpx response, whose headers may carry Retry-After
+    """
+
+    def __init__(self, status_code: int, message: str, response=None):
+        super().__init__(f"Gemini API error {status_code}: {message}")
+        self.status_code = status_code
+        self.response = response
+
+
+class GeminiClient:
+    """
+    Async streaming client for the Gemini REST API over a pooled httpx client.
+
+    Args:
+        api_key (str): Gemini API key
+        base_url (str): API endpoint; empty uses the public API
+    """
+
+    def __init__(self, api_key: str, base_url: str = ""):
+        import httpx
+
+        self._client = httpx.AsyncClient(
+            base_url=base_url or GEMINI_API_URL,
+            headers={"x-goog-api-key": api_key},
+            # Streams may pause for a while between chunks
+            timeout=httpx.Timeout(60.0, connect=10.0),
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_CONNECTIONS
+            )
+        )
+
+    async def stream(self, model: str, body: dict):
+        """
+        Stream generateContent responses as they arrive.
+
+        Args:
+            model (str): Gemini model name
+            body (dict): Request body with contents, systemInstruction and generationConfig
+
+        Yields:
+            dict: One GenerateContentResponse per server-sent event
+        """
+        async with self._client.stream(
+            "POST", f"/v1beta/models/{model}:streamGenerateContent", params={"alt": "sse"}, json=body
+        ) as response:
+            if response.status_code != 200:
+                message = (await response.aread()).decode("utf-8", "replace")
+                raise GeminiAPIError(response.status_code, message, response)
+            async for line in response.aiter_lines():
+                if line.startswith("data:"):
+                    yield json.loads(line[len("data:"):])
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+class _Winner:
+    """Marker telling the reader which request of a hedged stream is relayed."""
+
+    def __init__(self, index: int):
+        self.index = index
+
+
+def is_rate_limited(error: Exception) -> bool:
+    """Check whether a provider error is an HTTP 429."""
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    return status == 429
+
+
+def retry_delay(error: Exception, attempt: int,
+                base: float = LLM_BACKOFF_SECONDS, cap: float = LLM_BACKOFF_MAX_SECONDS) -> float:
+    """
+    Compute how long to wait before retrying a rate-limited request.
+
+    Args:
+        error (Exception): The 429 error, possibly carrying a Retry-After header
+        attempt (int): Number of retries made so far
+        base (float): Backoff for the first retry
+        cap (float): Maximum backoff
+
+    Returns:
+        float: Seconds to sleep
+    """
+    response = getattr(error, "response", None)
+    retry_after = getattr(response, "headers", {}).get("retry-after") if response is not None else None
+    try:
+        if retry_after is not None:
+            return min(float(retry_after), cap)
+    except ValueError:
+        pass
+    # Full jitter spreads out users that were throttled at the same moment
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class LLMGateway:
+    """
+    Pooled, rate-limited streaming access to the LLM providers.
+
+    Args:
+        concurrency (dict): Maximum requests in flight per provider
+        max_retries (int): Retries of a rate-limited request before giving up
+        flush_seconds (float): Token batching window for the UI
+        recorder: Optional LatencyRecorder; each model's time to first token
+            is recorded on it as a "provider_ttft" span and drives the hedge deadline
+        base_urls (dict): Provider -> endpoint; missing or empty uses the public API
+    """
+
+    def __init__(self, concurrency: dict = None, max_retries: int = LLM_MAX_RETRIES,
+                 flush_seconds: float = STREAM_FLUSH_SECONDS, recorder=None, base_urls: dict = None):
+        self.concurrency = concurrency or {"openai": OPENAI_CONCURRENCY, "gemini": GEMINI_CONCURRENCY}
+        self.max_retries = max_retries
+        self.flush_seconds = flush_seconds
+        self.recorder = recorder
+        self.base_urls = base_urls or {"openai": OPENAI_BASE_URL, "gemini": GEMINI_BASE_URL}
+        self._clients = OrderedDict()
+        self._loop = asyncio.new_event_loop()
+        self._semaphores = {}
+        threading.Thread(target=self._loop.run_forever, daemon=True, name="llm-gateway").start()
+
+    # === Clients ===
+
+    def _create_client(self, provider: str, api_key: str):
+        if provider == "openai":
+            from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+            import httpx
+
+            return AsyncOpenAI(
+                api_key=api_key,
+                base_url=self.base_urls.get("openai") or None,
+                # The gateway retries 429s itself, with jitter
+                max_retries=0,
+                http_client=DefaultAsyncHttpxClient(limits=httpx.Limits(
+                    max_connections=LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=LLM_MAX_CONNECTIONS
+                ))
+            )
+        return GeminiClient(api_key, self.base_urls.get("gemini") or "")
+
+    async def _get_client(self, provider: str, api_key: str):
+        key = (provider, api_key)
+        client = self._clients.get(key)
+        if client is None:
+            client = self._clients[key] = self._create_client(provider, api_key)
+            while len(self._clients) > MAX_CLIENTS:
+                _, evicted = self._clients.popitem(last=False)
+                close = getattr(evicted, "close", None)
+                if close is not None and inspect.iscoroutinefunction(close):
+                    await close()
+        self._clients.move_to_end(key)
+        return client
+
+    def _semaphore(self, provider: str) -> asyncio.Semaphore:
+        # Created lazily so the semaphores belong to the gateway's loop
+        if provider not in self._semaphores:
+            self._semaphores[provider] = asyncio.Semaphore(self.concurrency[provider])
+        return self._semaphores[provider]
+
+    # === Provider streams ===
+
+    async def _openai_tokens(self, client, model: str, messages, params: dict):
+        stream = await client.chat.completions.create(
+            model=model,
+            messages=messages,
+            stream=True,
+            # The last chunk then carries the token usage, including cached prompt tokens
+            stream_options={"include_usage": True},
+            temperature=params.get("temperature"),
+            max_completion_tokens=params.get("max_tokens"),
+            top_p=params.get("top_p")
+        )
+        # Closing the stream on cancellation releases the connection at once
+        async with stream:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+                if chunk.usage:
+                    details = chunk.usage.prompt_tokens_details
+                    yield PromptUsage(
+                        "openai", model, chunk.usage.prompt_tokens, (details and details.cached_tokens) or 0
+                    )
+
+    async def _gemini_tokens(self, client, model: str, messages, params: dict):
+        system = "\n\n".join(message["content"] for message in messages if message["role"] == "system")
+        contents = [
+            {"role": "model" if message["role"] == "assistant" else "user", "parts": [{"text": message["content"]}]}
+            for message in messages if message["role"] != "system"
+        ]
+        config = {
+            "temperature": params.get("temperature"),
+            "topP": params.get("top_p"),
+            "maxOutputTokens": params.get("max_tokens"),
+            "responseMimeType": "text/plain",
+        }
+        body = {"contents": contents, "generationConfig": {k: v for k, v in config.items() if v is not None}}
+        if system:
+            body["systemInstruction"] = {"parts": [{"text": system}]}
+        usage = None
+        async for chunk in client.stream(model, body):
+            for candidate in chunk.get("candidates", [])[:1]:
+                text = "".join(part.get("text", "") for part in candidate.get("content", {}).get("parts", []))
+                if text:
+                    yield text
+            usage = chunk.get("usageMetadata") or usage
+        if usage is not None:
+            yield PromptUsage(
+                "gemini", model, usage.get("promptTokenCount", 0), usage.get("cachedContentTokenCount", 0)
+            )
+
+    def _record_ttft(self, provider: str, model: str, seconds: float) -> None:
+        if self.recorder is not None:
+            self.recorder.record("provider_ttft", seconds, provider=provider, model=model)
+
+    async def _produce(self, provider: str, api_key: str, model: str, messages, params: dict, put):
+        """Stream one request through put, retrying 429s that arrive before the first token."""
+        sent = time.perf_counter()
+        try:
+            client = await self._get_client(provider, api_key)
+            tokens = self._openai_tokens if provider == "openai" else self._gemini_tokens
+            async with self._semaphore(provider):
+                attempt = 0
+                while True:
+                    started = False
+                    try:
+                        async for token in tokens(client, model, messages, params):
+                            if isinstance(token, PromptUsage):
+                                put(token)
+                                continue
+                            if not started:
+                                self._record_ttft(provider, model, time.perf_counter() - sent)
+                            started = True
+                            put(token)
+                        break
+                    except Exception as e:
+                        # A stream that already produced text cannot be replayed
+                        if started or attempt >= self.max_retries or not is_rate_limited(e):
+                            raise
+                        await asyncio.sleep(retry_delay(e, attempt))
+                        attempt += 1
+            put(_DONE)
+        except Exception as e:
+            put(e)
+
+    # === Hedging ===
+
+    def hedge_deadline(self, provider: str, model: str) -> float:
+        """
+        Time to wait for a model's first token before hedging a request.
+
+        Args:
+            provider (str): "openai" or "gemini"
+            model (str): Provider model name
+
+        Returns:
+            float: Seconds; HEDGE_QUANTILE of the model's recent times to first
+                token, within the configured bounds
+        """
+        if self.recorder is None:
+            return HEDGE_DEFAULT_DEADLINE_SECONDS
+        samples = [entry["seconds"] for entry in self.recorder.recent("provider_ttft", provider=provider, model=model)]
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return HEDGE_DEFAULT_DEADLINE_SECONDS
+        deadline = float(np.quantile(samples, HEDGE_QUANTILE))
+        return min(max(deadline, HEDGE_MIN_DEADLINE_SECONDS), HEDGE_MAX_DEADLINE_SECONDS)
+
+    async def _hedge(self, requests, params: dict, deadline: float, put):
+        """
+        Race the requests: the next one starts when the deadline passes without
+        a first token, or at once when a request fails before its first token.
+        The first to produce a token is relayed through put and the others are
+        cancelled.
+        """
+        racers = {}  # pending first item -> (request index, its inbox, its producer, start time)
+        last_launch = time.perf_counter()
+
+        def launch(index):
+            nonlocal last_launch
+            last_launch = time.perf_counter()
+            provider, api_key, model, messages = requests[index]
+            inbox = asyncio.Queue()
+            producer = asyncio.ensure_future(
+                self._produce(provider, api_key, model, messages, params, inbox.put_nowait)
+            )
+            racers[asyncio.ensure_future(inbox.get())] = (index, inbox, producer, last_launch)
+
+        launch(0)
+        launched, winner, error = 1, None, None
+        try:
+            while racers:
+                timeout = None
+                if launched < len(requests):
+                    timeout = max(deadline - (time.perf_counter() - last_launch), 0)
+                done, _ = await asyncio.wait(racers, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    provider, _, model, _ = requests[launched]
+                    if self.recorder is not None:
+                        self.recorder.record("hedge", deadline, provider=provider, model=model)
+                    launch(launched)
+                    launched += 1
+                    continue
+
+                getter = done.pop()
+                index, inbox, producer, _ = racers.pop(getter)
+                item = getter.result()
+                if isinstance(item, Exception):
+                    # Fail over without waiting for the deadline
+                    error = item
+                    if launched < len(requests):
+                        launch(launched)
+                        launched += 1
+                    continue
+
+                winner = producer
+                for other, (other_index, _, other_producer, started) in racers.items():
+                    other.cancel()
+                    other_producer.cancel()
+                    if other_index == 0:
+                        # The primary lost: its first token would have come later still
+                        provider, _, model, _ = requests[0]
+                        self._record_ttft(provider, model, time.perf_counter() - started)
+                racers.clear()
+
+                put(_Winner(index))
+                while True:
+                    put(item)
+                    if item is _DONE or isinstance(item, Exception):
+                        return
+                    item = await inbox.get()
+            put(error)
+        finally:
+            for getter, (_, _, producer, _) in racers.items():
+                getter.cancel()
+                producer.cancel()
+            if winner is not None:
+                winner.cancel()
+
+    # === Public API ===
+
+    def _relay(self, produce, on_winner=None, on_usage=None):
+        """Run a producer coroutine on the loop and yield its tokens in UI-sized batches."""
+        out = queue.Queue()
+        future = asyncio.run_coroutine_threadsafe(produce(out.put), self._loop)
+        first = True
+        try:
+            while True:
+                item = out.get()
+                if isinstance(item, _Winner):
+                    if on_winner is not None:
+                        on_winner(item.index)
+                    continue
+                if isinstance(item, PromptUsage):
+                    if on_usage is not None:
+                        on_usage(item)
+                    continue
+                if item is _DONE:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                batch = [item]
+                if not first:
+                    # Collect whatever else arrives within the flush window
+                    deadline = time.monotonic() + self.flush_seconds
+                    while (remaining := deadline - time.monotonic()) > 0:
+                        try:
+                            item = out.get(timeout=remaining)
+                        except queue.Empty:
+                            break
+                        if item is _DONE or isinstance(item, Exception):
+                            out.put(item)
+                            break
+                        if isinstance(item, PromptUsage):
+                            if on_usage is not None:
+                                on_usage(item)
+                            continue
+                        batch.append(item)
+                first = False
+                yield "".join(batch)
+        finally:
+            # The reader went away (e.g. a rerun); stop the request
+            future.cancel()
+
+    def stream(self, provider: str, api_key: str, model: str, messages, params: dict, on_usage=None):
+        """
+        Stream a chat completion, yielding batched text for the UI.
+
+        Args:
+            provider (str): "openai" or "gemini"
+            api_key (str): The session's API key for the provider
+            model (str): Provider model name
+            messages (list[dict]): Chat messages with role and content;
+                "assistant" messages are mapped to Gemini's "model" role and
+                "system" messages to its system instruction
+            params (dict): temperature, top_p and max_tokens
+            on_usage: Optional callback receiving the request's PromptUsage,
+                when the provider reports one
+
+        Yields:
+            str: Text received since the previous batch; the first token
+                is yielded on its own so time to first token is not delayed
+        """
+        if provider not in PROVIDERS:
+            raise ValueError(f"Unknown provider {provider!r}")
+        yield from self._relay(
+            lambda put: self._produce(provider, api_key, model, messages, params, put), on_usage=on_usage
+        )
+
+    def stream_hedged(self, requests, params: dict, deadline: float = None, on_winner=None, on_usage=None):
+        """
+        Stream a chat completion, hedging a slow first token with fallback requests.
+
+        Args:
+            requests (list[tuple]): (provider, api_key, model, messages) per model,
+                primary first; each carries the same question in its provider's format
+            params (dict): temperature, top_p and max_tokens
+            deadline (float): Seconds without a first token before the next request
+                is sent; defaults to hedge_deadline() of the primary model
+            on_winner: Optional callback receiving the index of the relayed request,
+                called before its first text is yielded
+            on_usage: Optional callback receiving the relayed request's PromptUsage
+
+        Yields:
+            str: Batched text of whichever request produced a token first
+        """
+        for provider, *_ in requests:
+            if provider not in PROVIDERS:
+                raise ValueError(f"Unknown provider {provider!r}")
+        if deadline is None:
+            deadline = self.hedge_deadline(requests[0][0], requests[0][2])
+        yield from self._relay(lambda put: self._hedge(requests, params, deadline, put), on_winner, on_usage)
@@ -3,20 +3,69 @@ Main application entry point for the Document Q&A System.
 
 This module orchestrates the initialization and setup of the application components
 including environment configuration, UI elements, and chat functionality.
+
+The upload panel, the chat and each sidebar settings panel run as Streamlit
+fragments: interacting with one reruns only that panel, so moving a slider or
+sending a message does not re-execute the upload checks or rebuild the rest
+of the page. Every panel run is timed, and the cold-start import time is
+recorded once per process (see the profile report in sidebar.py).
 """
 
-import streamlit as st
-from config import initialize_environment, initialize_session_state, initialize_chromadb, log_time
-from ui import set_ui_css
-from sidebar import set_sidebar_title, set_sidebar_file_uploader, set_sidebar_model_selection, set_sidebar_llm_params
-from file_upload import handle_file_upload_and_processing
-from chat import handle_chat
+import sys
+import time
+
+# Only the first run in a process pays for importing the app and its dependencies
+_COLD_START = "chat" not in sys.modules
+_import_start = time.perf_counter()
+
+import streamlit as st  # noqa: E402
+from config import (  # noqa: E402
+    initialize_environment, initialize_session_state, initialize_chromadb, rerun_scope
+)
+from resources import get_latency_recorder  # noqa: E402
+from ui import set_ui_css  # noqa: E402
+from sidebar import (  # noqa: E402
+    set_sidebar_title, set_sidebar_file_uploader, set_sidebar_model_selection, set_sidebar_llm_params,
+    set_sidebar_profile_report
+)
+from file_upload import handle_file_upload_and_processing  # noqa: E402
+from chat import handle_chat  # noqa: E402
+
+_IMPORT_SECONDS = time.perf_counter() - _import_start
+
+
+@st.fragment
+def upload_panel():
+    """File uploader and ingestion status; reruns alone when the uploaded files change."""
+    with rerun_scope("upload"):
+        handle_file_upload_and_processing(set_sidebar_file_uploader())
+
+
+@st.fragment
+def chat_panel():
+    """Chat interface; reruns alone when a message is sent."""
+    with rerun_scope("chat"):
+        handle_chat()
+
+
+@st.fragment
+def model_panel():
+    """Model and API key selection; reruns the app only when they change."""
+    with rerun_scope("model"):
+        set_sidebar_model_selection()
+
+
+@st.fragment
+def llm_params_panel():
+    """LLM parameter sliders; reruns alone when a slider moves."""
+    with rerun_scope("llm_params"):
+        set_sidebar_llm_params()
 
 
 def main():
     """
     Initialize and run the main application workflow.
-    
+
     Executes the following sequence:
     1. Environment and session setup
     2. UI component initialization
@@ -24,20 +73,28 @@ def main():
     4. Chat interface setup
     5. Model configuration
     """
-    initialize_environment()
-    initialize_session_state()
-    initialize_chromadb()
-    
-    set_ui_css()
-    set_sidebar_title()
-    
-    uploaded_files = set_sidebar_file_uploader()
-    handle_file_upload_and_processing(uploaded_files)
-    handle_chat(uploaded_files)
-    
-    # Configure model settings
-    set_sidebar_model_selection()
-    set_sidebar_llm_params()
+    if _COLD_START:
+        get_latency_recorder().record("import", _IMPORT_SECONDS, module="app")
+
+    with rerun_scope("app"):
+        initialize_environment()
+        initialize_session_state()
+        initialize_chromadb()
+
+        set_ui_css()
+        set_sidebar_title()
+
+        # Fragments cannot write to st.sidebar, so sidebar panels run inside it
+        with st.sidebar:
+            upload_panel()
+        chat_panel()
+
+        # Configure model settings
+        with st.sidebar:
+            model_panel()
+            llm_params_panel()
+
+        set_sidebar_profile_report()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,166 @@
+"""
+PDF text extraction backends for the DocuDialogue application.
+
+Page text can be extracted by one of several local parsers, chosen per
+deployment with DOCUDIALOGUE_PDF_BACKEND:
+
+- pypdf: pure Python; the slowest, but has no native dependencies
+- pymupdf: MuPDF bindings (fitz); fast and keeps the reading order well
+- pypdfium2: PDFium bindings; fast, with text close to what a browser shows
+
+Every backend exposes the same page count and per-page text interface, and
+its library is only imported when a document is opened, so extraction
+workers load just the parser in use. Parsers differ slightly in whitespace
+and ligature handling, so the backend is part of the ingestion cache key.
+
+extract_page_text bounds the time spent on one page with
+DOCUDIALOGUE_PAGE_TIMEOUT_SECONDS: a page that takes longer is logged and
+yields no text instead of stalling the upload. The timeout uses SIGALRM, so
+it only applies on the main thread of a process, which is where extraction
+workers run their tasks, and only to Python code: a signal handler cannot
+run while a native parser is inside a call. Ingestion therefore also bounds
+each page range from the coordinating process (see ingestion.ExtractionPool).
+"""
+
+import os
+import signal
+import sys
+import threading
+from contextlib import contextmanager
+
+PDF_BACKEND = os.getenv("DOCUDIALOGUE_PDF_BACKEND", "pypdf")
+# 0 disables the timeout
+PAGE_TIMEOUT_SECONDS = float(os.getenv("DOCUDIALOGUE_PAGE_TIMEOUT_SECONDS", "30"))
+
+
+class PageTimeout(Exception):
+    """Raised when extracting one page exceeds the page timeout."""
+
+
+class PypdfDocument:
+    """PDF opened with pypdf."""
+
+    def __init__(self, path: str):
+        from pypdf import PdfReader
+
+        self._reader = PdfReader(path)
+
+    def __len__(self) -> int:
+        return len(self._reader.pages)
+
+    def page_text(self, number: int) -> str:
+        return self._reader.pages[number].extract_text() or ""
+
+    def close(self) -> None:
+        self._reader.close()
+
+
+class PyMuPDFDocument:
+    """PDF opened with PyMuPDF."""
+
+    def __init__(self, path: str):
+        import fitz
+
+        self._document = fitz.open(path)
+
+    def __len__(self) -> int:
+        return self._document.page_count
+
+    def page_text(self, number: int) -> str:
+        return self._document.load_page(number).get_text("text")
+
+    def close(self) -> None:
+        self._document.close()
+
+
+class PdfiumDocument:
+    """PDF opened with pypdfium2."""
+
+    def __init__(self, path: str):
+        import pypdfium2
+
+        self._document = pypdfium2.PdfDocument(path)
+
+    def __len__(self) -> int:
+        return len(self._document)
+
+    def page_text(self, number: int) -> str:
+        page = self._document[number]
+        try:
+            text_page = page.get_textpage()
+            try:
+                return text_page.get_text_bounded()
+            finally:
+                text_page.close()
+        finally:
+            page.close()
+
+    def close(self) -> None:
+        self._document.close()
+
+
+PDF_BACKENDS = {
+    "pypdf": PypdfDocument,
+    "pymupdf": PyMuPDFDocument,
+    "pypdfium2": PdfiumDocument,
+}
+
+
+@contextmanager
+def open_pdf(path: str, backend: str = PDF_BACKEND):
+    """
+    Open a PDF with an extraction backend.
+
+    Args:
+        path (str): Path to the PDF file
+        backend (str): One of PDF_BACKENDS
+
+    Yields:
+        Document with len() for the page count and page_text(number)
+    """
+    if backend not in PDF_BACKENDS:
+        raise ValueError(f"Unknown PDF backend {backend!r}; choose one of {tuple(PDF_BACKENDS)}")
+    document = PDF_BACKENDS[backend](path)
+    try:
+        yield document
+    finally:
+        document.close()
+
+
+@contextmanager
+def _deadline(seconds: float):
+    """Raise PageTimeout in the block after a number of seconds, where SIGALRM is available."""
+    if not seconds or not hasattr(signal, "setitimer") or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    def expire(signum, frame):
+        raise PageTimeout(f"page extraction exceeded {seconds:g} s")
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def extract_page_text(document, number: int, timeout: float = PAGE_TIMEOUT_SECONDS) -> str:
+    """
+    Extract one page's text, giving up after the page timeout.
+
+    Args:
+        document: Document from open_pdf
+        number (int): Page index
+        timeout (float): Seconds allowed for the page; 0 for no limit
+
+    Returns:
+        str: Page text, empty if the page timed out
+    """
+    try:
+        with _deadline(timeout):
+            return document.page_text(number)
+    except PageTimeout as e:
+        print(f"Skipped page {number + 1}: {e}", file=sys.stderr)
+        return ""
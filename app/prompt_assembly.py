@@ -0,0 +1,103 @@
+"""
+Cache-friendly prompt assembly shared by every LLM provider.
+
+Providers cache the longest prompt prefix they have seen recently and bill
+and process those tokens at a fraction of the cost, but only an exact prefix
+matches. Every request is therefore laid out from the most stable part to
+the most volatile one, in the same way for OpenAI and Gemini:
+
+1. the static instructions, identical for every request
+2. the earlier chat turns, stored as the bare questions and answers so they
+   read the same on every later turn
+3. the retrieved context and the question, which change every turn
+
+The retrieved context never goes into the instructions, so a follow-up
+question reuses the cached instructions and history of the previous turn.
+Token counts of the static segments are memoized per model, and the gateway
+reports how many prompt tokens each provider served from its cache (see
+llm_gateway.PromptUsage).
+"""
+
+from dataclasses import dataclass
+from context_builder import MESSAGE_OVERHEAD_TOKENS, QUESTION_TEMPLATE, count_tokens
+
+SYSTEM_INSTRUCTIONS = """You are a versatile and contextually aware assistant, designed to process a broad range of documents—including PDFs, text snippets, spreadsheets, and other reference materials—and generate insightful, accurate, and clearly presented responses. Your purpose extends across multiple domains, from finance to research analysis, to general question-answering and summarization tasks. Strive to remain both flexible and domain-agnostic, adapting to any topic or medium while maintaining exactness, clarity, and a commitment to helping users achieve their goals.
+
+                When responding to financial questions—such as inquiries about revenues, expenditures, or market trends—draw on provided references to supply grounded, verifiable figures. Ensure that all financial metrics are accurate, and contextualize them to highlight their relevance to the broader scenario. Present these findings in a manner that is both accessible and precise, noting key insights and pointing out patterns or anomalies where relevant.
+
+                Summarize key facts and insights from any given source, be it a lengthy report, a single table, or a series of PDF extracts. Condense information thoughtfully, prioritizing the most valuable data points and analytical takeaways. Keep your summaries logically structured and balanced, spotlighting what is most essential while not omitting important details that might shape the reader’s understanding.
+
+                In terms of formatting, continually refine your textual and tabular outputs for maximum clarity. If data lends itself to a tabular format, present it as a well-labeled, neatly aligned table that makes it easy to compare values. For textual explanations, consider using headings, bullet points, and concise statements that enhance readability and comprehension, always choosing the most effective format for the given content.
+
+                Remain sensitive to user instructions and evolving inquiries, and handle follow-up questions in a way that integrates seamlessly with previously provided context. Refer back to earlier information and maintain continuity of discussion, ensuring that all responses are consistent and coherent. If new information is provided or corrections become necessary, adapt gracefully, updating your analysis without losing previously established insights.
+
+                By upholding these standards—broad adaptability, financial precision, clear summarization, refined formatting, and dynamic engagement—you will provide users with a consistently high-value experience. Your overarching goal is to deliver thorough, thoughtful, and contextually relevant guidance that meets users’ present needs and anticipates their future questions.
+
+                Each question comes with context retrieved from the documents. Use it to answer the question, and if the context doesn't contain the answer, say so."""
+
+@dataclass(frozen=True)
+class Prompt:
+    """
+    Messages of one request, most stable first.
+
+    Attributes:
+        messages (tuple): Chat messages with role and content for the LLM gateway
+        prefix_tokens (int): Tokens of the instructions and history, the part
+            a provider can serve from its prompt cache
+        tokens (int): Tokens of the whole prompt
+    """
+
+    messages: tuple
+    prefix_tokens: int
+    tokens: int
+
+
+def static_tokens(text: str, model: str) -> int:
+    """
+    Count the tokens of a static segment such as the instructions.
+
+    count_tokens memoizes the count, so the instructions are tokenized once per model.
+
+    Args:
+        text (str): Segment text
+        model (str): Selected model name
+
+    Returns:
+        int: Token count, including the message overhead
+    """
+    return count_tokens(text, model) + MESSAGE_OVERHEAD_TOKENS
+
+
+def question_message(context: str, prompt: str) -> str:
+    """Format the volatile last message: the retrieved context, then the question."""
+    return QUESTION_TEMPLATE.format(context=context or "(no context found)", prompt=prompt)
+
+
+def assemble_prompt(history, context: str, prompt: str, model: str,
+                    instructions: str = SYSTEM_INSTRUCTIONS) -> Prompt:
+    """
+    Lay out a request so that its prefix is shared with the previous turns.
+
+    Args:
+        history (list[dict]): Earlier messages kept in the token budget, oldest first
+        context (str): Retrieved context for this question
+        prompt (str): User question
+        model (str): Selected model name, for the token counts
+        instructions (str): Static system instructions
+
+    Returns:
+        Prompt: System message, history and question message with their token counts
+    """
+    question = question_message(context, prompt)
+    prefix_tokens = static_tokens(instructions, model) + sum(
+        count_tokens(message["content"], model) + MESSAGE_OVERHEAD_TOKENS for message in history
+    )
+    return Prompt(
+        messages=(
+            {"role": "system", "content": instructions},
+            *({"role": message["role"], "content": message["content"]} for message in history),
+            {"role": "user", "content": question},
+        ),
+        prefix_tokens=prefix_tokens,
+        tokens=prefix_tokens + count_tokens(question, model) + MESSAGE_OVERHEAD_TOKENS
+    )
@@ -0,0 +1,228 @@
+"""
+Two-level query cache for the DocuDialogue application.
+
+The first level caches retrieval results per collection, both by exact
+(normalized) question and by embedding similarity, so a repeated or
+near-identical question skips the vector search. The second level caches
+complete LLM responses keyed on the model, its parameters, the retrieved
+chunk IDs, the conversation so far and the normalized question. Both levels
+are bounded with LRU eviction, expire after a TTL, and are invalidated for a
+collection whenever its contents change.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv("DOCUDIALOGUE_QUERY_CACHE_MAX_ENTRIES", "512"))
+QUERY_CACHE_TTL_SECONDS = float(os.getenv("DOCUDIALOGUE_QUERY_CACHE_TTL_SECONDS", "3600"))
+QUERY_CACHE_SIMILARITY = float(os.getenv("DOCUDIALOGUE_QUERY_CACHE_SIMILARITY", "0.95"))
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Normalize a question so trivially different phrasings share a cache entry.
+
+    Args:
+        prompt (str): Raw user question
+
+    Returns:
+        str: Lower-cased question with collapsed whitespace and no trailing punctuation
+    """
+    return re.sub(r"\s+", " ", prompt).strip().lower().rstrip("?!. ")
+
+
+def exact_terms(prompt: str) -> frozenset:
+    """
+    Extract the figures, tickers and codes a question must match exactly.
+
+    Two questions that differ only in such a term embed almost identically,
+    so a semantic cache hit is only allowed when these terms agree.
+
+    Args:
+        prompt (str): Raw user question
+
+    Returns:
+        frozenset[str]: Terms containing digits or written in capitals
+    """
+    return frozenset(re.findall(r"\b\w*\d\w*\b|\b[A-Z]{2,}\b", prompt))
+
+
+def make_response_key(model: str, params: dict, chunk_ids, history, prompt: str) -> str:
+    """
+    Build the response-cache key for one LLM request.
+
+    Args:
+        model (str): Selected model name
+        params (dict): Generation parameters (temperature, top_p, max tokens)
+        chunk_ids (list[str]): IDs of the context chunks sent with the prompt
+        history (list[dict]): Prior chat messages, which change the answer to follow-ups
+        prompt (str): Raw user question
+
+    Returns:
+        str: Hex digest identifying the response
+    """
+    payload = json.dumps(
+        [model, params, list(chunk_ids), history, normalize_prompt(prompt)],
+        sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class QueryCache:
+    """
+    Thread-safe retrieval and response cache shared by all sessions.
+
+    Args:
+        max_entries (int): Maximum entries per level before LRU eviction
+        ttl_seconds (float): Lifetime of an entry
+        similarity_threshold (float): Minimum cosine similarity for a semantic hit
+    """
+
+    def __init__(self, max_entries: int = QUERY_CACHE_MAX_ENTRIES,
+                 ttl_seconds: float = QUERY_CACHE_TTL_SECONDS,
+                 similarity_threshold: float = QUERY_CACHE_SIMILARITY):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self._retrievals = OrderedDict()
+        self._responses = OrderedDict()
+        self._lock = threading.Lock()
+
+    # === Internal helpers ===
+
+    def _expired(self, created: float) -> bool:
+        return time.monotonic() - created > self.ttl_seconds
+
+    def _get(self, store: OrderedDict, key):
+        entry = store.get(key)
+        if entry is None:
+            return None
+        if self._expired(entry["created"]):
+            del store[key]
+            return None
+        store.move_to_end(key)
+        return entry
+
+    def _put(self, store: OrderedDict, key, entry: dict) -> None:
+        entry["created"] = time.monotonic()
+        store[key] = entry
+        store.move_to_end(key)
+        while len(store) > self.max_entries:
+            store.popitem(last=False)
+
+    # === Retrieval level ===
+
+    def get_retrieval(self, scope: str, prompt: str, variant: str = ""):
+        """
+        Look up retrieval results for an exact (normalized) question.
+
+        Args:
+            scope (str): Collection the results belong to
+            prompt (str): Raw user question
+            variant (str): Search options the results depend on, such as a filter
+
+        Returns:
+            dict | None: Cached query results
+        """
+        with self._lock:
+            entry = self._get(self._retrievals, (scope, normalize_prompt(prompt), variant))
+            return entry["results"] if entry else None
+
+    def get_similar_retrieval(self, scope: str, prompt: str, embedding, variant: str = ""):
+        """
+        Look up retrieval results for the most similar cached question.
+
+        Args:
+            scope (str): Collection the results belong to
+            prompt (str): Raw user question
+            embedding: Embedding vector of the new question
+            variant (str): Search options the results depend on, such as a filter
+
+        Returns:
+            dict | None: Cached query results when similarity meets the threshold
+        """
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        terms = exact_terms(prompt)
+
+        with self._lock:
+            best_key, best_score = None, self.similarity_threshold
+            for key, entry in list(self._retrievals.items()):
+                if key[0] != scope or key[2] != variant or entry["terms"] != terms:
+                    continue
+                if self._expired(entry["created"]):
+                    del self._retrievals[key]
+                    continue
+                score = float(np.dot(entry["embedding"], query))
+                if score >= best_score:
+                    best_key, best_score = key, score
+            if best_key is None:
+                return None
+            self._retrievals.move_to_end(best_key)
+            return self._retrievals[best_key]["results"]
+
+    def put_retrieval(self, scope: str, prompt: str, embedding, results, variant: str = "") -> None:
+        """
+        Store retrieval results for a question.
+
+        Args:
+            scope (str): Collection the results belong to
+            prompt (str): Raw user question
+            embedding: Embedding vector of the question
+            results (dict): Query results to cache
+            variant (str): Search options the results depend on, such as a filter
+        """
+        vector = np.asarray(embedding, dtype=np.float32)
+        vector = vector / (np.linalg.norm(vector) or 1.0)
+        with self._lock:
+            self._put(self._retrievals, (scope, normalize_prompt(prompt), variant),
+                      {"embedding": vector, "terms": exact_terms(prompt), "results": results})
+
+    # === Response level ===
+
+    def get_response(self, key: str):
+        """
+        Look up a complete LLM response.
+
+        Args:
+            key (str): Key from make_response_key
+
+        Returns:
+            str | None: Cached response text
+        """
+        with self._lock:
+            entry = self._get(self._responses, key)
+            return entry["response"] if entry else None
+
+    def put_response(self, scope: str, key: str, response: str) -> None:
+        """
+        Store a complete LLM response.
+
+        Args:
+            scope (str): Collection the context was retrieved from
+            key (str): Key from make_response_key
+            response (str): Response text
+        """
+        with self._lock:
+            self._put(self._responses, key, {"scope": scope, "response": response})
+
+    # === Invalidation ===
+
+    def invalidate(self, scope: str) -> None:
+        """
+        Drop every retrieval and response derived from a collection.
+
+        Args:
+            scope (str): Collection whose contents changed
+        """
+        with self._lock:
+            for key in [key for key in self._retrievals if key[0] == scope]:
+                del self._retrievals[key]
+            for key in [key for key, entry in self._responses.items() if entry["scope"] == scope]:
+                del self._responses[key]
@@ -0,0 +1,130 @@
+"""
+Cross-encoder reranking for the DocuDialogue application.
+
+Retrieval fetches a wide candidate set cheaply. A small cross-encoder then
+reads each (question, chunk) pair on the CPU and scores its relevance more
+precisely than the embedding similarity or BM25 can. Only the candidates
+scoring above a threshold are kept, up to a maximum, so a request carries
+few but relevant chunks. The token budget in context_builder then trims the
+reranked list further if needed.
+
+Pairs are scored in batches, and scores are cached per (question, chunk),
+so a repeated or regenerated question does not run the model again. The
+model is loaded on first use.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+from query_cache import normalize_prompt
+
+# Empty disables reranking
+RERANKER_MODEL = os.getenv("DOCUDIALOGUE_RERANKER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_CANDIDATES = int(os.getenv("DOCUDIALOGUE_RERANK_CANDIDATES", "20"))
+# Relevance probability a chunk needs to be kept
+RERANK_MIN_SCORE = float(os.getenv("DOCUDIALOGUE_RERANK_MIN_SCORE", "0.1"))
+RERANK_MIN_RESULTS = int(os.getenv("DOCUDIALOGUE_RERANK_MIN_RESULTS", "1"))
+RERANK_MAX_RESULTS = int(os.getenv("DOCUDIALOGUE_RERANK_MAX_RESULTS", "8"))
+RERANK_BATCH_SIZE = int(os.getenv("DOCUDIALOGUE_RERANK_BATCH_SIZE", "32"))
+RERANK_CACHE_ENTRIES = int(os.getenv("DOCUDIALOGUE_RERANK_CACHE_ENTRIES", "8192"))
+
+
+class CrossEncoderReranker:
+    """
+    Thread-safe cross-encoder with a score cache.
+
+    Args:
+        model_name (str): Hugging Face cross-encoder model
+        batch_size (int): Pairs scored per forward pass
+        cache_entries (int): Scores kept before LRU eviction
+    """
+
+    def __init__(self, model_name: str = RERANKER_MODEL, batch_size: int = RERANK_BATCH_SIZE,
+                 cache_entries: int = RERANK_CACHE_ENTRIES):
+        self.model_name = model_name
+        self.model = None
+        self.batch_size = batch_size
+        self.cache_entries = cache_entries
+        self._scores = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self) -> None:
+        """Load the model if it is not loaded yet."""
+        with self._lock:
+            self._load()
+
+    def _load(self) -> None:
+        if self.model is None:
+            from sentence_transformers import CrossEncoder
+
+            self.model = CrossEncoder(self.model_name, device="cpu")
+
+    def score(self, query: str, texts):
+        """
+        Score how well each text answers the query.
+
+        Args:
+            query (str): User question
+            texts (list[str]): Candidate chunk texts
+
+        Returns:
+            list[float]: Relevance probabilities in [0, 1], aligned with texts
+        """
+        query = normalize_prompt(query)
+        keys = [(query, hashlib.sha256(text.encode("utf-8")).hexdigest()) for text in texts]
+
+        with self._lock:
+            missing = [i for i, key in enumerate(keys) if key not in self._scores]
+            if missing:
+                self._load()
+                logits = self.model.predict(
+                    [(query, texts[i]) for i in missing],
+                    batch_size=self.batch_size,
+                    show_progress_bar=False
+                )
+                for i, logit in zip(missing, np.atleast_1d(logits)):
+                    self._scores[keys[i]] = float(1.0 / (1.0 + np.exp(-logit)))
+            scores = []
+            for key in keys:
+                self._scores.move_to_end(key)
+                scores.append(self._scores[key])
+            while len(self._scores) > self.cache_entries:
+                self._scores.popitem(last=False)
+        return scores
+
+    def rerank(self, query: str, search_results, min_score: float = RERANK_MIN_SCORE,
+               min_results: int = RERANK_MIN_RESULTS, max_results: int = RERANK_MAX_RESULTS):
+        """
+        Reorder retrieval results by relevance and keep the relevant ones.
+
+        Args:
+            query (str): User question
+            search_results (dict): Chroma-style results with ids, documents and metadatas
+            min_score (float): Relevance a chunk needs to be kept
+            min_results (int): Chunks kept even when none reach min_score
+            max_results (int): Most chunks kept
+
+        Returns:
+            dict: Chroma-style results, best first, with a "scores" entry; other
+                entries such as the summaries are passed through
+        """
+        ids = search_results["ids"][0]
+        documents = search_results["documents"][0]
+        metadatas = search_results["metadatas"][0]
+        if not ids:
+            return {**search_results, "scores": [[]]}
+
+        scores = self.score(query, documents)
+        order = sorted(range(len(ids)), key=lambda i: scores[i], reverse=True)
+        kept = [i for i in order[:max_results] if scores[i] >= min_score]
+        if len(kept) < min_results:
+            kept = order[:min_results]
+        return {
+            **search_results,
+            "ids": [[ids[i] for i in kept]],
+            "documents": [[documents[i] for i in kept]],
+            "metadatas": [[metadatas[i] for i in kept]],
+            "scores": [[scores[i] for i in kept]],
+        }
@@ -0,0 +1,383 @@
+"""
+Process-wide shared resources for the DocuDialogue application.
+
+Heavy objects such as the embedding model, the ChromaDB client, the PDF
+extraction process pool, the query cache, the background job queue, the
+latency recorder, the LLM gateway, the reranker, the lexical indexes, the
+session registry and the shared document library are created once per server
+process through Streamlit's resource cache and shared by every browser session.
+Sessions stay isolated by working in their own collection and document tree, so memory stays
+flat as users join, idle sessions are reclaimed, and a new session starts
+without loading any model weights. Models are loaded on first use, or on a
+background thread right after the first page render when preloading is on,
+and each load is recorded as a "load" span.
+"""
+
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from contextlib import closing
+from functools import partial
+import streamlit as st
+import chromadb
+from chromadb import EmbeddingFunction
+from ingestion import EXTRACT_WORKERS, ExtractionPool
+from query_cache import QueryCache
+from jobs import JobManager
+from lexical_index import LexicalIndex
+from embeddings import SentenceTransformerEmbedder
+from tracing import METRICS_PORT, LatencyRecorder, serve_metrics
+from library import LIBRARY_DIR, open_library, open_library_tree
+from document_tree import tree_collection_name
+from llm_gateway import LLMGateway
+from reranker import RERANKER_MODEL, CrossEncoderReranker
+from vector_index import index_metadata
+from sessions import SessionRegistry, directory_size
+
+COLLECTION_PREFIX = "pdf_collection"
+
+# Load models in the background at startup instead of on first use
+PRELOAD_MODELS = os.getenv("DOCUDIALOGUE_PRELOAD_MODELS", "1") == "1"
+
+# Guards collection creation so two sessions never race on the same name
+_collection_lock = threading.Lock()
+# Guards loading a collection's lexical index from disk
+_lexical_lock = threading.Lock()
+
+
+class SharedEmbeddingFunction(EmbeddingFunction):
+    """
+    Thread-safe wrapper around a single embedding model instance.
+
+    Calls are serialized with a lock so concurrent sessions can share
+    one copy of the weights without interleaving inside the model.
+    """
+
+    def __init__(self, embedding_function):
+        self._embedding_function = embedding_function
+        self._lock = threading.Lock()
+
+    @property
+    def model_id(self) -> str:
+        """Identifier of the underlying model and backend."""
+        return self._embedding_function.model_id
+
+    def load(self, recorder: LatencyRecorder) -> None:
+        """Load the model weights if they are not loaded yet."""
+        with self._lock:
+            if not self._embedding_function.loaded:
+                with recorder.span("load", component="embedding"):
+                    self._embedding_function.model
+
+    def __call__(self, input):
+        with self._lock:
+            return self._embedding_function(input)
+
+
+def _preload(name: str, load, *args) -> None:
+    """Run a model load on a background thread."""
+    if PRELOAD_MODELS:
+        threading.Thread(target=load, args=args, name=f"preload-{name}", daemon=True).start()
+
+
+@st.cache_resource
+def get_embedding_function() -> SharedEmbeddingFunction:
+    """
+    Create the embedding function shared by the whole server process.
+
+    The model, backend, batch size and thread count come from the
+    DOCUDIALOGUE_EMBEDDING_* settings (see embeddings.py). The weights are
+    loaded on first use, or in the background when preloading is on.
+
+    Returns:
+        SharedEmbeddingFunction: Chroma-compatible embedding function
+    """
+    embedding_function = SharedEmbeddingFunction(SentenceTransformerEmbedder())
+    _preload("embedding", embedding_function.load, get_latency_recorder())
+    return embedding_function
+
+
+@st.cache_resource
+def get_store_dir() -> str:
+    """
+    Create the directory holding this process's vector store and lexical indexes.
+
+    Returns:
+        str: Path of the store directory
+    """
+    return tempfile.mkdtemp(prefix="docudialogue-chroma-")
+
+
+@st.cache_resource
+def get_upload_root() -> str:
+    """
+    Create the directory holding every session's temporary upload directory.
+
+    Returns:
+        str: Path of the upload root
+    """
+    return tempfile.mkdtemp(prefix="docudialogue-uploads-")
+
+
+@st.cache_resource
+def get_chroma_client():
+    """
+    Create the ChromaDB client shared by every session in this process.
+
+    Returns:
+        chromadb.ClientAPI: Persistent client backed by the store directory
+    """
+    return chromadb.PersistentClient(path=get_store_dir())
+
+
+@st.cache_resource
+def _get_lexical_indexes() -> dict:
+    return {}
+
+
+def get_lexical_index(collection_name: str) -> LexicalIndex:
+    """
+    Get the BM25 index that mirrors a collection, loading it from disk once.
+
+    Args:
+        collection_name (str): Name of the collection the index mirrors
+
+    Returns:
+        LexicalIndex: Index shared by every user of the collection
+    """
+    indexes = _get_lexical_indexes()
+    with _lexical_lock:
+        if collection_name not in indexes:
+            indexes[collection_name] = LexicalIndex.load(
+                os.path.join(get_store_dir(), "lexical", f"{collection_name}.pkl")
+            )
+        return indexes[collection_name]
+
+
+def get_collection_name(session_id: str) -> str:
+    """
+    Build the collection name that namespaces a session's documents.
+
+    Args:
+        session_id (str): Unique identifier of the browser session
+
+    Returns:
+        str: Collection name valid for ChromaDB
+    """
+    return f"{COLLECTION_PREFIX}_{session_id}"
+
+
+def get_session_collection(session_id: str):
+    """
+    Get or create the isolated collection for a session in the shared store.
+
+    Args:
+        session_id (str): Unique identifier of the browser session
+
+    Returns:
+        chromadb.Collection: Collection holding only this session's chunks
+    """
+    with _collection_lock:
+        return get_chroma_client().get_or_create_collection(
+            name=get_collection_name(session_id),
+            embedding_function=get_embedding_function(),
+            metadata=index_metadata()
+        )
+
+
+def get_session_tree(session_id: str):
+    """
+    Get or create the document tree of a session's collection.
+
+    Nodes are written with precomputed embeddings, so the tree needs no
+    embedding function.
+
+    Args:
+        session_id (str): Unique identifier of the browser session
+
+    Returns:
+        chromadb.Collection: Summary nodes of this session's documents
+    """
+    with _collection_lock:
+        return get_chroma_client().get_or_create_collection(
+            name=tree_collection_name(get_collection_name(session_id)),
+            embedding_function=None,
+            metadata=index_metadata()
+        )
+
+
+@st.cache_resource
+def get_extraction_pool() -> ExtractionPool:
+    """
+    Create the process pool shared by every session for PDF page extraction.
+
+    Workers are spawned rather than forked so they never inherit the
+    embedding model's threads from the server process.
+
+    Returns:
+        ExtractionPool: Pool sized by DOCUDIALOGUE_EXTRACT_WORKERS
+    """
+    return ExtractionPool(
+        max_workers=EXTRACT_WORKERS,
+        mp_context=multiprocessing.get_context("spawn")
+    )
+
+
+@st.cache_resource
+def get_query_cache() -> QueryCache:
+    """
+    Create the retrieval and response cache shared by every session.
+
+    Returns:
+        QueryCache: Process-wide two-level query cache
+    """
+    return QueryCache()
+
+
+@st.cache_resource
+def get_job_manager() -> JobManager:
+    """
+    Create the background job queue shared by every session.
+
+    Returns:
+        JobManager: Process-wide job queue for ingestion work
+    """
+    return JobManager()
+
+
+@st.cache_resource
+def get_latency_recorder() -> LatencyRecorder:
+    """
+    Create the latency recorder shared by every session.
+
+    The Prometheus endpoint is started alongside it when
+    DOCUDIALOGUE_METRICS_PORT is set.
+
+    Returns:
+        LatencyRecorder: Process-wide span store
+    """
+    recorder = LatencyRecorder()
+    if METRICS_PORT:
+        serve_metrics(recorder, METRICS_PORT)
+    return recorder
+
+
+@st.cache_resource(show_spinner="Opening document library...")
+def get_library():
+    """
+    Open the pre-built document library shared by every session, if configured.
+
+    The library is built offline by ingest_library.py and only read by the app.
+
+    Returns:
+        tuple | None: (collection, LexicalIndex), or None when no library is configured
+    """
+    if not LIBRARY_DIR or not os.path.isdir(LIBRARY_DIR):
+        return None
+    return open_library(LIBRARY_DIR)
+
+
+@st.cache_resource
+def get_library_tree():
+    """
+    Open the document tree of the shared library, if it has one.
+
+    Returns:
+        chromadb.Collection | None: Library tree, or None when no library is
+            configured or it was built without a tree
+    """
+    if not LIBRARY_DIR or not os.path.isdir(LIBRARY_DIR):
+        return None
+    return open_library_tree(LIBRARY_DIR)
+
+
+@st.cache_resource
+def get_llm_gateway() -> LLMGateway:
+    """
+    Create the LLM gateway shared by every session.
+
+    Returns:
+        LLMGateway: Process-wide pooled, rate-limited LLM client, recording
+            each model's time to first token on the shared latency recorder
+    """
+    return LLMGateway(recorder=get_latency_recorder())
+
+
+@st.cache_resource
+def get_reranker():
+    """
+    Create the cross-encoder reranker shared by the whole server process.
+
+    The model is loaded on first use, or in the background when preloading is on.
+
+    Returns:
+        CrossEncoderReranker | None: Shared reranker, or None when
+            DOCUDIALOGUE_RERANKER_MODEL is empty
+    """
+    if not RERANKER_MODEL:
+        return None
+    reranker = CrossEncoderReranker()
+    _preload("reranker", _load_reranker, reranker, get_latency_recorder())
+    return reranker
+
+
+def _load_reranker(reranker: CrossEncoderReranker, recorder: LatencyRecorder) -> None:
+    if reranker.model is None:
+        with recorder.span("load", component="reranker"):
+            reranker.load()
+
+
+def _evict_session(client, indexes: dict, query_cache: QueryCache, session_id: str, temp_dir: str) -> None:
+    """Delete a session's collection and tree, BM25 index, cached queries and temp directory."""
+    collection_name = get_collection_name(session_id)
+    with _collection_lock:
+        for name in (collection_name, tree_collection_name(collection_name)):
+            try:
+                client.delete_collection(name)
+            except ValueError:
+                pass  # the session never created its collection
+    with _lexical_lock:
+        index = indexes.pop(collection_name, None)
+        if index is not None and index.path and os.path.exists(index.path):
+            os.remove(index.path)
+    query_cache.invalidate(collection_name)
+    shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def _session_disk_usage(store_dir: str, upload_root: str) -> int:
+    """Bytes used by the vector store, the lexical indexes and the upload directories."""
+    usage = directory_size(store_dir) + directory_size(upload_root)
+    database = os.path.join(store_dir, "chroma.sqlite3")
+    if os.path.exists(database):
+        # Deleted collections leave free pages behind that the file keeps; count only live ones
+        with closing(sqlite3.connect(f"file:{database}?mode=ro", uri=True)) as connection:
+            page_size = connection.execute("PRAGMA page_size").fetchone()[0]
+            free_pages = connection.execute("PRAGMA freelist_count").fetchone()[0]
+        usage -= page_size * free_pages
+    return usage
+
+
+def _session_is_busy(job_manager: JobManager, session_id: str) -> bool:
+    return any(not job.done for job in job_manager.jobs_for(session_id))
+
+
+@st.cache_resource
+def get_session_registry() -> SessionRegistry:
+    """
+    Create the registry that evicts idle sessions, and start its sweeps.
+
+    TTL, disk quota and sweep interval come from the DOCUDIALOGUE_SESSION_*
+    settings (see sessions.py). The sweeps run on their own thread, so the
+    shared resources they need are bound here rather than looked up there.
+
+    Returns:
+        SessionRegistry: Process-wide session registry
+    """
+    return SessionRegistry(
+        partial(_evict_session, get_chroma_client(), _get_lexical_indexes(), get_query_cache()),
+        partial(_session_disk_usage, get_store_dir(), get_upload_root()),
+        partial(_session_is_busy, get_job_manager())
+    ).start()
@@ -0,0 +1,165 @@
+"""
+Document retrieval module for the DocuDialogue application.
+
+This module finds the chunks that answer a question. The question is looked
+up in the shared query cache first, by exact text and then by embedding
+similarity, and only searches the stores on a miss. Searches are hybrid:
+dense vector results from the collection and BM25 results from the lexical
+index are merged with reciprocal rank fusion, so exact figures, tickers and
+codes are found even when the embedding misses them. Results from the
+session's collection and the shared document library are merged the same way.
+An optional SearchFilter scopes both searches to chosen documents and pages.
+With a document tree, the question is first routed to its closest sections
+and the dense search only drills down into those; the summaries of the
+routed sections and their documents are returned alongside the chunks.
+"""
+
+import os
+from resources import get_embedding_function, get_query_cache
+from document_tree import route
+
+N_RESULTS = 5
+# Candidates fetched from each retriever before fusion
+FUSION_CANDIDATES = int(os.getenv("DOCUDIALOGUE_FUSION_CANDIDATES", "20"))
+# Damping constant of reciprocal rank fusion
+RRF_K = 60
+
+
+def reciprocal_rank_fusion(rankings, k: int = RRF_K):
+    """
+    Merge several ranked ID lists into one ranking.
+
+    Args:
+        rankings (list[list[str]]): Ranked chunk IDs from each retriever, best first
+        k (int): Damping constant; larger values flatten the rank weights
+
+    Returns:
+        list[str]: Chunk IDs ordered by fused score
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+def merge_results(result_sets, n_results: int = N_RESULTS):
+    """
+    Merge retrieval results from several collections into one ranking.
+
+    Args:
+        result_sets (list[dict]): Chroma-style results, e.g. from the session
+            collection and the shared library
+        n_results (int): Number of chunks to keep
+
+    Returns:
+        dict: Chroma-style results with documents, metadatas, ids and the
+            summaries of every result set
+    """
+    if len(result_sets) == 1:
+        return result_sets[0]
+    found = {}
+    for results in result_sets:
+        found.update(
+            (chunk_id, (doc, meta))
+            for chunk_id, doc, meta in zip(results["ids"][0], results["documents"][0], results["metadatas"][0])
+        )
+    fused = reciprocal_rank_fusion([results["ids"][0] for results in result_sets])[:n_results]
+    return {
+        "ids": [fused],
+        "documents": [[found[chunk_id][0] for chunk_id in fused]],
+        "metadatas": [[found[chunk_id][1] for chunk_id in fused]],
+        "summaries": [summary for results in result_sets for summary in results.get("summaries", [])],
+    }
+
+
+def _hybrid_search(collection, lexical_index, prompt: str, embedding, n_results: int, search_filter=None,
+                   sections=None):
+    """Run vector and BM25 search and fuse them into Chroma-shaped results."""
+    candidates = max(n_results, FUSION_CANDIDATES)
+    where = search_filter.to_where() if search_filter else None
+    if sections:
+        # Drill down into the routed sections
+        where = {"$and": [where, sections.to_where()]} if where else sections.to_where()
+    dense = collection.query(
+        query_embeddings=[[float(value) for value in embedding]],
+        n_results=candidates,
+        where=where
+    )
+    if lexical_index is None or not len(lexical_index):
+        return {
+            "ids": [dense["ids"][0][:n_results]],
+            "documents": [dense["documents"][0][:n_results]],
+            "metadatas": [dense["metadatas"][0][:n_results]],
+        }
+
+    if search_filter:
+        lexical = lexical_index.search(
+            prompt, candidates, search_filter.sources, search_filter.first_page, search_filter.last_page
+        )
+    else:
+        lexical = lexical_index.search(prompt, candidates)
+    lexical = [chunk_id for chunk_id, _ in lexical]
+    fused = reciprocal_rank_fusion([dense["ids"][0], lexical])[:n_results]
+
+    # Lexical-only hits are fetched from the collection by ID
+    found = {
+        chunk_id: (doc, meta)
+        for chunk_id, doc, meta in zip(dense["ids"][0], dense["documents"][0], dense["metadatas"][0])
+    }
+    missing = [chunk_id for chunk_id in fused if chunk_id not in found]
+    if missing:
+        fetched = collection.get(ids=missing, include=["documents", "metadatas"])
+        found.update(
+            (chunk_id, (doc, meta))
+            for chunk_id, doc, meta in zip(fetched["ids"], fetched["documents"], fetched["metadatas"])
+        )
+
+    fused = [chunk_id for chunk_id in fused if chunk_id in found]
+    return {
+        "ids": [fused],
+        "documents": [[found[chunk_id][0] for chunk_id in fused]],
+        "metadatas": [[found[chunk_id][1] for chunk_id in fused]],
+    }
+
+
+def retrieve(collection, prompt: str, n_results: int = N_RESULTS, lexical_index=None,
+             embed_fn=None, cache=None, search_filter=None, tree=None):
+    """
+    Retrieve the chunks most relevant to a question.
+
+    BM25 still searches every chunk in scope, so an exact match outside the
+    routed sections is not lost.
+
+    Args:
+        collection: ChromaDB collection to search
+        prompt (str): User question
+        n_results (int): Number of chunks to return
+        lexical_index: Optional LexicalIndex mirroring the collection
+        embed_fn: Embedding function; defaults to the shared model
+        cache: QueryCache to use; defaults to the shared cache
+        search_filter (SearchFilter): Documents and pages to search; None searches everything
+        tree: Optional document tree of the collection to route the question through
+
+    Returns:
+        dict: Chroma-style query results with documents, metadatas and ids, and
+            the summaries of the routed sections and documents
+    """
+    cache = cache or get_query_cache()
+    scope = collection.name
+    variant = search_filter.key if search_filter else ""
+
+    results = cache.get_retrieval(scope, prompt, variant)
+    if results is not None:
+        return results
+
+    # Embed once; the same vector serves the semantic lookup and the search
+    embedding = (embed_fn or get_embedding_function())([prompt])[0]
+    results = cache.get_similar_retrieval(scope, prompt, embedding, variant)
+    if results is None:
+        sections = route(tree, embedding, search_filter=search_filter)
+        results = _hybrid_search(collection, lexical_index, prompt, embedding, n_results, search_filter, sections)
+        results["summaries"] = list(sections.summaries)
+
+    cache.put_retrieval(scope, prompt, embedding, results, variant)
+    return results
@@ -0,0 +1,187 @@
+"""
+Session lifecycle management for the DocuDialogue application.
+
+Every browser session owns a collection in the shared vector store, its
+BM25 index and a temporary directory for uploads. Nothing tells the server
+when a tab goes away, so the registry tracks each session's last activity
+and a background sweep reclaims sessions:
+
+- idle for longer than DOCUDIALOGUE_SESSION_TTL_SECONDS, and
+- least recently active first while the store and temp directories exceed
+  DOCUDIALOGUE_SESSION_DISK_QUOTA_MB
+
+Sessions with a running ingestion job are never evicted, and the quota
+never evicts a session that was active within the last sweep interval. A
+user who returns to an evicted session is reattached by re-ingesting the
+files still held by the uploader; their chunks and embeddings come from
+the ingestion cache, so this is a bulk insert rather than a re-parse.
+Reattaching waits for a running eviction of the session to finish, so it
+never picks up a collection that is about to be deleted.
+"""
+
+import os
+import sys
+import threading
+import time
+
+SESSION_TTL_SECONDS = float(os.getenv("DOCUDIALOGUE_SESSION_TTL_SECONDS", "3600"))
+# 0 disables the quota
+SESSION_DISK_QUOTA_BYTES = int(float(os.getenv("DOCUDIALOGUE_SESSION_DISK_QUOTA_MB", "4096")) * 1024 * 1024)
+SESSION_SWEEP_SECONDS = float(os.getenv("DOCUDIALOGUE_SESSION_SWEEP_SECONDS", "60"))
+
+
+def directory_size(path: str) -> int:
+    """
+    Total size in bytes of the files under a directory.
+
+    Args:
+        path (str): Directory to measure
+
+    Returns:
+        int: Size in bytes, 0 if the directory does not exist
+    """
+    total = 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                continue
+    return total
+
+
+class SessionRegistry:
+    """
+    Thread-safe registry of live sessions with TTL and disk-quota eviction.
+
+    Args:
+        evict: Callable(session_id, temp_dir) releasing a session's resources
+        usage: Callable() returning the bytes used by every session's data
+        is_busy: Callable(session_id) telling whether a session must be kept
+        ttl_seconds (float): Idle time after which a session is evicted
+        quota_bytes (int): Disk usage above which idle sessions are evicted; 0 for none
+        sweep_seconds (float): Interval between sweeps
+    """
+
+    def __init__(self, evict, usage, is_busy, ttl_seconds: float = SESSION_TTL_SECONDS,
+                 quota_bytes: int = SESSION_DISK_QUOTA_BYTES, sweep_seconds: float = SESSION_SWEEP_SECONDS):
+        self.evict = evict
+        self.usage = usage
+        self.is_busy = is_busy
+        self.ttl_seconds = ttl_seconds
+        self.quota_bytes = quota_bytes
+        self.sweep_seconds = sweep_seconds
+        self._sessions = {}
+        # Session ID -> Event set once its eviction has released everything
+        self._evicting = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def register(self, session_id: str, temp_dir: str) -> None:
+        """
+        Start tracking a session, or refresh one that is already tracked.
+
+        Args:
+            session_id (str): Unique identifier of the browser session
+            temp_dir (str): The session's temporary directory
+        """
+        self._wait_for_eviction(session_id)
+        with self._lock:
+            self._sessions[session_id] = {"temp_dir": temp_dir, "last_active": time.time()}
+
+    def touch(self, session_id: str) -> bool:
+        """
+        Record activity of a session.
+
+        If the session is being evicted, this waits until the eviction has
+        released its resources, so the caller can recreate them safely.
+
+        Args:
+            session_id (str): Unique identifier of the browser session
+
+        Returns:
+            bool: False if the session is not tracked, e.g. because it was evicted
+        """
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is not None:
+                entry["last_active"] = time.time()
+                return True
+        self._wait_for_eviction(session_id)
+        return False
+
+    def _wait_for_eviction(self, session_id: str) -> None:
+        with self._lock:
+            evicted = self._evicting.get(session_id)
+        if evicted is not None:
+            evicted.wait()
+
+    def sweep(self, now: float = None):
+        """
+        Evict expired sessions, then idle sessions while over the disk quota.
+
+        Args:
+            now (float): Current time; defaults to time.time()
+
+        Returns:
+            list[str]: IDs of the evicted sessions
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            by_activity = sorted(
+                ((session_id, dict(entry)) for session_id, entry in self._sessions.items()),
+                key=lambda item: item[1]["last_active"]
+            )
+
+        evicted = []
+        for session_id, entry in by_activity:
+            if now - entry["last_active"] > self.ttl_seconds and not self.is_busy(session_id):
+                if self._evict(session_id, entry):
+                    evicted.append(session_id)
+
+        if self.quota_bytes:
+            usage = self.usage()
+            for session_id, entry in by_activity:
+                if usage <= self.quota_bytes:
+                    break
+                if session_id in evicted or now - entry["last_active"] < self.sweep_seconds:
+                    continue
+                if self.is_busy(session_id) or not self._evict(session_id, entry):
+                    continue
+                evicted.append(session_id)
+                usage = self.usage()
+        return evicted
+
+    def _evict(self, session_id: str, entry: dict) -> bool:
+        with self._lock:
+            # A session that became active again since the sweep started is kept
+            current = self._sessions.get(session_id)
+            if current is None or current["last_active"] != entry["last_active"]:
+                return False
+            del self._sessions[session_id]
+            evicted = self._evicting[session_id] = threading.Event()
+        try:
+            self.evict(session_id, entry["temp_dir"])
+        finally:
+            with self._lock:
+                del self._evicting[session_id]
+            evicted.set()
+        return True
+
+    def start(self) -> "SessionRegistry":
+        """Run sweeps on a daemon thread; returns the registry."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="session-sweeper", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.sweep_seconds)
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Session sweep failed: {e}", file=sys.stderr)
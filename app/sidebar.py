@@ -2,11 +2,21 @@
 Sidebar component for the DocuDialogue application.
 
 This module handles the sidebar UI components including file upload,
-model selection, and parameter configuration for the LLM models.
+model selection, and parameter configuration for the LLM models. Panels that
+main.py runs as fragments render into the sidebar through a ``with st.sidebar``
+block, since fragments cannot write to ``st.sidebar`` directly.
 """
 
+import os
+import numpy as np
 import streamlit as st
 from config import log_time
+from resources import get_latency_recorder, get_library
+from llm_gateway import DEFAULT_MODEL, MODELS, PROVIDER_LABELS
+from tracing import QUANTILES
+
+# Show the startup and rerun profile in the sidebar
+PROFILE = os.getenv("DOCUDIALOGUE_PROFILE", "0") == "1"
 
 def set_sidebar_title():
     """Set up the main sidebar title and subtitle for the application."""
@@ -21,46 +31,72 @@ def set_sidebar_title():
 def set_sidebar_file_uploader():
     """Initialize and render the PDF file upload component.
 
+    Must be called inside a ``with st.sidebar`` block.
+
     Returns:
         list: List of uploaded file objects from Streamlit's file_uploader
     """
 
-    uploaded_files = st.sidebar.file_uploader(
+    uploaded_files = st.file_uploader(
         "Drop your PDF files here",
         type=["pdf"],
         accept_multiple_files=True,
         key="file_uploader"
     )
+    library = get_library()
+    if library is not None:
+        st.caption(f"📚 Shared library: {library[0].count()} indexed chunks")
     log_time("File uploader initialized")
     return uploaded_files
 
+def _model_label(name: str) -> str:
+    """Label a model from MODELS with its provider, marking the default one."""
+    label = f"{PROVIDER_LABELS[MODELS[name][0]]} {name}"
+    return f"{label} (default)" if name == DEFAULT_MODEL else label
+
 def set_sidebar_model_selection():
     """Configure and render the model selection interface.
     
-    Handles model selection radio buttons and API key input fields
-    for both OpenAI and Google models.
+    Handles model selection radio buttons, the optional hedge model and API
+    key input fields for the providers they use. Changing a model or a key
+    reruns the whole app, since the chat depends on them. Must be called
+    inside a ``with st.sidebar`` block.
     """
 
-    with st.sidebar.expander("🤖 Model Selection"):
+    with st.expander("🤖 Model Selection"):
         if "selected_model" not in st.session_state:
-            st.session_state.selected_model = "gpt-4o-mini"
-        
-        MODEL_OPTIONS = {
-            "gpt-4o-mini": "OpenAI GPT4o-mini (default)",
-            "gpt-4o": "OpenAI GPT4o",
-            "Gemini 2.0 Flash": "Google Gemini 2.0 Flash",
-        }
+            st.session_state.selected_model = DEFAULT_MODEL
 
-        st.session_state.selected_model = st.radio(
+        selected_model = st.radio(
             "Choose Model",
-            options=list(MODEL_OPTIONS.keys()),
-            format_func=lambda x: MODEL_OPTIONS[x],
+            options=list(MODELS),
+            format_func=_model_label,
             help="Select the AI model to use for generating responses."
         )
+        if selected_model != st.session_state.selected_model:
+            st.session_state.selected_model = selected_model
+            if st.session_state.hedge_model == selected_model:
+                st.session_state.hedge_model = ""
+            st.rerun()
+
+        hedge_options = [""] + [model for model in MODELS if model != selected_model]
+        hedge_model = st.selectbox(
+            "Hedge slow answers with",
+            options=hedge_options,
+            index=hedge_options.index(st.session_state.hedge_model)
+            if st.session_state.hedge_model in hedge_options else 0,
+            format_func=lambda x: _model_label(x) if x else "Off",
+            help="When the chosen model is slower than usual to start answering, "
+                 "also ask this model and show whichever answers first."
+        )
+        if hedge_model != st.session_state.hedge_model:
+            st.session_state.hedge_model = hedge_model
+            st.rerun()
 
         st.markdown("### API Key")
+        providers = {MODELS[model][0] for model in (selected_model, hedge_model) if model}
         
-        if st.session_state.selected_model in ["gpt-4o", "gpt-4o-mini"]:
+        if "openai" in providers:
             new_openai_key = st.text_input(
                 "OpenAI API Key",
                 value=st.session_state.openai_api_key,
@@ -71,7 +107,7 @@ def set_sidebar_model_selection():
                 st.session_state.openai_api_key = new_openai_key
                 st.rerun()
         
-        elif st.session_state.selected_model == "Gemini 2.0 Flash":
+        if "gemini" in providers:
             new_google_key = st.text_input(
                 "Google API Key",
                 value=st.session_state.google_api_key,
@@ -88,11 +124,13 @@ def set_sidebar_llm_params():
     """Configure and render the LLM parameter controls.
     
     Provides sliders for adjusting temperature, max output tokens,
-    and top_p sampling parameters for the selected model.
+    and top_p sampling parameters for the selected model. The chat reads
+    them when a message is sent, so a slider change needs no other panel to
+    rerun. Must be called inside a ``with st.sidebar`` block.
     """
 
     
-    with st.sidebar.expander("🛠️ LLM Parameters"):
+    with st.expander("🛠️ LLM Parameters"):
         if "temperature" not in st.session_state:
             st.session_state.temperature = 0.7
         if "max_length" not in st.session_state:
@@ -125,4 +163,40 @@ def set_sidebar_llm_params():
         )
 
     log_time("LLM parameters initialized")
-    print(f"\n\n\n{'='*100}\n")
+
+def _profile_rows(recorder, span: str, tag: str, **tags):
+    """Group a span's recent durations by one tag and summarize them in milliseconds."""
+    groups = {}
+    for entry in recorder.recent(span, **tags):
+        groups.setdefault(entry.get(tag, ""), []).append(entry["seconds"] * 1000)
+    rows = []
+    for name, values in sorted(groups.items()):
+        row = {"name": name, "runs": len(values)}
+        row.update(
+            (f"p{round(q * 100)} ms", round(float(v), 1))
+            for q, v in zip(QUANTILES, np.percentile(values, [q * 100 for q in QUANTILES]))
+        )
+        rows.append(row)
+    return rows
+
+def set_sidebar_profile_report():
+    """Render the startup and rerun profile when DOCUDIALOGUE_PROFILE is on.
+
+    Shows the cold-start import time, each model's load time, and the
+    duration of every panel run and rerun stage in this session.
+    """
+    if not PROFILE:
+        return
+
+    recorder = get_latency_recorder()
+    session = st.session_state.session_id
+    with st.sidebar.expander("⏱️ Profile"):
+        st.markdown("**Startup**")
+        st.dataframe(
+            _profile_rows(recorder, "import", "module") + _profile_rows(recorder, "load", "component"),
+            hide_index=True
+        )
+        st.markdown("**Panel runs**")
+        st.dataframe(_profile_rows(recorder, "panel", "panel", session=session), hide_index=True)
+        st.markdown("**Rerun stages**")
+        st.dataframe(_profile_rows(recorder, "rerun", "stage", session=session), hide_index=True)
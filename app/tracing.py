@@ -0,0 +1,231 @@
+"""
+Latency tracing for the DocuDialogue application.
+
+Every timed stage of a request (parse, split, embed, insert, retrieve,
+time to first token, total generation, and the stages of a script rerun) is
+recorded as a span tagged with the session and model that produced it.
+Spans are kept in a bounded ring buffer per span name, so memory stays flat
+however long the server runs, and are summarized as p50/p95/p99.
+
+Spans can be exported two ways:
+
+- DOCUDIALOGUE_TRACE_FILE: each span is appended to a JSON-lines file
+- DOCUDIALOGUE_METRICS_PORT: a Prometheus text endpoint is served on /metrics
+
+This module has no Streamlit dependency, so background jobs can record spans.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+TRACE_BUFFER_SIZE = int(os.getenv("DOCUDIALOGUE_TRACE_BUFFER_SIZE", "2048"))
+TRACE_FILE = os.getenv("DOCUDIALOGUE_TRACE_FILE", "")
+# 0 disables the Prometheus endpoint
+METRICS_PORT = int(os.getenv("DOCUDIALOGUE_METRICS_PORT", "0"))
+
+QUANTILES = (0.5, 0.95, 0.99)
+# Tags exported as Prometheus labels; session IDs would explode the series count
+METRIC_LABELS = ("model",)
+
+
+class LatencyRecorder:
+    """
+    Thread-safe store of recent spans with percentile summaries.
+
+    Args:
+        buffer_size (int): Spans kept per span name
+        trace_file (str): Optional JSON-lines file every span is appended to
+    """
+
+    def __init__(self, buffer_size: int = TRACE_BUFFER_SIZE, trace_file: str = TRACE_FILE):
+        self.buffer_size = buffer_size
+        self.trace_file = trace_file
+        self._spans = {}
+        self._totals = {}
+        # Trace file lines recorded but not yet written
+        self._pending = []
+        self._lock = threading.Lock()
+        # Serializes trace file writes, which happen outside _lock
+        self._write_lock = threading.Lock()
+
+    def record(self, name: str, seconds: float, **tags) -> None:
+        """
+        Record one finished span.
+
+        Args:
+            name (str): Span name, e.g. "embed" or "ttft"
+            seconds (float): Duration of the span
+            **tags: Context such as session, model or stage
+        """
+        tags = {key: str(value) for key, value in tags.items() if value is not None}
+        entry = {"time": time.time(), "span": name, "seconds": seconds, **tags}
+        with self._lock:
+            if name not in self._spans:
+                self._spans[name] = deque(maxlen=self.buffer_size)
+            self._spans[name].append(entry)
+
+            # Prometheus counters must not reset when the ring buffer wraps
+            series = (name, tuple(tags.get(label, "") for label in METRIC_LABELS))
+            count, total = self._totals.get(series, (0, 0.0))
+            self._totals[series] = (count + 1, total + seconds)
+
+            if self.trace_file:
+                self._pending.append(json.dumps(entry) + "\n")
+
+        if self.trace_file:
+            self._write_pending()
+
+    def _write_pending(self) -> None:
+        """Append the pending spans to the trace file without holding the span lock."""
+        with self._write_lock:
+            with self._lock:
+                lines, self._pending = self._pending, []
+            if lines:
+                with open(self.trace_file, "a", encoding="utf-8") as f:
+                    f.writelines(lines)
+
+    @contextmanager
+    def span(self, name: str, **tags):
+        """
+        Time the enclosed block and record it as a span.
+
+        Args:
+            name (str): Span name
+            **tags: Context such as session, model or stage
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start, **tags)
+
+    def recent(self, name: str, **tags):
+        """
+        Return the buffered spans of one name, optionally filtered by tags.
+
+        Args:
+            name (str): Span name
+            **tags: Tag values the spans must match
+
+        Returns:
+            list[dict]: Matching spans, oldest first
+        """
+        with self._lock:
+            entries = list(self._spans.get(name, ()))
+        return [
+            entry for entry in entries
+            if all(entry.get(key) == str(value) for key, value in tags.items())
+        ]
+
+    def summary(self):
+        """
+        Summarize the buffered spans of every name.
+
+        Returns:
+            dict: Span name -> {"count", "p50", "p95", "p99"} in seconds
+        """
+        with self._lock:
+            buffers = {name: [entry["seconds"] for entry in spans] for name, spans in self._spans.items()}
+        summary = {}
+        for name, seconds in buffers.items():
+            values = np.percentile(seconds, [q * 100 for q in QUANTILES])
+            summary[name] = {"count": len(seconds)}
+            summary[name].update((f"p{round(q * 100)}", float(v)) for q, v in zip(QUANTILES, values))
+        return summary
+
+    def to_prometheus(self) -> str:
+        """
+        Render the spans in the Prometheus text exposition format.
+
+        Quantiles are computed over the ring buffer; _count and _sum cover
+        every span since the process started.
+
+        Returns:
+            str: Metrics text
+        """
+        with self._lock:
+            groups = {}
+            for name, spans in self._spans.items():
+                for entry in spans:
+                    series = (name, tuple(entry.get(label, "") for label in METRIC_LABELS))
+                    groups.setdefault(series, []).append(entry["seconds"])
+            totals = dict(self._totals)
+
+        lines = [
+            "# HELP docudialogue_span_seconds Latency of DocuDialogue request stages",
+            "# TYPE docudialogue_span_seconds summary",
+        ]
+        for (name, label_values), (count, total) in sorted(totals.items()):
+            labels = [f'span="{name}"'] + [
+                f'{label}="{value}"' for label, value in zip(METRIC_LABELS, label_values) if value
+            ]
+            seconds = groups.get((name, label_values))
+            if seconds:
+                for q, value in zip(QUANTILES, np.percentile(seconds, [q * 100 for q in QUANTILES])):
+                    quantile_labels = ",".join(labels + [f'quantile="{q}"'])
+                    lines.append(f"docudialogue_span_seconds{{{quantile_labels}}} {value:.6f}")
+            series_labels = ",".join(labels)
+            lines.append(f"docudialogue_span_seconds_count{{{series_labels}}} {count}")
+            lines.append(f"docudialogue_span_seconds_sum{{{series_labels}}} {total:.6f}")
+        return "\n".join(lines) + "\n"
+
+
+def serve_metrics(recorder: LatencyRecorder, port: int = METRICS_PORT):
+    """
+    Serve the recorder's spans as Prometheus metrics on a daemon thread.
+
+    Args:
+        recorder (LatencyRecorder): Recorder to export
+        port (int): TCP port for the /metrics endpoint
+
+    Returns:
+        ThreadingHTTPServer: The running server
+    """
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = recorder.to_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("", port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def timed_stream(stream, recorder: LatencyRecorder, start: float, **tags):
+    """
+    Pass a token stream through, recording time to first token and total time.
+
+    Args:
+        stream: Iterable of response chunks
+        recorder (LatencyRecorder): Recorder for the "ttft" and "generation" spans
+        start (float): time.perf_counter() value when the request was sent
+        **tags: Context such as session and model
+
+    Yields:
+        The chunks of the stream, unchanged
+    """
+    first = True
+    try:
+        for chunk in stream:
+            if first:
+                recorder.record("ttft", time.perf_counter() - start, **tags)
+                first = False
+            yield chunk
+    finally:
+        recorder.record("generation", time.perf_counter() - start, **tags)
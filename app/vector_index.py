@@ -0,0 +1,91 @@
+"""
+Vector index settings and search filters for the DocuDialogue application.
+
+Chroma searches each collection with an HNSW graph. Its parameters trade
+memory and build time against recall and query latency:
+
+- M: links per node; more links improve recall on large collections
+- ef_construction: candidates considered while inserting; higher builds a
+  better graph more slowly
+- ef_search: candidates considered per query; higher improves recall at the
+  cost of latency (never fewer than the number of results requested)
+- space: distance metric, one of l2, cosine or ip
+
+They are read from DOCUDIALOGUE_HNSW_* settings and fixed when a collection
+is created; existing collections keep the settings they were built with.
+
+A SearchFilter scopes a question to chosen documents and a page range. It
+is translated to a Chroma where clause, so the filter is applied during the
+HNSW search rather than to its results.
+"""
+
+import os
+from dataclasses import dataclass
+
+HNSW_SPACE = os.getenv("DOCUDIALOGUE_HNSW_SPACE", "l2")
+HNSW_M = int(os.getenv("DOCUDIALOGUE_HNSW_M", "16"))
+HNSW_CONSTRUCTION_EF = int(os.getenv("DOCUDIALOGUE_HNSW_CONSTRUCTION_EF", "100"))
+HNSW_SEARCH_EF = int(os.getenv("DOCUDIALOGUE_HNSW_SEARCH_EF", "10"))
+
+HNSW_SPACES = ("l2", "cosine", "ip")
+
+
+def index_metadata() -> dict:
+    """
+    Build the collection metadata that configures its HNSW index.
+
+    Returns:
+        dict: Chroma "hnsw:*" metadata entries
+    """
+    if HNSW_SPACE not in HNSW_SPACES:
+        raise ValueError(f"Unknown HNSW space {HNSW_SPACE!r}; choose one of {HNSW_SPACES}")
+    return {
+        "hnsw:space": HNSW_SPACE,
+        "hnsw:M": HNSW_M,
+        "hnsw:construction_ef": HNSW_CONSTRUCTION_EF,
+        "hnsw:search_ef": HNSW_SEARCH_EF,
+    }
+
+
+@dataclass(frozen=True)
+class SearchFilter:
+    """
+    Restriction of a search to some documents and pages.
+
+    Attributes:
+        sources (tuple[str, ...]): Documents to search; empty searches all
+        first_page (int | None): First page to search (1-based, inclusive)
+        last_page (int | None): Last page to search (inclusive)
+    """
+
+    sources: tuple = ()
+    first_page: int = None
+    last_page: int = None
+
+    def __bool__(self) -> bool:
+        return bool(self.sources) or self.first_page is not None or self.last_page is not None
+
+    @property
+    def key(self) -> str:
+        """Stable text form of the filter, used to key cached results."""
+        if not self:
+            return ""
+        return f"{sorted(self.sources)}:{self.first_page}:{self.last_page}"
+
+    def to_where(self):
+        """
+        Translate the filter to a Chroma where clause.
+
+        Returns:
+            dict | None: Where clause, or None when nothing is filtered
+        """
+        conditions = []
+        if self.sources:
+            conditions.append({"source": {"$in": list(self.sources)}})
+        if self.first_page is not None:
+            conditions.append({"page": {"$gte": self.first_page}})
+        if self.last_page is not None:
+            conditions.append({"page": {"$lte": self.last_page}})
+        if not conditions:
+            return None
+        return conditions[0] if len(conditions) == 1 else {"$and": conditions}
@@ -0,0 +1,158 @@
+"""
+Chunking strategy report for the DocuDialogue application.
+
+Splits the same pages with each chunking configuration and reports its
+effect on:
+
+- index size: number of chunks, vector bytes and how much text is embedded
+  more than once because of overlap
+- embedding time for all chunks
+- retrieval quality: hit@k, the share of queries whose source sentence is
+  fully contained in one of the top-k chunks (using the chunks' real page
+  numbers and offsets)
+- prompt size: tokens the top-k chunks would add to each request
+
+Queries are sentences sampled from the pages with some words dropped, so
+they resemble paraphrased questions about a known location.
+
+Usage:
+    python benchmarks/chunking_report.py [--pdf-dir DIR] [--real-embedder]
+        [--configs recursive:1500:300,sentence:1000:100,section:1000:100,token:300:30]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+import numpy as np
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARK_DIR, "..", "app"))
+
+from chunking import Chunker, split_sentences  # noqa: E402
+from context_builder import count_tokens  # noqa: E402
+from fakes import FakeEmbedder, generate_sentence  # noqa: E402
+
+DEFAULT_CONFIGS = "recursive:1500:300,recursive:1000:100,sentence:1000:100,section:1000:100,token:300:30"
+
+
+def load_pages(pdf_dir, synthetic_pages: int, seed: int):
+    """Extract page texts from a PDF directory, or generate sectioned synthetic pages."""
+    if pdf_dir is None:
+        rng = random.Random(seed)
+        pages = []
+        for number in range(synthetic_pages):
+            sections = []
+            for section in range(rng.randint(1, 3)):
+                body = " ".join(generate_sentence(rng) for _ in range(rng.randint(6, 14)))
+                sections.append(f"{number + 1}.{section + 1} {generate_sentence(rng)[:40].rstrip('.')}\n{body}")
+            pages.append("\n\n".join(sections))
+        return pages
+
+    from pypdf import PdfReader
+
+    pages = []
+    for name in sorted(os.listdir(pdf_dir)):
+        if name.lower().endswith(".pdf"):
+            pages.extend(page.extract_text() or "" for page in PdfReader(os.path.join(pdf_dir, name)).pages)
+    return pages
+
+
+def make_queries(pages, count: int, seed: int):
+    """Sample (page, offset, sentence, query) tuples; queries drop a few words."""
+    rng = random.Random(seed)
+    candidates = [
+        (page, offset, sentence)
+        for page, text in enumerate(pages)
+        for offset, sentence in split_sentences(text)
+        if len(sentence.split()) >= 8
+    ]
+    queries = []
+    for page, offset, sentence in rng.sample(candidates, min(count, len(candidates))):
+        words = sentence.split()
+        kept = [word for word in words if rng.random() > 0.25] or words
+        queries.append((page, offset, sentence, " ".join(kept)))
+    return queries
+
+
+def parse_config(spec: str) -> Chunker:
+    strategy, size, overlap = spec.split(":")
+    if strategy == "token":
+        return Chunker("token", chunk_tokens=int(size), overlap_tokens=int(overlap))
+    return Chunker(strategy, chunk_size=int(size), chunk_overlap=int(overlap))
+
+
+def evaluate(chunker: Chunker, pages, queries, embed_fn, k: int, model: str) -> dict:
+    """Chunk, embed and query the pages with one configuration."""
+    chunks = [
+        (page, offset, text)
+        for page, page_text in enumerate(pages)
+        for offset, text in chunker(page_text)
+    ]
+    texts = [text for _, _, text in chunks]
+
+    start = time.perf_counter()
+    vectors = np.asarray(embed_fn(texts), dtype=np.float32)
+    embed_seconds = time.perf_counter() - start
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    query_vectors = np.asarray(embed_fn([query for *_, query in queries]), dtype=np.float32)
+    query_vectors /= np.maximum(np.linalg.norm(query_vectors, axis=1, keepdims=True), 1e-12)
+    top = np.argsort(-(query_vectors @ vectors.T), axis=1)[:, :k]
+
+    hits, prompt_tokens = 0, 0
+    for (page, offset, sentence, _), ranked in zip(queries, top):
+        # A hit needs the whole source sentence inside one retrieved chunk
+        hits += any(
+            chunks[i][0] == page and chunks[i][1] <= offset
+            and offset + len(sentence) <= chunks[i][1] + len(chunks[i][2])
+            for i in ranked
+        )
+        prompt_tokens += sum(count_tokens(texts[i], model) for i in ranked)
+
+    source_chars = sum(len(text) for text in pages)
+    embedded_chars = sum(len(text) for text in texts)
+    return {
+        "chunks": len(chunks),
+        "vector_kb": round(vectors.nbytes / 1024, 1),
+        "duplicated": (embedded_chars - source_chars) / max(source_chars, 1),
+        "embed_s": embed_seconds,
+        "hit_at_k": hits / max(len(queries), 1),
+        "prompt_tokens": prompt_tokens / max(len(queries), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf-dir", help="Directory of PDFs (default: synthetic pages)")
+    parser.add_argument("--pages", type=int, default=200, help="Synthetic pages to generate")
+    parser.add_argument("--configs", default=DEFAULT_CONFIGS,
+                        help="Comma-separated strategy:size:overlap (token sizes are in tokens)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--model", default="gpt-4o", help="Model whose tokenizer counts prompt tokens")
+    parser.add_argument("--real-embedder", action="store_true",
+                        help="Use the configured sentence-transformers model instead of the fake embedder")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    pages = load_pages(args.pdf_dir, args.pages, args.seed)
+    queries = make_queries(pages, args.queries, args.seed)
+    if args.real_embedder:
+        from embeddings import SentenceTransformerEmbedder
+        embed_fn = SentenceTransformerEmbedder()
+    else:
+        embed_fn = FakeEmbedder()
+
+    print(f"{len(pages)} pages, {len(queries)} queries, k={args.k}")
+    print(f"{'config':<22} {'chunks':>7} {'vectors KB':>10} {'duplicated':>10} {'embed s':>8} "
+          f"{'hit@k':>6} {'prompt tok':>10}")
+    for spec in args.configs.split(","):
+        result = evaluate(parse_config(spec), pages, queries, embed_fn, args.k, args.model)
+        print(f"{spec:<22} {result['chunks']:>7} {result['vector_kb']:>10} {result['duplicated']:>10.1%} "
+              f"{result['embed_s']:>8.2f} {result['hit_at_k']:>6.2f} {result['prompt_tokens']:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+"""
+End-to-end benchmark for the DocuDialogue application.
+
+Runs the ingestion job behind handle_file_upload_and_processing and the
+retrieval and prompt path of handle_chat without a browser, against a
+generated PDF corpus, a deterministic fake embedder and a local mock of the
+OpenAI and Gemini streaming APIs. Reports:
+
+- ingestion throughput (pages/s, chunks/s) and wall time
+- peak RSS of the process and its extraction workers
+- on-disk index size (Chroma store and BM25 index)
+- retrieval and prompt-assembly latency percentiles
+- simulated time to first token and total generation time per provider
+
+Results can be saved as a JSON baseline and compared on later runs; any
+metric that is worse than the baseline by more than the tolerance fails
+the run with exit code 1.
+
+Usage:
+    python benchmarks/e2e_benchmark.py --documents 20 --pages 10 --save-baseline baseline.json
+    python benchmarks/e2e_benchmark.py --documents 20 --pages 10 --baseline baseline.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+import psutil
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARK_DIR, "..", "app"))
+
+# Metrics compared against a baseline, and whether higher values are better
+TRACKED_METRICS = {
+    "ingest_pages_per_s": True,
+    "ingest_chunks_per_s": True,
+    "peak_rss_mb": False,
+    "index_mb": False,
+    "retrieve_p50_ms": False,
+    "retrieve_p95_ms": False,
+    "prompt_p95_ms": False,
+    "openai_ttft_p50_ms": False,
+    "gemini_ttft_p50_ms": False,
+}
+
+
+class PeakRSSSampler:
+    """Sample the RSS of this process and its children on a background thread."""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _sample(self) -> int:
+        process = psutil.Process()
+        total = process.memory_info().rss
+        for child in process.children(recursive=True):
+            try:
+                total += child.memory_info().rss
+            except psutil.Error:
+                continue
+        return total
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self._sample())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self._sample())
+
+
+def directory_size(path: str) -> int:
+    """Total size in bytes of the files under a directory."""
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path)
+        for name in names
+    )
+
+
+def percentiles_ms(recorder, span: str, **tags) -> dict:
+    """p50/p95/p99 of a span in milliseconds."""
+    seconds = [entry["seconds"] for entry in recorder.recent(span, **tags)]
+    if not seconds:
+        return {}
+    values = np.percentile(seconds, [50, 95, 99]) * 1000
+    return {f"{span}_p{q}_ms": round(float(v), 3) for q, v in zip((50, 95, 99), values)}
+
+
+def run_ingestion(args, workdir, paths, collection, lexical_index, tree, embedder, recorder):
+    """Ingest the corpus through the background ingestion job."""
+    import file_upload
+    from chunking import Chunker
+    from ingestion import ExtractionPool
+    from ingestion_cache import compute_cache_key
+    from jobs import Job
+    from pdf_extraction import PDF_BACKEND
+    from query_cache import QueryCache
+
+    # The job deletes its input files, so it gets copies
+    upload_dir = os.path.join(workdir, "uploads")
+    os.makedirs(upload_dir)
+    uploads = []
+    for path in paths:
+        name = os.path.basename(path)
+        temp_path = shutil.copy(path, os.path.join(upload_dir, name))
+        with open(path, "rb") as f:
+            cache_key = compute_cache_key(f.read(), Chunker().config_id, embedder.model_id, PDF_BACKEND)
+        uploads.append({"name": name, "file_id": name, "path": temp_path, "cache_key": cache_key, "replaces": False})
+
+    job = Job("benchmark", "Benchmark ingestion")
+    executor = ExtractionPool(max_workers=args.workers, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        start = time.perf_counter()
+        file_upload._run_ingestion_job(
+            job, collection, lexical_index, tree, uploads, embedder, executor, QueryCache(), recorder
+        )
+        elapsed = time.perf_counter() - start
+    finally:
+        executor.shutdown()
+
+    if job.errors():
+        raise RuntimeError(f"Ingestion failed: {job.errors()}")
+    return elapsed, job.progress
+
+
+def run_queries(args, queries, collection, lexical_index, tree, embedder, recorder):
+    """Time retrieval and prompt assembly for every query, with caching disabled."""
+    from context_builder import build_context_window
+    from prompt_assembly import SYSTEM_INSTRUCTIONS, assemble_prompt
+    from query_cache import QueryCache
+    from retrieval import retrieve
+
+    no_cache = QueryCache(max_entries=0)
+    windows = []
+    for prompt in queries:
+        with recorder.span("retrieve"):
+            results = retrieve(
+                collection, prompt, args.n_results, lexical_index, embed_fn=embedder, cache=no_cache, tree=tree
+            )
+        with recorder.span("prompt"):
+            window = build_context_window(SYSTEM_INSTRUCTIONS, results, [], prompt, "gpt-4o")
+            prompt_layout = assemble_prompt(window.history, window.context, prompt, "gpt-4o")
+        windows.append(list(prompt_layout.messages))
+    return windows
+
+
+def run_generation(args, windows, server, recorder):
+    """Stream answers from the mock server through the app's LLM gateway."""
+    from llm_gateway import LLMGateway
+    from tracing import timed_stream
+
+    gateway = LLMGateway(base_urls={"openai": f"{server.url}/v1", "gemini": server.url})
+    models = {"openai": "gpt-4o-mini", "gemini": "gemini-2.0-flash-exp"}
+    for provider in args.providers:
+        for messages in windows[:args.llm_queries]:
+            start = time.perf_counter()
+            stream = gateway.stream(provider, "benchmark", models[provider], messages, {})
+            for _ in timed_stream(stream, recorder, start, model=provider):
+                pass
+
+
+def compare(results: dict, baseline: dict, tolerance: float):
+    """Return the tracked metrics that regressed beyond the tolerance."""
+    regressions = []
+    for metric, higher_is_better in TRACKED_METRICS.items():
+        if metric not in results or not baseline.get(metric):
+            continue
+        change = (results[metric] - baseline[metric]) / baseline[metric]
+        if (-change if higher_is_better else change) > tolerance:
+            regressions.append(f"{metric}: {baseline[metric]} -> {results[metric]} ({change:+.1%})")
+    return regressions
+
+
+def _csv(value):
+    return [item for item in value.split(",") if item]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=10, help="Pages per document")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--n-results", type=int, default=5)
+    parser.add_argument("--chunk-strategy", default="recursive")
+    parser.add_argument("--chunk-size", type=int, default=1500)
+    parser.add_argument("--chunk-overlap", type=int, default=300)
+    parser.add_argument("--hnsw-space", default="l2", choices=("l2", "cosine", "ip"))
+    parser.add_argument("--hnsw-m", type=int, default=16)
+    parser.add_argument("--hnsw-construction-ef", type=int, default=100)
+    parser.add_argument("--hnsw-search-ef", type=int, default=10)
+    parser.add_argument("--route-sections", type=int, default=6,
+                        help="Document tree sections a question is routed to; 0 searches every chunk")
+    parser.add_argument("--pdf-backend", default="pypdf", choices=("pypdf", "pymupdf", "pypdfium2"))
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Extraction processes")
+    parser.add_argument("--providers", type=_csv, default=["openai", "gemini"])
+    parser.add_argument("--llm-queries", type=int, default=10)
+    parser.add_argument("--ttft", type=float, default=0.3, help="Simulated seconds to first token")
+    parser.add_argument("--inter-token", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare against this JSON baseline")
+    parser.add_argument("--save-baseline", help="Save the results as a new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="docudialogue-bench-")
+    # Keep the ingestion cache out of the user's cache so every run embeds
+    os.environ["DOCUDIALOGUE_CACHE_DIR"] = os.path.join(workdir, "ingestion-cache")
+    os.environ["DOCUDIALOGUE_CHUNK_STRATEGY"] = args.chunk_strategy
+    os.environ["DOCUDIALOGUE_CHUNK_SIZE"] = str(args.chunk_size)
+    os.environ["DOCUDIALOGUE_CHUNK_OVERLAP"] = str(args.chunk_overlap)
+    os.environ["DOCUDIALOGUE_HNSW_SPACE"] = args.hnsw_space
+    os.environ["DOCUDIALOGUE_HNSW_M"] = str(args.hnsw_m)
+    os.environ["DOCUDIALOGUE_HNSW_CONSTRUCTION_EF"] = str(args.hnsw_construction_ef)
+    os.environ["DOCUDIALOGUE_HNSW_SEARCH_EF"] = str(args.hnsw_search_ef)
+    os.environ["DOCUDIALOGUE_PDF_BACKEND"] = args.pdf_backend
+    os.environ["DOCUDIALOGUE_TREE_ROUTE_SECTIONS"] = str(args.route_sections)
+
+    import chromadb
+    from fakes import FakeEmbedder, MockLLMServer, generate_pdf_corpus
+    from lexical_index import LexicalIndex
+    from tracing import LatencyRecorder
+    from vector_index import index_metadata
+
+    server = MockLLMServer(args.ttft, args.inter_token).start()
+    try:
+        paths, sentences = generate_pdf_corpus(os.path.join(workdir, "corpus"), args.documents, args.pages, args.seed)
+        queries = random.Random(args.seed).sample(sentences, min(args.queries, len(sentences)))
+
+        store_dir = os.path.join(workdir, "chroma")
+        client = chromadb.PersistentClient(store_dir)
+        collection = client.get_or_create_collection("benchmark", metadata=index_metadata())
+        tree = client.get_or_create_collection("benchmark_tree", embedding_function=None, metadata=index_metadata())
+        lexical_index = LexicalIndex(os.path.join(store_dir, "lexical", "benchmark.pkl"))
+        embedder = FakeEmbedder()
+        recorder = LatencyRecorder(buffer_size=max(args.queries, args.llm_queries, 1) * 4)
+
+        with PeakRSSSampler() as rss:
+            elapsed, progress = run_ingestion(args, workdir, paths, collection, lexical_index, tree, embedder, recorder)
+        windows = run_queries(args, queries, collection, lexical_index, tree, embedder, recorder)
+        run_generation(args, windows, server, recorder)
+
+        results = {
+            "config": {key: value for key, value in vars(args).items()
+                       if key not in ("output", "baseline", "save_baseline")},
+            "ingest_seconds": round(elapsed, 3),
+            "ingest_pages_per_s": round(progress.pages_extracted / elapsed, 2),
+            "ingest_chunks_per_s": round(progress.chunks_embedded / elapsed, 2),
+            "chunks": collection.count(),
+            "peak_rss_mb": round(rss.peak / 2 ** 20, 1),
+            "index_mb": round(directory_size(store_dir) / 2 ** 20, 2),
+        }
+        for span in ("parse", "split", "embed", "insert", "retrieve", "prompt"):
+            results.update(percentiles_ms(recorder, span))
+        for provider in args.providers:
+            for span in ("ttft", "generation"):
+                results.update({
+                    f"{provider}_{key}": value
+                    for key, value in percentiles_ms(recorder, span, model=provider).items()
+                })
+    finally:
+        server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(json.dumps(results, indent=2))
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("config") != results["config"]:
+            print("Warning: baseline was recorded with a different configuration", file=sys.stderr)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("Regressions beyond tolerance:\n  " + "\n  ".join(regressions), file=sys.stderr)
+            sys.exit(1)
+        print("No regressions beyond tolerance.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Embedding backend benchmark for the DocuDialogue application.
+
+Compares embedding throughput (chunks/s) and retrieval recall for every
+combination of backend, batch size, thread count and vector storage dtype on
+the current CPU. Recall@k is measured against the nearest neighbours found
+with the fp32 torch backend, using a sample of the chunks as queries.
+
+Usage:
+    python benchmarks/embedding_benchmark.py [--pdf-dir DIR] [--backends torch,onnx-int8]
+        [--batch-sizes 16,64] [--threads 0,4] [--dtypes float32,float16,int8]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from embeddings import (  # noqa: E402
+    EMBEDDING_BACKENDS, EMBEDDING_MODEL_NAME, VECTOR_DTYPES, SentenceTransformerEmbedder,
+    dequantize_vectors, quantize_vectors
+)
+
+_WORDS = (
+    "revenue margin quarter guidance capital expenditure dividend liquidity covenant "
+    "segment forecast inventory supplier contract warranty liability depreciation "
+    "amortization impairment goodwill acquisition subsidiary exposure hedge currency"
+).split()
+
+
+def load_corpus(pdf_dir, max_chunks):
+    """Split the PDFs in a directory into chunks, or generate synthetic ones."""
+    if pdf_dir is None:
+        rng = random.Random(0)
+        return [
+            " ".join(rng.choice(_WORDS) for _ in range(rng.randint(120, 240)))
+            for _ in range(max_chunks)
+        ]
+
+    from pypdf import PdfReader
+    from chunking import Chunker
+
+    chunker = Chunker()
+    chunks = []
+    for name in sorted(os.listdir(pdf_dir)):
+        if not name.lower().endswith(".pdf"):
+            continue
+        reader = PdfReader(os.path.join(pdf_dir, name))
+        for page in reader.pages:
+            chunks.extend(text for _, text in chunker(page.extract_text() or ""))
+            if len(chunks) >= max_chunks:
+                return chunks[:max_chunks]
+    return chunks
+
+
+def nearest_neighbours(corpus, queries, k):
+    """Return the indices of the k most similar corpus vectors for each query."""
+    corpus = corpus / np.maximum(np.linalg.norm(corpus, axis=1, keepdims=True), 1e-12)
+    queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+    scores = queries @ corpus.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def recall_at_k(found, expected):
+    """Fraction of the expected neighbours that were found."""
+    hits = sum(len(set(f) & set(e)) for f, e in zip(found, expected))
+    return hits / expected.size
+
+
+def _csv(value, cast=str):
+    return [cast(item) for item in value.split(",") if item]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf-dir", help="Directory of PDFs to chunk (default: synthetic corpus)")
+    parser.add_argument("--model", default=EMBEDDING_MODEL_NAME)
+    parser.add_argument("--max-chunks", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--backends", type=_csv, default=list(EMBEDDING_BACKENDS))
+    parser.add_argument("--batch-sizes", type=lambda v: _csv(v, int), default=[16, 64, 128])
+    parser.add_argument("--threads", type=lambda v: _csv(v, int), default=[0])
+    parser.add_argument("--dtypes", type=_csv, default=list(VECTOR_DTYPES))
+    args = parser.parse_args()
+
+    chunks = load_corpus(args.pdf_dir, args.max_chunks)
+    rng = random.Random(1)
+    query_ids = rng.sample(range(len(chunks)), min(args.queries, len(chunks)))
+    print(f"Corpus: {len(chunks)} chunks, {len(query_ids)} queries, recall@{args.k}")
+
+    baseline = np.asarray(SentenceTransformerEmbedder(args.model, "torch", 64)(chunks))
+    expected = nearest_neighbours(baseline, baseline[query_ids], args.k)
+
+    print(f"{'backend':<12} {'batch':>5} {'threads':>7} {'dtype':<8} {'chunks/s':>9} "
+          f"{'bytes/vec':>9} {'recall':>7}")
+    for backend in args.backends:
+        for threads in args.threads:
+            try:
+                embedder = SentenceTransformerEmbedder(args.model, backend, args.batch_sizes[0], threads)
+                embedder.model  # the model loads on first use
+            except Exception as e:
+                print(f"{backend:<12} skipped: {e}")
+                continue
+            for batch_size in args.batch_sizes:
+                embedder.batch_size = batch_size
+                embedder(chunks[:batch_size])  # warm up
+                start = time.perf_counter()
+                vectors = np.asarray(embedder(chunks))
+                throughput = len(chunks) / (time.perf_counter() - start)
+
+                for dtype in args.dtypes:
+                    stored, scales = quantize_vectors(vectors, dtype)
+                    restored = dequantize_vectors(stored, scales)
+                    found = nearest_neighbours(restored, restored[query_ids], args.k)
+                    bytes_per_vector = stored[0].nbytes + (scales[0].nbytes if scales is not None else 0)
+                    print(f"{backend:<12} {batch_size:>5} {threads:>7} {dtype:<8} {throughput:>9.1f} "
+                          f"{bytes_per_vector:>9} {recall_at_k(found, expected):>7.3f}")
+
+
+if __name__ == "__main__":
+    main()
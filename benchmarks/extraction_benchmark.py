@@ -0,0 +1,165 @@
+"""
+PDF extraction backend benchmark for the DocuDialogue application.
+
+Extracts the same corpus with every backend in pdf_extraction and reports:
+
+- pages/s in a single process and across a pool of extraction workers,
+  using the same page-range tasks as the ingestion pipeline
+- sentence recall: the share of known sentences found in the text of their
+  page (generated corpus only)
+- word agreement: F1 between each backend's words per page and those of
+  the reference backend
+
+Without --pdf-dir a synthetic corpus is generated with PyMuPDF.
+
+Usage:
+    python benchmarks/extraction_benchmark.py [--pdf-dir DIR] [--backends pypdf,pymupdf,pypdfium2]
+        [--documents 10] [--pages 20] [--workers 4]
+"""
+
+import argparse
+import multiprocessing
+import os
+import re
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARK_DIR, "..", "app"))
+
+from ingestion import PAGES_PER_TASK, count_pages, extract_page_range  # noqa: E402
+from pdf_extraction import PAGE_TIMEOUT_SECONDS, PDF_BACKENDS  # noqa: E402
+
+
+def _csv(value: str):
+    return [item for item in value.split(",") if item]
+
+
+def _words(text: str):
+    return Counter(re.findall(r"\w+", text.lower()))
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split()).lower()
+
+
+def extract_corpus(paths, backend, executor, pages_per_task, page_timeout):
+    """
+    Extract every page of the corpus with one backend.
+
+    Args:
+        paths (list[str]): PDF files
+        backend (str): Extraction backend
+        executor: Process pool, or None to extract in this process
+        pages_per_task (int): Pages per worker task
+        page_timeout (float): Seconds allowed per page
+
+    Returns:
+        tuple[dict, float]: (path, page index) -> text, and the wall time in seconds
+    """
+    start = time.perf_counter()
+    texts = {}
+    if executor is None:
+        for path in paths:
+            for number, text in extract_page_range(path, 0, count_pages(path, backend), backend, page_timeout):
+                texts[path, number] = text
+        return texts, time.perf_counter() - start
+
+    futures = {}
+    counts = dict(zip(paths, executor.map(count_pages, paths, [backend] * len(paths))))
+    for path, pages in counts.items():
+        for first in range(0, pages, pages_per_task):
+            last = min(first + pages_per_task, pages)
+            futures[executor.submit(extract_page_range, path, first, last, backend, page_timeout)] = path
+    for future, path in futures.items():
+        for number, text in future.result():
+            texts[path, number] = text
+    return texts, time.perf_counter() - start
+
+
+def sentence_recall(texts, paths, pages, sentences):
+    """Share of the generated sentences (one per page, in order) found in their page's text."""
+    found = 0
+    for index, sentence in enumerate(sentences):
+        text = texts.get((paths[index // pages], index % pages), "")
+        found += _normalize(sentence) in _normalize(text)
+    return found / max(len(sentences), 1)
+
+
+def word_agreement(texts, reference):
+    """Micro-averaged F1 of the words per page against the reference backend's text."""
+    overlap = predicted = expected = 0
+    for key, reference_text in reference.items():
+        words, reference_words = _words(texts.get(key, "")), _words(reference_text)
+        overlap += sum((words & reference_words).values())
+        predicted += sum(words.values())
+        expected += sum(reference_words.values())
+    if not predicted or not expected:
+        return 0.0
+    precision, recall = overlap / predicted, overlap / expected
+    return 2 * precision * recall / (precision + recall) if overlap else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf-dir", help="Benchmark the PDFs in this directory")
+    parser.add_argument("--documents", type=int, default=10)
+    parser.add_argument("--pages", type=int, default=20, help="Pages per generated document")
+    parser.add_argument("--backends", type=_csv, default=list(PDF_BACKENDS))
+    parser.add_argument("--reference", default="pypdf", help="Backend the word agreement is measured against")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Extraction processes")
+    parser.add_argument("--pages-per-task", type=int, default=PAGES_PER_TASK)
+    parser.add_argument("--page-timeout", type=float, default=PAGE_TIMEOUT_SECONDS)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    sentences = None
+    with tempfile.TemporaryDirectory(prefix="docudialogue-extraction-") as workdir:
+        if args.pdf_dir:
+            paths = sorted(
+                os.path.join(args.pdf_dir, name) for name in os.listdir(args.pdf_dir) if name.lower().endswith(".pdf")
+            )
+        else:
+            from fakes import generate_pdf_corpus
+
+            paths, sentences = generate_pdf_corpus(workdir, args.documents, args.pages, args.seed)
+
+        executor = ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context("spawn"))
+        results = {}
+        try:
+            for backend in args.backends:
+                try:
+                    # Warm the workers up so the parser import is not timed
+                    list(executor.map(count_pages, paths[:args.workers], [backend] * args.workers))
+                    texts, serial_seconds = extract_corpus(
+                        paths, backend, None, args.pages_per_task, args.page_timeout
+                    )
+                    _, parallel_seconds = extract_corpus(
+                        paths, backend, executor, args.pages_per_task, args.page_timeout
+                    )
+                except ImportError as e:
+                    print(f"{backend}: unavailable ({e})")
+                    continue
+                results[backend] = (texts, serial_seconds, parallel_seconds)
+        finally:
+            executor.shutdown()
+
+    reference = results.get(args.reference, (None,))[0]
+    print(f"{len(paths)} PDFs, {args.workers} workers")
+    print(f"{'backend':<12} {'pages':>6} {'serial p/s':>11} {'parallel p/s':>13} {'recall':>7} {'agreement':>10}")
+    for backend, (texts, serial_seconds, parallel_seconds) in results.items():
+        recall = sentence_recall(texts, paths, args.pages, sentences) if sentences else None
+        agreement = word_agreement(texts, reference) if reference is not None else None
+        print(
+            f"{backend:<12} {len(texts):>6} {len(texts) / serial_seconds:>11.1f} "
+            f"{len(texts) / parallel_seconds:>13.1f} "
+            f"{'-' if recall is None else f'{recall:.3f}':>7} "
+            f"{'-' if agreement is None else f'{agreement:.3f}':>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""
+Offline stand-ins for the end-to-end benchmark.
+
+- generate_pdf_corpus: deterministic synthetic PDFs of a configurable size
+- FakeEmbedder: a deterministic hashing embedder with the real model's dimension
+- MockLLMServer: a local HTTP server speaking the OpenAI chat-completions SSE
+  stream and the Gemini REST streamGenerateContent SSE stream, with a
+  configurable time to first token, inter-token delay and slow spells, and
+  a prompt prefix cache reported in each response's token usage
+
+Nothing here touches the network, so benchmark runs are reproducible.
+"""
+
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+_VOCABULARY = (
+    "revenue margin quarter guidance capital expenditure dividend liquidity covenant segment "
+    "forecast inventory supplier contract warranty liability depreciation amortization impairment "
+    "goodwill acquisition subsidiary exposure hedge currency research clinical trial patent "
+    "regulatory approval portfolio customer retention churn pipeline backlog headcount"
+).split()
+_TICKERS = ("ACME", "GLOBX", "INITECH", "UMBRL", "STARK", "WAYNE")
+
+# Approximate characters per token of the mock's token counts
+_CHARS_PER_TOKEN = 4
+# Prompt prefixes are cached from 1024 tokens on, in blocks of 128 tokens
+_CACHE_MIN_TOKENS = 1024
+_CACHE_BLOCK_TOKENS = 128
+
+
+def generate_sentence(rng: random.Random) -> str:
+    """Generate one sentence mixing vocabulary, tickers and figures."""
+    words = [rng.choice(_VOCABULARY) for _ in range(rng.randint(8, 18))]
+    words.insert(rng.randrange(len(words)), rng.choice(_TICKERS))
+    words.insert(rng.randrange(len(words)), f"{rng.randint(1, 999)}.{rng.randint(0, 9)}%")
+    return " ".join(words).capitalize() + "."
+
+
+def generate_pdf_corpus(directory: str, documents: int, pages: int, seed: int = 0):
+    """
+    Write synthetic PDFs with PyMuPDF.
+
+    Args:
+        directory (str): Output directory
+        documents (int): Number of PDFs
+        pages (int): Pages per PDF
+        seed (int): Seed for the generated text
+
+    Returns:
+        tuple[list[str], list[str]]: PDF paths and a sample of their sentences
+            to use as queries
+    """
+    import fitz
+
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    paths, sentences = [], []
+    for number in range(documents):
+        pdf = fitz.open()
+        for _ in range(pages):
+            page_sentences = [generate_sentence(rng) for _ in range(rng.randint(25, 40))]
+            sentences.append(rng.choice(page_sentences))
+            page = pdf.new_page()
+            page.insert_textbox(page.rect + (36, 36, -36, -36), " ".join(page_sentences), fontsize=8)
+        path = os.path.join(directory, f"report-{number:04d}.pdf")
+        pdf.save(path)
+        pdf.close()
+        paths.append(path)
+    return paths, sentences
+
+
+class FakeEmbedder:
+    """
+    Deterministic embedder based on hashed word counts.
+
+    Texts sharing words get similar vectors, so retrieval behaves sensibly,
+    and the cost per text is small and stable so benchmark timings reflect
+    the surrounding code rather than the model.
+
+    Args:
+        dimension (int): Vector size; 384 matches all-MiniLM-L6-v2
+    """
+
+    model_id = "fake-hash-embedder"
+
+    def __init__(self, dimension: int = 384):
+        self.dimension = dimension
+
+    def _bucket(self, word: str) -> int:
+        return int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=4).digest(), "little")
+
+    def __call__(self, texts):
+        vectors = []
+        for text in texts:
+            vector = np.zeros(self.dimension, dtype=np.float32)
+            for word in re.findall(r"\w+", text.lower()):
+                bucket = self._bucket(word)
+                vector[bucket % self.dimension] += 1.0 if bucket & 1 << 31 else -1.0
+            vectors.append(vector / (np.linalg.norm(vector) or 1.0))
+        return vectors
+
+
+class MockLLMServer:
+    """
+    Local streaming LLM server for OpenAI and Gemini clients.
+
+    Point OpenAI clients at url + "/v1" and Gemini clients at url; both
+    receive the same canned answer split into tokens.
+
+    Like the providers, the server caches prompt prefixes: a request whose
+    prompt starts with the same blocks as an earlier one reports those
+    tokens as cached, in OpenAI's usage chunk (when the client asks for it)
+    and in Gemini's usageMetadata.
+
+    Args:
+        ttft (float): Seconds before the first token is sent
+        inter_token (float): Seconds between subsequent tokens
+        tokens (int): Number of tokens in each answer
+        slow_fraction (float): Share of requests that hit a slow spell
+        slow_ttft (float): Seconds to first token during a slow spell
+        seed (int): Seed choosing which requests are slow
+    """
+
+    def __init__(self, ttft: float = 0.3, inter_token: float = 0.01, tokens: int = 80,
+                 slow_fraction: float = 0.0, slow_ttft: float = 5.0, seed: int = 0):
+        self.ttft = ttft
+        self.inter_token = inter_token
+        self.tokens = tokens
+        self.slow_fraction = slow_fraction
+        self.slow_ttft = slow_ttft
+        self.requests = 0
+        # Streams the client closed before they finished, e.g. cancelled hedges
+        self.disconnects = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._prefixes = set()
+        self._server = None
+
+    def _answer_tokens(self):
+        rng = random.Random(self.requests)
+        return [rng.choice(_VOCABULARY) + " " for _ in range(self.tokens)]
+
+    def prompt_usage(self, prompt: str):
+        """
+        Count a prompt's tokens and the leading ones an earlier prompt shared.
+
+        Args:
+            prompt (str): Prompt text in the order the model reads it
+
+        Returns:
+            tuple[int, int]: Prompt tokens and cached prompt tokens
+        """
+        tokens = -(-len(prompt) // _CHARS_PER_TOKEN)
+        block_chars = _CACHE_BLOCK_TOKENS * _CHARS_PER_TOKEN
+        cached = 0
+        with self._lock:
+            for end in range(_CACHE_MIN_TOKENS * _CHARS_PER_TOKEN, len(prompt) + 1, block_chars):
+                digest = hashlib.sha256(prompt[:end].encode("utf-8")).digest()
+                if digest in self._prefixes:
+                    cached = end // _CHARS_PER_TOKEN
+                self._prefixes.add(digest)
+        return tokens, cached
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _stream(self, content_type, chunks, ttft):
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                time.sleep(ttft)
+                try:
+                    for i, chunk in enumerate(chunks):
+                        if i:
+                            time.sleep(mock.inter_token)
+                        data = chunk.encode("utf-8")
+                        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                        self.wfile.flush()
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    with mock._lock:
+                        mock.disconnects += 1
+                    self.close_connection = True
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                with mock._lock:
+                    mock.requests += 1
+                    tokens = mock._answer_tokens()
+                    ttft = mock.slow_ttft if mock._rng.random() < mock.slow_fraction else mock.ttft
+
+                if self.path.startswith("/v1/chat/completions"):
+                    prompt_tokens, cached_tokens = mock.prompt_usage("".join(
+                        f"{message['role']}\n{message['content']}\n" for message in body.get("messages", [])
+                    ))
+                    events = [
+                        "data: " + json.dumps({
+                            "id": "mock", "object": "chat.completion.chunk", "created": 0, "model": "mock",
+                            "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+                        }) + "\n\n"
+                        for token in tokens
+                    ]
+                    if (body.get("stream_options") or {}).get("include_usage"):
+                        events.append("data: " + json.dumps({
+                            "id": "mock", "object": "chat.completion.chunk", "created": 0, "model": "mock",
+                            "choices": [],
+                            "usage": {
+                                "prompt_tokens": prompt_tokens, "completion_tokens": len(tokens),
+                                "total_tokens": prompt_tokens + len(tokens),
+                                "prompt_tokens_details": {"cached_tokens": cached_tokens},
+                            },
+                        }) + "\n\n")
+                    self._stream("text/event-stream", events + ["data: [DONE]\n\n"], ttft)
+                elif ":streamGenerateContent" in self.path:
+                    instruction = body.get("systemInstruction") or body.get("system_instruction") or {}
+                    prompt_tokens, cached_tokens = mock.prompt_usage("".join(
+                        f"{content.get('role', 'user')}\n"
+                        + "".join(part.get("text", "") for part in content.get("parts", [])) + "\n"
+                        for content in [{"role": "system", **instruction}] + body.get("contents", [])
+                    ))
+                    chunks = [
+                        {"candidates": [{"content": {"parts": [{"text": token}], "role": "model"}, "index": 0}]}
+                        for token in tokens
+                    ]
+                    chunks[-1]["usageMetadata"] = {
+                        "promptTokenCount": prompt_tokens, "cachedContentTokenCount": cached_tokens,
+                        "candidatesTokenCount": len(tokens), "totalTokenCount": prompt_tokens + len(tokens),
+                    }
+                    parts = [json.dumps(chunk) for chunk in chunks]
+                    # Streamed with alt=sse as server-sent events
+                    self._stream("text/event-stream", [f"data: {part}\r\n\r\n" for part in parts], ttft)
+                else:
+                    self.send_error(404)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "MockLLMServer":
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
@@ -0,0 +1,118 @@
+"""
+Hedged generation benchmark for the DocuDialogue application.
+
+Streams answers through the LLM gateway from two local mock servers, a
+primary with occasional slow spells and a steady fallback, once without and
+once with hedging. Reports time to first token percentiles, how many
+requests were hedged, how many the fallback answered and how many primary
+streams were cancelled. The hedge deadline comes from the primary model's
+recorded first-token times, as in the app.
+
+Usage:
+    python benchmarks/hedging_benchmark.py [--requests 100] [--slow-fraction 0.1] [--slow-ttft 3]
+        [--primary openai:gpt-4o-mini] [--fallback gemini:gemini-2.0-flash-exp]
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARK_DIR, "..", "app"))
+
+from fakes import MockLLMServer  # noqa: E402
+from llm_gateway import LLMGateway  # noqa: E402
+from tracing import LatencyRecorder  # noqa: E402
+
+MESSAGES = [{"role": "user", "content": "Summarize the quarterly revenue guidance."}]
+
+
+def _model(value: str):
+    provider, _, model = value.partition(":")
+    return provider, model
+
+
+def run(gateway, primary, fallback, requests, concurrency, hedged):
+    """
+    Stream the same question repeatedly and time each first token.
+
+    Returns:
+        tuple[list[float], int]: Seconds to first token per request, and the
+            number of requests the fallback answered
+    """
+    def one(_):
+        winners = []
+        start = time.perf_counter()
+        if hedged:
+            stream = gateway.stream_hedged(
+                [(provider, "benchmark", model, MESSAGES) for provider, model in (primary, fallback)],
+                {}, on_winner=winners.append
+            )
+        else:
+            stream = gateway.stream(primary[0], "benchmark", primary[1], MESSAGES, {})
+        ttft = None
+        for _ in stream:
+            if ttft is None:
+                ttft = time.perf_counter() - start
+        return ttft, bool(winners and winners[0])
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(requests)))
+    return [ttft for ttft, _ in results], sum(fallback_won for _, fallback_won in results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--primary", type=_model, default=("openai", "gpt-4o-mini"))
+    parser.add_argument("--fallback", type=_model, default=("gemini", "gemini-2.0-flash-exp"))
+    parser.add_argument("--ttft", type=float, default=0.3, help="Usual seconds to first token of both servers")
+    parser.add_argument("--slow-fraction", type=float, default=0.1, help="Share of slow primary requests")
+    parser.add_argument("--slow-ttft", type=float, default=3.0, help="Primary's seconds to first token when slow")
+    parser.add_argument("--inter-token", type=float, default=0.01)
+    parser.add_argument("--tokens", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.primary[0] == args.fallback[0]:
+        parser.error("--primary and --fallback must use different providers, which get one mock server each")
+
+    primary_server = MockLLMServer(
+        args.ttft, args.inter_token, args.tokens, args.slow_fraction, args.slow_ttft, args.seed
+    ).start()
+    fallback_server = MockLLMServer(args.ttft, args.inter_token, args.tokens, seed=args.seed + 1).start()
+    urls = {}
+    for (provider, _), server in ((args.primary, primary_server), (args.fallback, fallback_server)):
+        urls[provider] = f"{server.url}/v1" if provider == "openai" else server.url
+
+    try:
+        recorder = LatencyRecorder(buffer_size=args.requests * 4)
+        gateway = LLMGateway(recorder=recorder, base_urls=urls)
+
+        # The unhedged run also gives the gateway the primary's first-token history
+        baseline, _ = run(gateway, args.primary, args.fallback, args.requests, args.concurrency, hedged=False)
+        deadline = gateway.hedge_deadline(*args.primary)
+        disconnects = primary_server.disconnects
+        hedged, fallback_wins = run(gateway, args.primary, args.fallback, args.requests, args.concurrency, hedged=True)
+        # A cancelled stream is noticed by the server on its next write, after a slow spell at most
+        time.sleep(args.slow_ttft + 0.5)
+        cancelled = primary_server.disconnects - disconnects
+    finally:
+        primary_server.stop()
+        fallback_server.stop()
+
+    print(f"Hedge deadline: {deadline * 1000:.0f} ms")
+    print(f"{'mode':<10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, values in (("unhedged", baseline), ("hedged", hedged)):
+        p50, p95, p99 = np.percentile(values, [50, 95, 99]) * 1000
+        print(f"{name:<10} {p50:>8.0f} {p95:>8.0f} {p99:>8.0f}")
+    print(f"Hedged requests: {len(recorder.recent('hedge'))}/{args.requests}, "
+          f"answered by the fallback: {fallback_wins}, primary streams cancelled: {cancelled}")
+
+
+if __name__ == "__main__":
+    main()
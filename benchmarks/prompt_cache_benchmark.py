@@ -0,0 +1,132 @@
+"""
+Prompt caching benchmark for the DocuDialogue application.
+
+Replays multi-turn conversations through the context window and the LLM
+gateway against local mock servers that cache prompt prefixes the way the
+providers do. Every request is fitted into the token budget by
+build_context_window, as in handle_chat, and sent in one of three layouts:
+
+- legacy: the layout before prompt_assembly (retrieved context inside the
+  system prompt for OpenAI, an inline template without the instructions for
+  Gemini), with the history trimmed one turn at a time
+- sliding: the shared layout of prompt_assembly, still trimmed one turn at a time
+- stable: the shared layout, with the history trimmed in blocks
+
+Reports, per provider and layout, the prompt tokens sent per request, the
+share the server served from its prefix cache, and the stable prefix counted
+locally. Like OpenAI, the mock only caches prefixes of 1024 tokens or more,
+so the instructions alone are not cached; savings start once the history is
+long enough, and with per-turn trimming they stop once it fills its budget.
+
+Usage:
+    python benchmarks/prompt_cache_benchmark.py [--conversations 10] [--turns 16] [--context-sentences 60]
+        [--answer-tokens 300]
+"""
+
+import argparse
+import os
+import random
+import sys
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARK_DIR, "..", "app"))
+
+from context_builder import build_context_window  # noqa: E402
+from fakes import MockLLMServer, generate_sentence  # noqa: E402
+from llm_gateway import LLMGateway  # noqa: E402
+from prompt_assembly import SYSTEM_INSTRUCTIONS, assemble_prompt  # noqa: E402
+
+MODELS = {"openai": "gpt-4o-mini", "gemini": "gemini-2.0-flash-exp"}
+# History tokens dropped at once per layout; None keeps the app's default
+HISTORY_BLOCKS = {"legacy": 0, "sliding": 0, "stable": None}
+# Sentences per mock retrieved chunk
+CHUNK_SENTENCES = 5
+
+
+def legacy_messages(provider, history, context, prompt):
+    """The layout chat.py used before prompt_assembly: the context leads the prompt."""
+    if provider == "openai":
+        system_message = f"{SYSTEM_INSTRUCTIONS}\n\n{context}"
+        return [{"role": "system", "content": system_message}, *history, {"role": "user", "content": prompt}]
+    contextualized_prompt = (
+        "Use the following context to answer the question, and if the context doesn't contain "
+        f"the answer, say so:\n\nContext:\n{context}\n\nQuestion: {prompt}"
+    )
+    return [*history, {"role": "user", "content": contextualized_prompt}]
+
+
+def search_results(rng, context_sentences):
+    """Mock retrieval results of context_sentences sentences, in chunks."""
+    sentences = [generate_sentence(rng) for _ in range(context_sentences)]
+    chunks = [" ".join(sentences[i:i + CHUNK_SENTENCES]) for i in range(0, len(sentences), CHUNK_SENTENCES)]
+    return {
+        "ids": [[f"chunk-{rng.random()}" for _ in chunks]],
+        "documents": [chunks],
+        "metadatas": [[{"source": "report.pdf", "page": i + 1} for i in range(len(chunks))]],
+    }
+
+
+def run(gateway, provider, layout, conversations, turns, context_sentences, seed):
+    """
+    Replay the conversations with one layout.
+
+    Returns:
+        tuple[int, int, int]: Prompt tokens and cached prompt tokens reported
+            by the server, and the stable prefix tokens counted locally
+    """
+    rng = random.Random(seed)
+    model = MODELS[provider]
+    block = {} if HISTORY_BLOCKS[layout] is None else {"history_block_tokens": HISTORY_BLOCKS[layout]}
+    prompt_tokens = cached_tokens = prefix_tokens = 0
+    for _ in range(conversations):
+        history = []
+        for _ in range(turns):
+            prompt = generate_sentence(rng).rstrip(".") + "?"
+            results = search_results(rng, context_sentences)
+            window = build_context_window(SYSTEM_INSTRUCTIONS, results, history, prompt, model, **block)
+            if layout == "legacy":
+                messages = legacy_messages(provider, window.history, window.context, prompt)
+            else:
+                prompt_layout = assemble_prompt(window.history, window.context, prompt, model)
+                messages = list(prompt_layout.messages)
+                prefix_tokens += prompt_layout.prefix_tokens
+            usage = []
+            answer = "".join(gateway.stream(provider, "benchmark", model, messages, {}, on_usage=usage.append))
+            prompt_tokens += usage[0].prompt_tokens
+            cached_tokens += usage[0].cached_tokens
+            history += [{"role": "user", "content": prompt}, {"role": "assistant", "content": answer}]
+    return prompt_tokens, cached_tokens, prefix_tokens
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--conversations", type=int, default=10)
+    parser.add_argument("--turns", type=int, default=16, help="Questions per conversation")
+    parser.add_argument("--context-sentences", type=int, default=60, help="Retrieved sentences per question")
+    parser.add_argument("--answer-tokens", type=int, default=300, help="Words per mock answer")
+    parser.add_argument("--providers", type=lambda value: value.split(","), default=list(MODELS))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    requests = args.conversations * args.turns
+    print(f"{'provider':<8} {'layout':<7} {'tokens/request':>14} {'cached':>10} {'cached %':>9} {'prefix':>10}")
+    for provider in args.providers:
+        for layout in HISTORY_BLOCKS:
+            # A fresh server per run, so no layout profits from the other's cache
+            server = MockLLMServer(ttft=0.0, inter_token=0.0, tokens=args.answer_tokens).start()
+            try:
+                url = f"{server.url}/v1" if provider == "openai" else server.url
+                gateway = LLMGateway(base_urls={provider: url})
+                prompt_tokens, cached_tokens, prefix_tokens = run(
+                    gateway, provider, layout, args.conversations, args.turns, args.context_sentences, args.seed
+                )
+            finally:
+                server.stop()
+            print(
+                f"{provider:<8} {layout:<7} {prompt_tokens // requests:>14,} {cached_tokens // requests:>10,} "
+                f"{cached_tokens / max(prompt_tokens, 1):>9.1%} {prefix_tokens // requests or '-':>10}"
+            )
+
+
+if __name__ == "__main__":
+    main()
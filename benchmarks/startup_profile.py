@@ -0,0 +1,147 @@
+"""
+Startup and rerun profile for the DocuDialogue application.
+
+Reports, without a browser:
+
+- import time: `python -X importtime` over the modules main.py imports,
+  with the slowest packages and whether each heavy ML or provider stack was
+  imported at startup (it should only load on first use)
+- rerun time: the app run headless with Streamlit's AppTest, timing the
+  cold first run, a plain rerun and a slider change, plus the per-panel and
+  per-stage spans the app itself records
+
+AppTest has no fragment reruns: every widget interaction reruns the whole
+script, so the wall time of a slider change in AppTest is that of a full
+rerun. The slider change is therefore reported as the span of the
+llm_params panel alone, which is what a browser reruns when a slider in that
+fragment moves.
+
+Usage:
+    python benchmarks/startup_profile.py [--top 15] [--reruns 5]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+import numpy as np
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.abspath(os.path.join(BENCHMARK_DIR, "..", "app"))
+
+APP_MODULES = ("config", "ui", "sidebar", "file_upload", "chat")
+# Stacks that should only be imported when first used
+LAZY_PACKAGES = (
+    "torch", "sentence_transformers", "transformers", "onnxruntime", "langchain", "langchain_text_splitters",
+    "tiktoken", "openai", "httpx",
+)
+
+
+def profile_imports():
+    """
+    Import the app's modules in a fresh interpreter under -X importtime.
+
+    Returns:
+        tuple[dict, str]: Top-level package -> import seconds, and the raw report
+    """
+    code = "import " + ", ".join(APP_MODULES)
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=APP_DIR, capture_output=True, text=True, check=True
+    )
+    totals = defaultdict(float)
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        if self_us.strip().isdigit():  # skips the header line
+            totals[name.strip().split(".")[0]] += int(self_us) / 1e6
+    return totals, completed.stderr
+
+
+def imported_modules(stderr: str):
+    """Names of every module imported in the profiled interpreter."""
+    return {line.rsplit("|", 1)[-1].strip() for line in stderr.splitlines() if line.startswith("import time:")}
+
+
+def profile_reruns(reruns: int):
+    """
+    Run the app headless and time a cold run, plain reruns and a slider change.
+
+    Returns:
+        tuple[dict, LatencyRecorder]: Seconds per run, wall time for the cold
+            run and reruns and the llm_params panel span for the slider change,
+            and the app's recorder
+    """
+    from streamlit.testing.v1 import AppTest
+
+    sys.path.insert(0, APP_DIR)
+    app = AppTest.from_file(os.path.join(APP_DIR, "main.py"), default_timeout=300)
+    # AppTest runs in this process, so the app's cached recorder is reachable
+    from resources import get_latency_recorder
+
+    timings = {}
+    start = time.perf_counter()
+    app.run()
+    timings["cold_run"] = [time.perf_counter() - start]
+
+    timings["rerun"] = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        app.run()
+        timings["rerun"].append(time.perf_counter() - start)
+
+    # AppTest reruns the whole script here, so only the fragment's own span is kept
+    timings["slider_change (llm_params)"] = []
+    if app.slider:
+        for i in range(reruns):
+            app.slider[0].set_value(round(0.1 + 0.8 * i / max(reruns, 1), 2)).run()
+            spans = get_latency_recorder().recent("panel", panel="llm_params")
+            timings["slider_change (llm_params)"].append(spans[-1]["seconds"])
+
+    return timings, get_latency_recorder()
+
+
+def _ms(values):
+    p50, p95 = np.percentile(values, [50, 95]) * 1000
+    return f"{len(values):>5} {p50:>9.1f} {p95:>9.1f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=15, help="Slowest packages to list")
+    parser.add_argument("--reruns", type=int, default=5)
+    parser.add_argument("--skip-reruns", action="store_true", help="Only profile imports")
+    args = parser.parse_args()
+
+    totals, stderr = profile_imports()
+    modules = imported_modules(stderr)
+    print(f"Import time of the app modules: {sum(totals.values()):.2f} s")
+    print(f"{'package':<28} {'seconds':>8}")
+    for name, seconds in sorted(totals.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"{name:<28} {seconds:>8.3f}")
+    print("\nStacks that should load on first use:")
+    for package in LAZY_PACKAGES:
+        print(f"  {package:<26} {'IMPORTED AT STARTUP' if package in modules else 'lazy'}")
+
+    if args.skip_reruns:
+        return
+
+    timings, recorder = profile_reruns(args.reruns)
+    print(f"\n{'run':<28} {'count':>5} {'p50 ms':>9} {'p95 ms':>9}")
+    for name, values in timings.items():
+        if values:
+            print(f"{name:<28} {_ms(values)}")
+
+    for span, tag in (("import", "module"), ("load", "component"), ("panel", "panel"), ("rerun", "stage")):
+        groups = defaultdict(list)
+        for entry in recorder.recent(span):
+            groups[entry.get(tag, "")].append(entry["seconds"])
+        for name, values in sorted(groups.items()):
+            print(f"{span + ': ' + name:<28} {_ms(values)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+"""
+Shared fixtures for the DocuDialogue tests.
+
+The app and benchmark modules import each other by bare name, as when they
+run as scripts, so both directories are put on the import path first.
+"""
+
+import os
+import sys
+import uuid
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(TESTS_DIR, "..", "app"))
+sys.path.insert(0, os.path.join(TESTS_DIR, "..", "benchmarks"))
+
+
+@pytest.fixture
+def store(tmp_path):
+    """
+    A fresh collection, document tree and lexical index, as a session gets them.
+
+    Returns:
+        tuple: (collection, tree, lexical_index)
+    """
+    chromadb = pytest.importorskip("chromadb")
+    from document_tree import tree_collection_name
+    from lexical_index import LexicalIndex
+
+    # In-memory clients share one store; unique names keep the tests apart
+    client = chromadb.EphemeralClient()
+    name = f"test_{uuid.uuid4().hex}"
+    collection = client.create_collection(name, embedding_function=None)
+    tree = client.create_collection(tree_collection_name(name), embedding_function=None)
+    return collection, tree, LexicalIndex(str(tmp_path / "lexical.pkl"))
@@ -0,0 +1,85 @@
+"""Tests for fitting the chat history and the whole prompt into the token budget."""
+
+from context_builder import MESSAGE_OVERHEAD_TOKENS, build_context_window, select_history
+from prompt_assembly import assemble_prompt
+
+# Gemini token counts are estimated at 4 characters per token, which keeps the sizes exact
+MODEL = "Gemini 2.0 Flash"
+MESSAGE_TOKENS = 99 + MESSAGE_OVERHEAD_TOKENS
+
+
+def _conversation(turns: int):
+    """Alternate questions and answers of MESSAGE_TOKENS each, numbered in order."""
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"{i:04d}".ljust(99 * 4, "x")}
+        for i in range(2 * turns)
+    ]
+
+
+def _first_kept(messages, budget: int, block_tokens: int) -> int:
+    kept, _ = select_history(messages, MODEL, budget, block_tokens)
+    return int(kept[0]["content"][:4]) if kept else len(messages)
+
+
+def test_history_within_budget_is_kept_whole():
+    messages = _conversation(3)
+
+    kept, tokens = select_history(messages, MODEL, 10_000, block_tokens=400)
+
+    assert kept == messages
+    assert tokens == 6 * MESSAGE_TOKENS
+
+
+def test_oldest_blocks_are_dropped_whole():
+    # Blocks of at least 400 tokens start at messages 0, 4, 8, 12 and 16
+    messages = _conversation(10)
+
+    kept, tokens = select_history(messages, MODEL, 1500, block_tokens=400)
+
+    assert kept == messages[8:]
+    assert tokens == 12 * MESSAGE_TOKENS <= 1500
+
+
+def test_kept_history_starts_at_the_same_message_for_several_turns():
+    conversation = _conversation(20)
+    firsts = [_first_kept(conversation[:2 * turns], 1500, 400) for turns in range(1, 21)]
+    single_turn_firsts = [_first_kept(conversation[:2 * turns], 1500, 0) for turns in range(1, 21)]
+
+    # The window only moves when a whole block has to go, each time by a full block
+    assert firsts == sorted(firsts)
+    assert all(later - earlier in (0, 4) for earlier, later in zip(firsts, firsts[1:]))
+    assert len(set(firsts)) < len(set(single_turn_firsts))
+    # Trimming one turn at a time moves the start on every turn once over budget
+    over_budget = [first for first in single_turn_firsts if first]
+    assert len(set(over_budget)) == len(over_budget)
+
+
+def test_window_never_opens_with_an_answer():
+    messages = _conversation(2)
+
+    kept, tokens = select_history(messages, MODEL, 3 * MESSAGE_TOKENS, block_tokens=0)
+
+    assert [message["role"] for message in kept] == ["user", "assistant"]
+    assert tokens == 2 * MESSAGE_TOKENS
+
+
+def test_newest_block_over_budget_is_trimmed_message_by_message():
+    messages = _conversation(4)
+
+    # The whole conversation is a single block
+    kept, tokens = select_history(messages, MODEL, 5 * MESSAGE_TOKENS, block_tokens=10_000)
+
+    assert kept == messages[4:]
+    assert tokens == 4 * MESSAGE_TOKENS
+
+
+def test_prompt_as_sent_fits_the_budget():
+    instructions, question = "Answer from the context.", "What was revenue in the last quarter?"
+    results = {"ids": [["a"]], "documents": [["y" * 800]], "metadatas": [[{"source": "report.pdf", "page": 1}]]}
+    history = _conversation(10)
+
+    for budget in range(600, 1400, 7):
+        window = build_context_window(instructions, results, history, question, MODEL, budget=budget,
+                                      history_block_tokens=0)
+        prompt = assemble_prompt(window.history, window.context, question, MODEL, instructions)
+        assert prompt.tokens <= window.tokens <= budget
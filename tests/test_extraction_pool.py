@@ -0,0 +1,97 @@
+"""Tests for replacing extraction pools whose workers hang."""
+
+import multiprocessing
+import os
+import signal
+import time
+import pytest
+import pdf_extraction
+from ingestion import ExtractionPool, IngestionPipeline, iter_pages
+from pdf_extraction import PypdfDocument
+
+PAGES = 6
+HUNG_PAGE = 3
+PAGE_TIMEOUT = 0.5
+
+
+class _HangingDocument(PypdfDocument):
+    """A document whose "hung" copy never returns one page, like a parser stuck in native code."""
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self.hangs = os.path.basename(path).startswith("hung")
+
+    def page_text(self, number: int) -> str:
+        if self.hangs and number == HUNG_PAGE:
+            # Native code does not see the per-page alarm either
+            signal.pthread_sigmask(signal.SIG_BLOCK, [signal.SIGALRM])
+            time.sleep(60)
+        return f"text of page {number + 1}"
+
+
+@pytest.fixture
+def pdfs(tmp_path, monkeypatch):
+    """A PDF that hangs on one page and a healthy one, read through the hanging backend."""
+    from pypdf import PdfWriter
+
+    monkeypatch.setitem(pdf_extraction.PDF_BACKENDS, "hanging", _HangingDocument)
+    paths = {}
+    for name in ("hung.pdf", "healthy.pdf"):
+        writer = PdfWriter()
+        for _ in range(PAGES):
+            writer.add_blank_page(100, 100)
+        paths[name] = str(tmp_path / name)
+        writer.write(paths[name])
+    return paths
+
+
+@pytest.fixture
+def pool():
+    # Forked workers see the test backend
+    pool = ExtractionPool(max_workers=2, mp_context=multiprocessing.get_context("fork"))
+    yield pool
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def test_hung_worker_replaces_the_pool(pdfs, pool):
+    original = pool._executor
+    pages = {}
+    pipeline = IngestionPipeline(
+        embed_fn=lambda texts: [[0.0]] * len(texts),
+        split_fn=lambda text: [(0, text)] if text else [],
+        executor=pool, pages_per_task=2, backend="hanging", page_timeout=PAGE_TIMEOUT
+    )
+
+    start = time.monotonic()
+    errors = pipeline.run(
+        list(pdfs.items()),
+        on_document=lambda name, texts, metadatas, embeddings: pages.__setitem__(
+            name, [meta["page"] for meta in metadatas]
+        )
+    )
+
+    assert time.monotonic() - start < 30
+    assert errors == {}
+    # Only the range holding the hung page is lost; the other document is whole
+    assert pages == {"hung.pdf": [1, 2, 5, 6], "healthy.pdf": [1, 2, 3, 4, 5, 6]}
+    assert pool._executor is not original
+    assert pool.submit(pow, 2, 5).result(timeout=10) == 32
+
+
+def test_iter_pages_skips_a_hung_range(pdfs, pool):
+    pages = list(iter_pages(pdfs["hung.pdf"], PAGES, backend="hanging", page_timeout=PAGE_TIMEOUT,
+                            executor=pool, pages_per_task=2, max_pending_ranges=2))
+
+    assert [number for number, _ in pages] == list(range(PAGES))
+    assert [number for number, text in pages if not text] == [2, 3]
+
+
+def test_replace_is_a_no_op_for_a_pool_already_replaced(pool):
+    stale = pool.submit(pow, 2, 1)
+    stale.result(timeout=10)
+
+    assert pool.replace(stale)
+    replacement = pool._executor
+    # A second caller whose task ran on the old pool must not replace the new one
+    assert not pool.replace(stale)
+    assert pool._executor is replacement
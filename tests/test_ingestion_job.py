@@ -0,0 +1,111 @@
+"""Tests for background ingestion and the query cache it keeps fresh."""
+
+import os
+import shutil
+import pytest
+
+pytest.importorskip("streamlit")
+pytest.importorskip("fitz")
+
+import file_upload  # noqa: E402
+import ingestion_cache  # noqa: E402
+from fakes import FakeEmbedder, generate_pdf_corpus  # noqa: E402
+from jobs import Job  # noqa: E402
+from query_cache import QueryCache  # noqa: E402
+from retrieval import retrieve  # noqa: E402
+from tracing import LatencyRecorder  # noqa: E402
+
+PAGES = 2
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    """Two generated reports and one sentence from each of their pages."""
+    return generate_pdf_corpus(str(tmp_path / "corpus"), documents=2, pages=PAGES)
+
+
+@pytest.fixture
+def ingest(store, tmp_path, monkeypatch):
+    """Run the ingestion job on one upload, the way the sidebar submits it."""
+    monkeypatch.setattr(ingestion_cache, "CACHE_DIR", str(tmp_path / "cache"))
+    collection, tree, lexical_index = store
+
+    def run(source_path, name, file_id, embed_fn, query_cache, replaces=False):
+        # The job deletes its uploads' temporary copies when it ends
+        temp_path = str(tmp_path / f"upload-{file_id}.pdf")
+        shutil.copy(source_path, temp_path)
+        job = Job("session", "test")
+        upload = {"name": name, "file_id": file_id, "path": temp_path, "cache_key": f"{name}-{file_id}",
+                  "replaces": replaces}
+        file_upload._run_ingestion_job(job, collection, lexical_index, tree, [upload], embed_fn, None,
+                                       query_cache, LatencyRecorder())
+        return job
+
+    return run
+
+
+def _search(store, prompt, cache, embedder):
+    collection, tree, lexical_index = store
+    return retrieve(collection, prompt, lexical_index=lexical_index, embed_fn=embedder, cache=cache, tree=tree)
+
+
+def test_ingest_invalidates_cached_retrieval_and_responses(store, corpus, ingest):
+    paths, sentences = corpus
+    cache, embedder = QueryCache(), FakeEmbedder()
+    first, second = (os.path.basename(path) for path in paths)
+    ingest(paths[0], first, "1", embedder, cache)
+
+    query = sentences[PAGES]  # from the first page of the second report
+    before = _search(store, query, cache, embedder)
+    assert {meta["source"] for meta in before["metadatas"][0]} == {first}
+    assert _search(store, query, cache, embedder) is before
+    cache.put_response(store[0].name, "response-key", "stale answer")
+
+    job = ingest(paths[1], second, "2", embedder, cache)
+
+    assert job.results() == {second: "2"}
+    assert cache.get_response("response-key") is None
+    after = _search(store, query, cache, embedder)
+    assert after is not before
+    assert after["metadatas"][0][0]["source"] == second
+
+
+class _FailingEmbedder(FakeEmbedder):
+    """Embeds its first batch, then fails like a model running out of memory."""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def __call__(self, texts):
+        self.calls += 1
+        if self.calls > 1:
+            raise RuntimeError("embedding failed")
+        return super().__call__(texts)
+
+
+def test_failed_stream_restores_previous_version(store, corpus, ingest, monkeypatch):
+    collection, tree, lexical_index = store
+    paths, sentences = corpus
+    cache, name = QueryCache(), "report.pdf"
+    ingest(paths[0], name, "1", FakeEmbedder(), cache)
+    chunk_ids = set(collection.get(where={"source": name})["ids"])
+    node_ids = set(tree.get(where={"source": name})["ids"])
+
+    # Stream the new version in small batches so it fails after committing one
+    stream_document = file_upload.stream_document
+    monkeypatch.setattr(file_upload, "STREAMING_MIN_BYTES", 0)
+    monkeypatch.setattr(
+        file_upload, "stream_document", lambda *args, **kwargs: stream_document(*args, batch_size=4, **kwargs)
+    )
+    failing = _FailingEmbedder()
+    job = ingest(paths[1], name, "2", failing, cache, replaces=True)
+
+    assert failing.calls > 1
+    assert list(job.errors()) == [name] and not job.results()
+    assert set(collection.get(where={"source": name})["ids"]) == chunk_ids
+    assert set(tree.get(where={"source": name})["ids"]) == node_ids
+    saved = type(lexical_index).load(lexical_index.path)
+    assert saved.sources[name] == chunk_ids
+    # Nothing of the failed version is left
+    assert all(sentences[PAGES] not in text for text in collection.get(where={"source": name})["documents"])
@@ -0,0 +1,72 @@
+"""Tests for hedged streaming against local mock providers."""
+
+import time
+import pytest
+from fakes import MockLLMServer
+from llm_gateway import LLMGateway
+
+MESSAGES = [{"role": "system", "content": "Answer briefly."}, {"role": "user", "content": "What was revenue?"}]
+HEDGE_DEADLINE = 0.3
+
+
+@pytest.fixture
+def servers():
+    """Start mock OpenAI and Gemini servers, described by keyword arguments."""
+    started = []
+
+    def start(**kwargs):
+        server = MockLLMServer(inter_token=0.01, **kwargs).start()
+        started.append(server)
+        return server
+
+    yield start
+    for server in started:
+        server.stop()
+
+
+def _hedge(primary, fallback, winners):
+    gateway = LLMGateway(base_urls={"openai": f"{primary.url}/v1", "gemini": fallback.url})
+    requests = [("openai", "key", "gpt-4o-mini", MESSAGES), ("gemini", "key", "gemini-2.0-flash-exp", MESSAGES)]
+    return gateway.stream_hedged(requests, {}, deadline=HEDGE_DEADLINE, on_winner=winners.append)
+
+
+def _wait_for(condition, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+def test_fallback_wins_a_slow_first_token_and_cancels_the_primary(servers):
+    primary = servers(ttft=1.5, tokens=50)
+    fallback = servers(ttft=0.05, tokens=20)
+    winners = []
+
+    start = time.monotonic()
+    stream = _hedge(primary, fallback, winners)
+    first = next(stream)
+    first_token = time.monotonic() - start
+    text = first + "".join(stream)
+
+    assert winners == [1]
+    assert HEDGE_DEADLINE <= first_token < primary.ttft
+    # Only the fallback's answer is relayed
+    assert len(text.split()) == fallback.tokens
+    assert time.monotonic() - start < primary.ttft
+    # The losing request is closed instead of streaming to the end
+    assert _wait_for(lambda: primary.disconnects == 1)
+    assert (primary.requests, fallback.requests) == (1, 1)
+
+
+def test_a_fast_primary_is_never_hedged(servers):
+    primary = servers(ttft=0.05, tokens=20)
+    fallback = servers(ttft=0.05, tokens=50)
+    winners = []
+
+    text = "".join(_hedge(primary, fallback, winners))
+
+    assert winners == [0]
+    assert len(text.split()) == primary.tokens
+    assert fallback.requests == 0
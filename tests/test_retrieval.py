@@ -0,0 +1,81 @@
+"""Tests for hybrid retrieval with document and page filters."""
+
+import re
+import pytest
+
+pytest.importorskip("streamlit")
+pytest.importorskip("chromadb")
+
+from document_store import add_chunks, make_chunk_ids  # noqa: E402
+from fakes import FakeEmbedder  # noqa: E402
+from query_cache import QueryCache  # noqa: E402
+from retrieval import retrieve  # noqa: E402
+from vector_index import SearchFilter  # noqa: E402
+
+CODE = "QX7781"
+PAGES = {
+    "a.pdf": ["revenue grew in the north region", "revenue fell in the south region",
+              f"contract code {CODE} was signed"],
+    "b.pdf": ["revenue grew in the east region", "staff headcount rose over the year",
+              f"contract code {CODE} was renewed"],
+}
+
+
+class _CodeBlindEmbedder(FakeEmbedder):
+    """Ignores words with digits, the way sentence embeddings blur codes and figures."""
+
+    def __call__(self, texts):
+        return super().__call__([re.sub(r"\S*\d\S*", "", text) for text in texts])
+
+
+@pytest.fixture
+def search(store):
+    """Index PAGES, one chunk per page, and search them like a session does."""
+    collection, tree, lexical_index = store
+    embedder = _CodeBlindEmbedder()
+    for source, texts in PAGES.items():
+        metadatas = [{"source": source, "page": page, "offset": 0} for page in range(1, len(texts) + 1)]
+        add_chunks(collection, make_chunk_ids(source, texts), texts, metadatas, embedder(texts), lexical_index)
+    cache = QueryCache()
+
+    def run(prompt, n_results=2, **filters):
+        results = retrieve(collection, prompt, n_results, lexical_index=lexical_index, embed_fn=embedder,
+                           cache=cache, search_filter=SearchFilter(**filters) if filters else None, tree=tree)
+        return list(zip(results["documents"][0], results["metadatas"][0]))
+
+    return run
+
+
+def test_fusion_finds_exact_codes_the_embedding_misses(search):
+    found = search(CODE)
+
+    assert sorted(text for text, _ in found) == [f"contract code {CODE} was renewed", f"contract code {CODE} was signed"]
+
+
+def test_source_filter_applies_to_both_retrievers(search):
+    found = search(CODE, n_results=3, sources=("b.pdf",))
+
+    assert found[0] == (f"contract code {CODE} was renewed", {"source": "b.pdf", "page": 3, "offset": 0})
+    assert {meta["source"] for _, meta in found} == {"b.pdf"}
+
+
+def test_page_filter_applies_to_both_retrievers(search):
+    found = search("revenue grew", n_results=6, first_page=2, last_page=3)
+
+    assert {meta["page"] for _, meta in found} == {2, 3}
+    assert found[0][0] == "revenue fell in the south region"
+
+
+def test_source_and_page_filters_combine(search):
+    found = search("revenue grew", n_results=6, sources=("a.pdf",), last_page=2)
+
+    assert [text for text, _ in found] == ["revenue grew in the north region", "revenue fell in the south region"]
+
+
+def test_filtered_and_unfiltered_results_are_cached_apart(search):
+    unfiltered = search("revenue grew")
+    filtered = search("revenue grew", sources=("b.pdf",))
+
+    assert {meta["source"] for _, meta in unfiltered} == {"a.pdf", "b.pdf"}
+    assert {meta["source"] for _, meta in filtered} == {"b.pdf"}
+    assert search("revenue grew") == unfiltered
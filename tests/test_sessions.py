@@ -0,0 +1,132 @@
+"""Tests for session eviction under the TTL and the disk quota."""
+
+import threading
+import time
+from types import SimpleNamespace
+import pytest
+import sessions
+from sessions import SessionRegistry
+
+SESSION_BYTES = 100
+
+
+class _Clock:
+    """Wall clock the registry reads, moved by hand."""
+
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(sessions, "time", SimpleNamespace(time=clock.time, sleep=time.sleep))
+    return clock
+
+
+def _registry(clock, activity, busy=(), ttl_seconds=160, quota_bytes=0, evict=None):
+    """Register sessions at the given times; each one holds SESSION_BYTES on disk."""
+    evicted = []
+
+    def record(session_id, temp_dir):
+        evicted.append(session_id)
+        if evict is not None:
+            evict(session_id)
+
+    registry = SessionRegistry(
+        evict=record,
+        usage=lambda: SESSION_BYTES * len(registry),
+        is_busy=lambda session_id: session_id in busy,
+        ttl_seconds=ttl_seconds,
+        quota_bytes=quota_bytes,
+        sweep_seconds=10
+    )
+    for session_id, last_active in activity.items():
+        clock.now = last_active
+        registry.register(session_id, f"/tmp/{session_id}")
+    return registry, evicted
+
+
+ACTIVITY = {"expired": 0, "old": 50, "busy": 60, "mid": 70, "recent": 195}
+
+
+def test_sweep_evicts_expired_sessions_then_least_recent_over_quota(clock):
+    registry, evicted = _registry(clock, ACTIVITY, busy={"busy"}, quota_bytes=250)
+    clock.now = 200
+
+    assert registry.sweep() == ["expired", "old", "mid"]
+    assert evicted == ["expired", "old", "mid"]
+    assert len(registry) == 2
+
+
+def test_quota_spares_busy_and_just_active_sessions(clock):
+    registry, evicted = _registry(clock, ACTIVITY, busy={"busy"}, quota_bytes=1)
+    clock.now = 200
+
+    registry.sweep()
+
+    # Still over quota, but "busy" runs a job and "recent" was active within the sweep interval
+    assert evicted == ["expired", "old", "mid"]
+    assert registry.touch("busy") and registry.touch("recent")
+
+
+def test_ttl_spares_busy_sessions(clock):
+    registry, evicted = _registry(clock, {"busy": 0, "idle": 0}, busy={"busy"})
+    clock.now = 1000
+
+    assert registry.sweep() == ["idle"]
+    assert registry.touch("busy")
+    assert not registry.touch("idle")
+
+
+def test_activity_during_a_sweep_keeps_the_session(clock):
+    registry, evicted = _registry(clock, {"returning": 0})
+    clock.now = 1000
+
+    def touched_while_checked(session_id):
+        # The user comes back after the sweep picked the session but before it is evicted
+        clock.now += 1
+        registry.touch(session_id)
+        return False
+
+    registry.is_busy = touched_while_checked
+
+    assert registry.sweep() == []
+    assert evicted == []
+    assert registry.touch("returning")
+
+
+def test_touch_waits_for_a_running_eviction(clock):
+    started, release = threading.Event(), threading.Event()
+    events = []
+
+    def slow_evict(session_id):
+        started.set()
+        release.wait(5)
+        events.append("evicted")
+
+    registry, _ = _registry(clock, {"session": 0}, evict=slow_evict)
+    clock.now = 1000
+    sweeper = threading.Thread(target=registry.sweep)
+    sweeper.start()
+    assert started.wait(5)
+
+    def touch():
+        events.append(("touch", registry.touch("session")))
+
+    toucher = threading.Thread(target=touch)
+    toucher.start()
+    toucher.join(0.2)
+    assert toucher.is_alive(), "touch returned while the session's resources were still being released"
+
+    release.set()
+    toucher.join(5)
+    sweeper.join(5)
+    # The caller learns the session is gone only after it was fully evicted
+    assert events == ["evicted", ("touch", False)]
+
+    registry.register("session", "/tmp/session")
+    assert registry.touch("session")